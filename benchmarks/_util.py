@@ -0,0 +1,227 @@
+"""Helpers shared by the benchmarks: in-process server and fake nodes without Docker."""
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server")
+sys.path.insert(0, SERVER_DIR)
+
+
+def load_server():
+    """Import server.py quietly so request logging does not skew timings"""
+    import server
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    return server
+
+
+def add_fake_nodes(server, count, cpu_cores=4):
+    """Register nodes directly in server state, bypassing docker"""
+    import uuid
+    node_ids = []
+    with server.store.lock:
+        for _ in range(count):
+            node_id = str(uuid.uuid4())
+            server.nodes[node_id] = server.Node(node_id, cpu_cores)
+            server.scheduler.update(server.nodes[node_id])
+            server.store.mark_node(node_id)
+            node_ids.append(node_id)
+    return node_ids
+
+
+def reset_state(server):
+    with server.store.lock:
+        node_ids, pod_ids = list(server.nodes), list(server.pods)
+        server.nodes.clear()
+        server.pods.clear()
+        # Marking after removal drops the objects from the store's indexes too
+        for node_id in node_ids:
+            server.scheduler.remove(node_id)
+            server.store.mark_node(node_id)
+        for pod_id in pod_ids:
+            server.store.mark_pod(pod_id)
+
+
+def serve_in_thread(server, port=0, production=False):
+    """Run the Flask app on a local threaded server; returns (base_url, shutdown).
+
+    `production` uses the server's waitress entry point instead of Werkzeug's dev server.
+    """
+    if production:
+        httpd = server.create_server("127.0.0.1", port)
+        thread = threading.Thread(target=httpd.run, daemon=True)
+        thread.start()
+        return f"http://127.0.0.1:{httpd.effective_port}", httpd.close
+
+    from werkzeug.serving import make_server
+    httpd = make_server("127.0.0.1", port, server.app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{httpd.server_port}", httpd.shutdown
+
+
+def _server_process(conn, env, production):
+    os.environ.update(env)
+    server = load_server()
+    base_url, shutdown = serve_in_thread(server, production=production)
+    conn.send(base_url)
+    while True:
+        command, arg = conn.recv()
+        if command == "nodes":
+            conn.send(add_fake_nodes(server, arg))
+        elif command == "cpu":
+            conn.send(time.process_time())
+        elif command == "stop":
+            shutdown()
+            conn.send(None)
+            return
+
+
+class ServerProcess:
+    """The API server in a child process, so its CPU time can be measured on its own"""
+
+    def __init__(self, env=None, production=False):
+        import multiprocessing
+        self._conn, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_server_process, args=(child, env or {}, production),
+                                                daemon=True)
+        self._process.start()
+        self.base_url = self._conn.recv()
+
+    def _call(self, command, arg=None):
+        self._conn.send((command, arg))
+        return self._conn.recv()
+
+    def add_fake_nodes(self, count):
+        return self._call("nodes", count)
+
+    def cpu_time(self):
+        return self._call("cpu")
+
+    def stop(self):
+        self._call("stop")
+        self._process.join()
+
+
+class Histogram:
+    """Latency histogram in the style of HdrHistogram: fixed relative precision, bounded memory.
+
+    Values are kept to `precision_bits` significant bits (under 1% error with
+    the default 7), so recording is O(1) and percentiles do not need the samples.
+    """
+
+    def __init__(self, precision_bits=7):
+        self._bits = precision_bits
+        self._counts = {}   # (exponent, mantissa) -> count
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        ns = max(1, int(seconds * 1e9))
+        exponent = max(0, ns.bit_length() - self._bits)
+        key = (exponent, ns >> exponent)
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """Value in seconds at or below which `p` percent of the recorded values fall"""
+        with self._lock:
+            target = self.count * p / 100
+            seen = 0
+            for exponent, mantissa in sorted(self._counts):
+                seen += self._counts[(exponent, mantissa)]
+                if seen >= target:
+                    # Midpoint of the bucket's range, which can lie above the largest value
+                    return min(self.max, ((mantissa << exponent) + ((1 << exponent) - 1) / 2) / 1e9)
+        return 0.0
+
+    def summary(self, elapsed=None):
+        """p50/p95/p99/max/mean in milliseconds, plus the rate over `elapsed` seconds"""
+        result = {"count": self.count}
+        if elapsed:
+            result["per_second"] = round(self.count / elapsed, 2)
+        if self.count:
+            result["latency_ms"] = {
+                "p50": round(self.percentile(50) * 1e3, 3),
+                "p95": round(self.percentile(95) * 1e3, 3),
+                "p99": round(self.percentile(99) * 1e3, 3),
+                "max": round(self.max * 1e3, 3),
+                "mean": round(self.total / self.count * 1e3, 3)
+            }
+        return result
+
+
+class FakeRuntime:
+    """Node runtime with no containers: every node runs until kill() is called on it"""
+
+    def __init__(self):
+        self._dead = set()
+        self._lock = threading.Lock()
+
+    def kill(self, node_id):
+        with self._lock:
+            self._dead.add(node_id)
+
+    def start(self, node_id, cpu_cores, memory_mb=0):
+        return None
+
+    def stop(self, node_id):
+        self.kill(node_id)
+        return None
+
+    def remove(self, node_id):
+        self.kill(node_id)
+        return None
+
+    def inspect(self, node_ids):
+        with self._lock:
+            return {node_id: (False, "exited") if node_id in self._dead else (True, "running")
+                    for node_id in node_ids}
+
+    def inject_failure(self, node_id, kind):
+        if kind != "kill":
+            return f"Failure '{kind}' is not supported by the fake runtime"
+        self.kill(node_id)
+        return None
+
+
+class FakeEventSource:
+    """Container events pushed by hand, shaped like `docker events --format '{{json .}}'` output.
+
+    Pass it as ContainerTracker's `events`; join() waits until the tracker has
+    applied everything emitted so far, and end_stream() makes it reconnect.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self.streams = 0
+
+    def emit(self, name, action):
+        self._queue.put({"Type": "container", "Action": action, "time": int(time.time()),
+                         "Actor": {"ID": name, "Attributes": {"name": name, "image": "kube-sim-node"}}})
+
+    def end_stream(self):
+        self._queue.put(None)
+
+    def join(self):
+        self._queue.join()
+
+    def __call__(self, since):
+        self.streams += 1
+        while True:
+            event = self._queue.get()
+            try:
+                if event is None:
+                    return
+                yield event
+            finally:
+                # Reached once the consumer asks for the next event, i.e. after applying this one
+                self._queue.task_done()
@@ -0,0 +1,46 @@
+"""Per-request POST /pods versus one POST /pods/batch over a local HTTP server.
+
+Usage: python benchmarks/bench_batch.py [--nodes 1000] [--pods 2000]
+"""
+import argparse
+import time
+
+import requests
+
+from _util import add_fake_nodes, load_server, reset_state, serve_in_thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch pod submission benchmark")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--pods", type=int, default=2000)
+    parser.add_argument("--cpu", type=int, default=1)
+    args = parser.parse_args()
+
+    server = load_server()
+    base_url, shutdown = serve_in_thread(server)
+
+    add_fake_nodes(server, args.nodes)
+    start = time.perf_counter()
+    for _ in range(args.pods):
+        requests.post(f"{base_url}/pods", json={"cpuRequired": args.cpu}, timeout=10)
+    single = time.perf_counter() - start
+    single_placed = len(server.pods)
+
+    reset_state(server)
+    add_fake_nodes(server, args.nodes)
+    start = time.perf_counter()
+    response = requests.post(f"{base_url}/pods/batch",
+                             json={"pods": [{"cpuRequired": args.cpu}] * args.pods}, timeout=60)
+    batch = time.perf_counter() - start
+    batch_placed = response.json()["placed"]
+
+    shutdown()
+    print(f"{args.nodes} nodes, {args.pods} pods")
+    print(f"per-request  placed={single_placed:<7} total={single:8.3f}s  {args.pods / single:10.0f} pods/s")
+    print(f"batch        placed={batch_placed:<7} total={batch:8.3f}s  {args.pods / batch:10.0f} pods/s")
+    print(f"speedup      {single / batch:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
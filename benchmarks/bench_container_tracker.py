@@ -0,0 +1,86 @@
+"""Probing the containers of nodes that missed their heartbeat: one `docker inspect` per node (as
+the monitor used to), one batched `docker inspect`, and the ContainerTracker's event-fed cache.
+
+Each docker invocation is modelled by spawning `true`, which only counts the fork/exec; the real
+docker CLI adds a client start-up and an API round trip on top of that, so the spawning variants
+are slower in practice than shown here.
+
+Usage: python benchmarks/bench_container_tracker.py [--nodes 5000] [--failed 500]
+"""
+import argparse
+import subprocess
+import time
+
+from _util import FakeEventSource
+from runtime import ContainerTracker
+
+
+class Spawner:
+    """Stands in for the docker CLI: every call spawns one process"""
+
+    def __init__(self):
+        self.spawns = 0
+
+    def inspect(self, names):
+        self.spawns += 1
+        subprocess.run(["true", *names], check=True)
+        return {name: (False, "exited") for name in names}
+
+
+def per_node(spawner, names):
+    states = {}
+    for name in names:
+        states.update(spawner.inspect([name]))
+    return states
+
+
+def measure(label, function, spawner, names):
+    spawns = spawner.spawns
+    start = time.perf_counter()
+    states = function(names)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed * 1e3:9.2f}ms  {spawner.spawns - spawns:5d} processes  {len(states)} states")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Container state probing benchmark")
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--failed", type=int, default=500, help="nodes probed in one monitor pass")
+    args = parser.parse_args()
+
+    names = [f"node-{i}" for i in range(args.nodes)]
+    failed = names[::args.nodes // args.failed][:args.failed]
+
+    spawner = Spawner()
+    source = FakeEventSource()
+    tracker = ContainerTracker(source, spawner.inspect)
+    tracker.start()
+    start = time.perf_counter()
+    for name in names:
+        source.emit(name, "create")
+        source.emit(name, "start")
+    for name in failed:
+        source.emit(name, "die")
+    source.join()
+    elapsed = time.perf_counter() - start
+    count = 2 * args.nodes + args.failed
+    print(f"{count} events applied in {elapsed * 1e3:.1f}ms ({elapsed / count * 1e6:.1f}us/event)")
+
+    print(f"probing {args.failed} of {args.nodes} nodes:")
+    measure("inspect per node", lambda names: per_node(spawner, names), spawner, failed)
+    measure("batched inspect", spawner.inspect, spawner, failed)
+    measure("tracker", tracker.get, spawner, failed)
+    assert all(state == (False, "exited") for state in tracker.get(failed).values())
+
+    # Once the stream drops the cache is empty until the tracker reconnects and events are replayed;
+    # meanwhile it falls back to one batched inspect (this fake source replays nothing)
+    source.end_stream()
+    while source.streams < 2:
+        time.sleep(0.05)
+    measure("tracker, reconnected", tracker.get, spawner, failed)
+    measure("tracker, again", tracker.get, spawner, failed)
+    print(f"event streams opened: {source.streams}")
+
+
+if __name__ == "__main__":
+    main()
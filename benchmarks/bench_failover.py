@@ -0,0 +1,84 @@
+"""Mass node failure: pods re-placed node by node in pod order (FAILOVER_MODE=greedy) versus
+gathered from every failed node and placed largest first (bulk), both with --strategy.
+
+Usage: python benchmarks/bench_failover.py [--nodes 2000] [--failed 500] [--fill 0.8] [--strategy best-fit]
+"""
+import argparse
+import logging
+import os
+import random
+import time
+
+from _util import add_fake_nodes, load_server, reset_state
+
+
+def build(server, args):
+    """Fill the cluster with mixed pod sizes and delete random pods down to --fill, which leaves
+    the free CPU scattered as churn would; then fail --failed nodes and return their IDs"""
+    reset_state(server)
+    rng = random.Random(args.seed)
+    node_ids = add_fake_nodes(server, args.nodes, cpu_cores=args.node_cpu)
+    while server.create_pod(rng.choice(args.pod_cpu)) is not None:
+        pass
+    pod_ids = list(server.pods)
+    rng.shuffle(pod_ids)
+    used = sum(pod.cpu_required for pod in server.pods.values())
+    for pod_id in pod_ids:
+        if used <= args.nodes * args.node_cpu * args.fill:
+            break
+        used -= server.pods[pod_id].cpu_required
+        server.remove_pod(pod_id)
+
+    failed = [node_ids[i] for i in rng.sample(range(args.nodes), args.failed)]
+    with server.store.lock:
+        for node_id in failed:
+            node = server.nodes[node_id]
+            node.health_status = "Failed"
+            server.scheduler.update(node)
+            server.emit_node("MODIFIED", node, "NodeFailed")
+    return failed
+
+
+def run(server, mode, args):
+    failed_nodes = build(server, args)
+    with server.store.lock:
+        displaced = [pod for node_id in failed_nodes for pod in server.nodes[node_id].pods]
+    displaced_cpu = sum(pod.cpu_required for pod in displaced)
+
+    server.FAILOVER_MODE = mode
+    start = time.perf_counter()
+    placed, failed = server.reschedule_pods(failed_nodes)
+    elapsed = time.perf_counter() - start
+
+    placed_cpu = sum(pod.cpu_required for pod in displaced if pod.status != "Failed")
+    print(f"{mode:<7} placed {placed:6d}/{len(displaced)} pods ({placed / len(displaced):6.1%}), "
+          f"{placed_cpu:8.1f}/{displaced_cpu:.1f} CPU ({placed_cpu / displaced_cpu:6.1%}), "
+          f"{failed:5d} failed  in {elapsed:6.3f}s ({elapsed / len(displaced) * 1e6:5.1f}us/pod)")
+    return placed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mass failover benchmark")
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--failed", type=int, default=500, help="nodes failing at once")
+    parser.add_argument("--node-cpu", type=int, default=16)
+    parser.add_argument("--fill", type=float, default=0.8, help="fraction of CPU allocated before the failure")
+    parser.add_argument("--pod-cpu", type=lambda value: [float(cpu) for cpu in value.split(",")],
+                        default=[0.5, 1, 2, 4, 8], help="comma-separated CPU requests to draw from")
+    parser.add_argument("--strategy", default="best-fit", help="FAILOVER_STRATEGY for both modes")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ.setdefault("NODE_RUNTIME", "external")
+    server = load_server()
+    server.FAILOVER_STRATEGY = args.strategy
+    logging.getLogger().setLevel(logging.ERROR)   # one warning per pod that cannot be placed
+    print(f"{args.nodes} nodes x {args.node_cpu} CPU at {args.fill:.0%}, {args.failed} fail at once, "
+          f"{args.strategy}")
+    greedy = run(server, "greedy", args)
+    bulk = run(server, "bulk", args)
+    print(f"bulk placed {bulk - greedy:+d} pods compared with greedy")
+
+
+if __name__ == "__main__":
+    main()
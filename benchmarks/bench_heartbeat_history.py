@@ -0,0 +1,52 @@
+"""Cost of recording heartbeats in the per-node rings, and of GET /nodes/heartbeats over the
+whole cluster and over a page of visible nodes.
+
+Usage: python benchmarks/bench_heartbeat_history.py [--nodes 10000] [--beats 64] [--visible 200]
+"""
+import argparse
+import os
+import time
+
+from _util import load_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Heartbeat history benchmark")
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--beats", type=int, default=64, help="heartbeats recorded per node")
+    parser.add_argument("--interval", type=float, default=5, help="seconds between a node's heartbeats")
+    parser.add_argument("--visible", type=int, default=200, help="nodes asked for by ID")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault("NODE_RUNTIME", "external")
+    server = load_server()
+    history = server.heartbeat_history
+    node_ids = [f"node-{i}" for i in range(args.nodes)]
+
+    # Beats spread over the nodes' phases, ending now
+    now = time.time()
+    start = time.perf_counter()
+    for beat in range(args.beats):
+        at = now - (args.beats - beat) * args.interval
+        for i, node_id in enumerate(node_ids):
+            history.record(node_id, at + i * args.interval / args.nodes, 0.002)
+    elapsed = time.perf_counter() - start
+    beats = args.nodes * args.beats
+    memory = history._times.nbytes + history._latencies.nbytes
+    print(f"record          {elapsed / beats * 1e9:8.0f}ns per heartbeat, "
+          f"rings {memory / 2 ** 20:.1f}MiB ({memory / args.nodes:.0f} B/node)")
+
+    client = server.app.test_client()
+    visible = ",".join(node_ids[:args.visible])
+    for name, query in (("all nodes", ""), (f"{args.visible} by ID", f"&ids={visible}")):
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            response = client.get(f"/nodes/heartbeats?window=300&resolution=5{query}")
+        elapsed = (time.perf_counter() - start) / args.requests
+        print(f"GET {name:<11} {elapsed * 1e3:8.2f}ms  {len(response.data) / 1024:7.1f}KiB  "
+              f"beats {sum(response.get_json()['aggregate']['beats'])}")
+
+
+if __name__ == "__main__":
+    main()
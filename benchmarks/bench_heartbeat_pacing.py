@@ -0,0 +1,89 @@
+"""Heartbeat burstiness of nodes started together: a fixed sleep between beats, as nodes used
+to do, versus the server-advertised interval with jitter and a random start offset.
+
+Runs --nodes in-process nodes (NODE_RUNTIME=local), all launched at once, and
+records when each heartbeat reaches the server. Peak concurrency is the most
+heartbeats that arrive within any --window seconds; nodes in lockstep all land
+in the same window every interval.
+
+Usage: python benchmarks/bench_heartbeat_pacing.py [--nodes 5000] [--duration 20] [--window 0.05]
+"""
+import argparse
+import os
+import time
+from array import array
+
+from _util import load_server
+
+
+def peak_in_window(arrivals, window):
+    """Most arrivals within any `window` seconds of a sorted sequence"""
+    peak = start = 0
+    for end, at in enumerate(arrivals):
+        while at - arrivals[start] > window:
+            start += 1
+        peak = max(peak, end - start + 1)
+    return peak
+
+
+def run(server, mode, args):
+    simulator = server.runtime._simulator_class
+    paced_delay = simulator.next_delay
+    if mode == "fixed":
+        simulator.next_delay = lambda node, failures: node.interval
+
+    arrivals = array("d")
+    record = server.record_heartbeat
+
+    def timed_record(data):
+        arrivals.append(time.perf_counter())
+        return record(data)
+    server.record_heartbeat = timed_record
+
+    try:
+        job = server.provision_nodes(args.nodes, args.cpu)
+        while True:
+            with server.store.lock:
+                ready = sum(1 for node_id in job.node_ids if server.nodes[node_id].health_status == "Healthy")
+            if ready == args.nodes:
+                break
+            time.sleep(0.1)
+
+        # Let the start offsets play out before measuring
+        time.sleep(args.warmup)
+        first = len(arrivals)
+        time.sleep(args.duration)
+        window = arrivals[first:len(arrivals)]
+    finally:
+        server.record_heartbeat = record
+        simulator.next_delay = paced_delay
+        for node_id in job.node_ids:
+            server.runtime.remove(node_id)
+            server.remove_node(node_id)
+
+    peak = peak_in_window(window, args.window)
+    mean = len(window) / args.duration * args.window
+    print(f"{mode:<6} heartbeats/s {len(window) / args.duration:8.1f}  "
+          f"peak in {args.window * 1000:.0f}ms {peak:6d}  (mean {mean:6.1f}, {peak / mean:5.1f}x)  "
+          f"interval {server.heartbeat_pacer.interval:.2f}s +/- {server.heartbeat_pacer.jitter:.2f}s")
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Heartbeat pacing benchmark")
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--cpu", type=int, default=4)
+    parser.add_argument("--warmup", type=float, default=10, help="seconds between all nodes ready and measuring")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--window", type=float, default=0.05, help="seconds of arrivals counted as concurrent")
+    args = parser.parse_args()
+
+    os.environ["NODE_RUNTIME"] = "local"
+    server = load_server()
+    fixed = run(server, "fixed", args)
+    paced = run(server, "paced", args)
+    print(f"paced peak concurrency is {paced / fixed:.1%} of fixed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Server CPU per heartbeat: one POST /heartbeat per node versus a batching NodeAgent.
+
+Usage: python benchmarks/bench_heartbeats.py [--nodes 5000] [--rounds 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import requests
+
+from _util import ServerProcess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "node_sim"))
+from node import NodeAgent
+
+
+def measure(server, beats, send):
+    cpu_before = server.cpu_time()
+    start = time.perf_counter()
+    send()
+    wall = time.perf_counter() - start
+    cpu = server.cpu_time() - cpu_before
+    return wall, cpu / beats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched heartbeat benchmark")
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    server = ServerProcess({"NODE_RUNTIME": "external"})
+    node_ids = server.add_fake_nodes(args.nodes)
+    beats = args.nodes * args.rounds
+
+    def per_node(session):
+        for _ in range(args.rounds):
+            for node_id in node_ids:
+                session.post(f"{server.base_url}/heartbeat",
+                             json={"nodeId": node_id, "status": "Healthy", "pods": [], "cpuCores": 4},
+                             timeout=10)
+
+    agent = NodeAgent(server.base_url, node_ids, 4, batch_size=args.batch_size)
+
+    def batched():
+        for _ in range(args.rounds):
+            agent.beat()
+
+    print(f"{args.nodes} nodes, {args.rounds} rounds")
+    results = [
+        ("per-node, new conn", *measure(server, beats, lambda: per_node(requests))),
+        ("per-node, session", *measure(server, beats, lambda: per_node(requests.Session()))),
+        ("agent, batched", *measure(server, beats, batched)),
+    ]
+    for name, wall, cpu in results:
+        print(f"{name:<20} {beats / wall:10.0f} beats/s  server CPU {cpu * 1e6:8.1f}us/beat")
+    print(f"server CPU reduction vs per-node: {results[0][2] / results[2][2]:.0f}x")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Journal write overhead per mutation, and recovery time from a snapshot and from the log alone.
+
+Usage: python benchmarks/bench_journal.py [--pods 100000] [--nodes 1000]
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from _util import add_fake_nodes, load_server, reset_state
+
+
+def place_pods(server, count):
+    """Place pods one mutation at a time, as POST /pods does, and return seconds per pod"""
+    start = time.perf_counter()
+    with server.store.lock:
+        for i in range(count):
+            pod = server.pods.add(f"pod-{i}", 1, None)
+            server.place_pod(pod)
+            server.emit_pod("ADDED", pod, "PodPlaced")
+    return (time.perf_counter() - start) / count
+
+
+def populate(server, journal, args):
+    reset_state(server)
+    server.journal = journal
+    add_fake_nodes(server, args.nodes, cpu_cores=args.pods // args.nodes + 1)
+    return place_pods(server, args.pods)
+
+
+def recover(server, directory):
+    reset_state(server)
+    server.journal = server.Journal(directory)
+    start = time.perf_counter()
+    server.recover_state()
+    elapsed = time.perf_counter() - start
+    server.journal = None
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Journal benchmark")
+    parser.add_argument("--pods", type=int, default=100000)
+    parser.add_argument("--nodes", type=int, default=1000)
+    args = parser.parse_args()
+
+    server = load_server()
+    print(f"{args.nodes} nodes, {args.pods} pods")
+
+    plain = populate(server, None, args)
+    print(f"no journal        {plain * 1e6:8.2f}us per mutation")
+
+    log_dir = tempfile.mkdtemp()
+    snapshot_dir = tempfile.mkdtemp()
+    try:
+        journaled = populate(server, server.Journal(log_dir), args)
+        print(f"journal           {journaled * 1e6:8.2f}us per mutation "
+              f"(+{(journaled - plain) * 1e6:.2f}us)")
+
+        populate(server, server.Journal(snapshot_dir), args)
+        start = time.perf_counter()
+        server.journal.checkpoint(server.store.snapshot)
+        print(f"checkpoint        {time.perf_counter() - start:8.3f}s")
+
+        print(f"recover from log  {recover(server, log_dir):8.3f}s")
+        print(f"recover from snapshot {recover(server, snapshot_dir):4.3f}s")
+    finally:
+        shutil.rmtree(log_dir)
+        shutil.rmtree(snapshot_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Run thousands of in-process simulated nodes against the server, without Docker.
+
+Usage: python benchmarks/bench_local_runtime.py [--nodes 10000] [--duration 30]
+"""
+import argparse
+import os
+import time
+
+from _util import load_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local node runtime benchmark")
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--cpu", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=5.0, help="Heartbeat interval in seconds")
+    parser.add_argument("--duration", type=float, default=30.0)
+    args = parser.parse_args()
+
+    os.environ["NODE_RUNTIME"] = "local"
+    os.environ["LOCAL_HEARTBEAT_INTERVAL"] = str(args.interval)
+    server = load_server()
+
+    start = time.perf_counter()
+    job = server.provision_nodes(args.nodes, args.cpu)
+    while True:
+        with server.store.lock:
+            ready = sum(1 for node_id in job.node_ids if server.nodes[node_id].health_status == "Healthy")
+        if ready == args.nodes:
+            break
+        time.sleep(0.1)
+    print(f"{args.nodes} nodes ready in {time.perf_counter() - start:.2f}s")
+
+    with server.store.lock:
+        beats_before = sum(node.heartbeat_count for node in server.nodes.values())
+    cpu_before = time.process_time()
+    time.sleep(args.duration)
+    cpu_used = time.process_time() - cpu_before
+    with server.store.lock:
+        beats = sum(node.heartbeat_count for node in server.nodes.values()) - beats_before
+        healthy = sum(1 for node in server.nodes.values() if node.health_status == "Healthy")
+
+    expected = args.nodes / args.interval
+    print(f"heartbeats/s  {beats / args.duration:10.1f} (expected {expected:.1f})")
+    print(f"healthy nodes {healthy}/{args.nodes}")
+    print(f"process CPU   {cpu_used / args.duration * 100:9.1f}% of one core")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Cost of the /metrics instrumentation: the primitives on their own, and POST /pods and
+POST /heartbeat with the instrumented store lock and route handlers versus without them.
+
+Usage: python benchmarks/bench_metrics.py [--requests 20000] [--nodes 200] [--rounds 3]
+"""
+import argparse
+import threading
+import time
+
+from _util import add_fake_nodes, load_server, reset_state
+
+
+def per_call(function, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count
+
+
+def locked(lock):
+    def acquire_release():
+        with lock:
+            pass
+    return acquire_release
+
+
+def requests_per_call(server, node_ids, count):
+    """Alternate POST /pods and POST /heartbeat through the test client; returns seconds per request"""
+    client = server.app.test_client()
+    start = time.perf_counter()
+    for i in range(count):
+        if i % 2:
+            client.post("/heartbeat", json={"nodeId": node_ids[i % len(node_ids)], "cpuCores": 1000})
+        else:
+            client.post("/pods", json={"cpuRequired": 1})
+    return (time.perf_counter() - start) / count
+
+
+def without_instrumentation(server, function, *args):
+    """Call `function` with a plain store lock and the route handlers unwrapped"""
+    views, timed_lock = dict(server.app.view_functions), server.store.lock
+    server.store.lock = threading.RLock()
+    server.app.view_functions.update({endpoint: getattr(view, "__wrapped__", view)
+                                      for endpoint, view in views.items()})
+    try:
+        return function(*args)
+    finally:
+        server.store.lock = timed_lock
+        server.app.view_functions.update(views)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metrics instrumentation overhead")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--calls", type=int, default=1000000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    server = load_server()
+    metrics = server.metrics
+    histogram = metrics.Histogram(metrics.FAST_BUCKETS)
+    plain_lock = threading.RLock()
+    timed_lock = metrics.TimedLock(threading.RLock(), metrics.Histogram(metrics.FAST_BUCKETS),
+                                   metrics.Histogram(metrics.FAST_BUCKETS))
+    print(f"histogram observe      {per_call(lambda: histogram.observe(3e-5), args.calls) * 1e9:8.0f}ns")
+    print(f"RLock with             {per_call(locked(plain_lock), args.calls) * 1e9:8.0f}ns")
+    print(f"TimedLock with         {per_call(locked(timed_lock), args.calls) * 1e9:8.0f}ns")
+
+    # Alternate the two setups a few times and keep each one's best, to damp machine noise
+    results = {}
+    for _ in range(args.rounds):
+        for name in ("uninstrumented", "instrumented"):
+            reset_state(server)
+            node_ids = add_fake_nodes(server, args.nodes, cpu_cores=1000)
+            if name == "uninstrumented":
+                elapsed = without_instrumentation(server, requests_per_call, server, node_ids, args.requests)
+            else:
+                elapsed = requests_per_call(server, node_ids, args.requests)
+            results[name] = min(results.get(name, elapsed), elapsed)
+    for name, elapsed in results.items():
+        print(f"{name:<22} {elapsed * 1e6:8.1f}us per request")
+    overhead = results["instrumented"] - results["uninstrumented"]
+    print(f"overhead               {overhead * 1e6:8.1f}us ({overhead / results['uninstrumented']:.1%})")
+
+
+if __name__ == "__main__":
+    main()
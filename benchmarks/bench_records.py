@@ -0,0 +1,146 @@
+"""Memory and latency of the columnar PodTable versus the old __dict__ Node/Pod classes.
+
+Usage: python benchmarks/bench_records.py [--pods 1000000] [--pods-per-node 100]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+import records
+
+
+class LegacyNode:
+    def __init__(self, id, cpu_cores):
+        self.id = id
+        self.cpu_cores = cpu_cores
+        self.available_cpu = cpu_cores
+        self.pods = []
+        self.pods_version = 0
+        self.health_status = "Healthy"
+        self.last_heartbeat = time.time()
+        self.heartbeat_count = 0
+        self.is_running = True
+
+
+class LegacyPod:
+    def __init__(self, id, cpu_required, node_id):
+        self.id = id
+        self.cpu_required = cpu_required
+        self.node_id = node_id
+        self.status = "Running"
+        self.created_at = time.time()
+        self.last_updated = time.time()
+        self.health_status = "Healthy"
+
+
+class Legacy:
+    """The old server: a dict of Pod objects, and pod IDs in a list per node, which
+    `pod.id in node.pods` and list.remove scan"""
+
+    node_class = LegacyNode
+
+    def __init__(self):
+        self.pods = {}
+
+    def add(self, node, pod_id):
+        pod = self.pods[pod_id] = LegacyPod(pod_id, 1, node.id)
+        node.pods.append(pod_id)
+        return pod
+
+    @staticmethod
+    def remove(node, pod):
+        if pod.id in node.pods:
+            node.pods.remove(pod.id)
+
+
+class Columnar:
+    """PodTable rows, with NodePods membership as the server keeps them"""
+
+    node_class = records.Node
+
+    def __init__(self):
+        self.pods = records.PodTable()
+
+    def add(self, node, pod_id):
+        pod = self.pods.add(pod_id, 1, node.id)
+        node.pods.add(pod)
+        return pod
+
+    @staticmethod
+    def remove(node, pod):
+        if pod in node.pods:
+            node.pods.discard(pod)
+
+
+def build(layout, pod_ids, pods_per_node):
+    """Create the pods and bind them to nodes the way the server does; returns (nodes, seconds)"""
+    nodes = {}
+    start = time.perf_counter()
+    node = None
+    for i, pod_id in enumerate(pod_ids):
+        if i % pods_per_node == 0:
+            node = layout.node_class(f"node-{i // pods_per_node}", 64)
+            nodes[node.id] = node
+        layout.add(node, pod_id)
+    return nodes, time.perf_counter() - start
+
+
+def measure(name, layout_class, pod_ids, args):
+    # Timed without tracemalloc, whose hooks slow every allocation and array resize
+    build_time = build(layout_class(), pod_ids, args.pods_per_node)[1]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    layout = layout_class()
+    nodes = build(layout, pod_ids, args.pods_per_node)[0]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    rng = random.Random(args.seed)
+    sample = rng.sample(pod_ids, min(len(pod_ids), 100000))
+    start = time.perf_counter()
+    for pod_id in sample:
+        layout.pods.get(pod_id).cpu_required
+    lookup = (time.perf_counter() - start) / len(sample)
+
+    # Membership checks and removals on the node's pod collection, as release_pod does
+    node = layout.node_class("churn", 64)
+    members = [layout.add(node, f"churn-{i}") for i in range(args.churn_size)]
+    sample = rng.sample(members, min(len(members), 1000))
+    start = time.perf_counter()
+    for pod in sample:
+        layout.remove(node, pod)
+    churn = (time.perf_counter() - start) / len(sample)
+
+    print(f"{name:<8} memory={used / 2**20:8.1f}MiB ({used / len(pod_ids):6.1f} B/pod)  "
+          f"build={build_time:6.2f}s  lookup={lookup * 1e9:5.0f}ns  "
+          f"remove from {args.churn_size}-pod node={churn * 1e6:8.2f}us")
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Node/Pod record benchmark")
+    parser.add_argument("--pods", type=int, default=1000000)
+    parser.add_argument("--pods-per-node", type=int, default=100)
+    parser.add_argument("--churn-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # IDs are built once and shared, so both runs measure only the records themselves
+    pod_ids = [str(uuid.uuid4()) for _ in range(args.pods)]
+    print(f"{args.pods} pods, {args.pods_per_node} per node (IDs excluded)")
+
+    legacy = measure("legacy", Legacy, pod_ids, args)
+    columnar = measure("columnar", Columnar, pod_ids, args)
+    print(f"columnar records use {columnar / legacy:.0%} of the legacy memory")
+
+
+if __name__ == "__main__":
+    main()
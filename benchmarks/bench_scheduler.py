@@ -0,0 +1,91 @@
+"""Placement latency of the indexed scheduler versus the old linear scan, and of the NumPy
+filtering and scoring used for pods that request memory and for the scored strategies.
+
+Usage: python benchmarks/bench_scheduler.py [--nodes 10000] [--pods 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from scheduler import STRATEGIES, Scheduler
+
+
+class Node:
+    def __init__(self, id, cpu_cores):
+        self.id = id
+        self.cpu_cores = cpu_cores
+        self.available_cpu = cpu_cores
+        self.memory_mb = cpu_cores * 4096
+        self.available_memory_mb = self.memory_mb
+        self.health_status = "Healthy"
+        self.is_running = True
+
+
+def make_nodes(count, seed):
+    rng = random.Random(seed)
+    return {f"node-{i}": Node(f"node-{i}", rng.choice([2, 4, 8, 16])) for i in range(count)}
+
+
+def linear_scan(nodes, cpu_required):
+    for node_id, node in nodes.items():
+        if (node.health_status == "Healthy" and
+            node.is_running and
+            node.available_cpu >= cpu_required):
+            return node_id
+    return None
+
+
+def run(select, update, nodes, requests):
+    latencies = []
+    placed = 0
+    for cpu_required, memory_required_mb in requests:
+        start = time.perf_counter()
+        node_id = select(cpu_required, memory_required_mb)
+        if node_id is not None:
+            node = nodes[node_id]
+            node.available_cpu -= cpu_required
+            node.available_memory_mb -= memory_required_mb
+            update(node)
+            placed += 1
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return placed, latencies
+
+
+def report(name, placed, latencies):
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e6
+    print(f"{name:<24} placed={placed:<7} mean={sum(latencies) / len(latencies) * 1e6:8.2f}us "
+          f"p50={pct(0.50):8.2f}us p99={pct(0.99):8.2f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scheduler placement benchmark")
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--pods", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cpu_only = [(rng.choice([1, 1, 2, 4]), 0) for _ in range(args.pods)]
+    with_memory = [(cpu, rng.choice([512, 1024, 4096, 8192])) for cpu, _ in cpu_only]
+    print(f"{args.nodes} nodes, {args.pods} pod placements")
+
+    nodes = make_nodes(args.nodes, args.seed)
+    report("linear first-fit", *run(lambda cpu, memory: linear_scan(nodes, cpu), lambda node: None,
+                                     nodes, cpu_only))
+
+    for label, requests in (("cpu", cpu_only), ("cpu+mem", with_memory)):
+        for strategy in STRATEGIES:
+            nodes = make_nodes(args.nodes, args.seed)
+            scheduler = Scheduler(strategy)
+            for node in nodes.values():
+                scheduler.update(node)
+            report(f"{label} {strategy}", *run(scheduler.select, scheduler.update, nodes, requests))
+
+
+if __name__ == "__main__":
+    main()
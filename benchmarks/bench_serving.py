@@ -0,0 +1,92 @@
+"""GET /nodes and GET /pods throughput: Werkzeug's dev server encoding every response, versus the
+waitress entry point with responses encoded once per snapshot (and gzipped).
+
+Usage: python benchmarks/bench_serving.py [--nodes 1000] [--pods 20000] [--clients 8] [--duration 10]
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+
+import requests
+
+from _util import ServerProcess
+
+MODES = [
+    ("dev server", False, {"RESPONSE_CACHE": "0", "RESPONSE_GZIP_MIN_BYTES": "0"}),
+    ("production", True, {}),
+]
+
+
+def client(base_url, deadline):
+    """Alternate GET /nodes and GET /pods on one keep-alive session; returns the latencies"""
+    session = requests.Session()
+    paths = ["/nodes", "/pods"]
+    latencies = []
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        session.get(base_url + paths[len(latencies) % 2], timeout=30).content
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def heartbeats(base_url, node_ids, rate, deadline):
+    """Change node state `rate` times a second, so the cached node list keeps going stale"""
+    session = requests.Session()
+    i = 0
+    while time.perf_counter() < deadline:
+        session.post(f"{base_url}/heartbeat", json={"nodeId": node_ids[i % len(node_ids)], "cpuCores": 4},
+                     timeout=10)
+        i += 1
+        time.sleep(1 / rate)
+
+
+def run(name, production, env, args):
+    server = ServerProcess(dict(env, NODE_RUNTIME="external"), production=production)
+    try:
+        node_ids = server.add_fake_nodes(args.nodes)
+        requests.post(f"{server.base_url}/pods/batch", json={"pods": [{"cpuRequired": 1}] * args.pods},
+                      timeout=120)
+
+        # Clients run in their own processes so they do not compete for one interpreter
+        deadline = time.perf_counter() + args.duration
+        writer = None
+        if args.heartbeat_rate:
+            writer = threading.Thread(target=heartbeats,
+                                      args=(server.base_url, node_ids, args.heartbeat_rate, deadline))
+            writer.start()
+        cpu_before = server.cpu_time()
+        start = time.perf_counter()
+        with multiprocessing.Pool(args.clients) as pool:
+            per_client = pool.starmap(client, [(server.base_url, deadline)] * args.clients)
+        elapsed = time.perf_counter() - start
+        cpu = server.cpu_time() - cpu_before
+        if writer is not None:
+            writer.join()
+    finally:
+        server.stop()
+
+    latencies = sorted(latency for latencies in per_client for latency in latencies)
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e3
+    print(f"{name:<12} {len(latencies) / elapsed:8.1f} req/s  p50={pct(0.50):8.2f}ms  p99={pct(0.99):8.2f}ms  "
+          f"server CPU {cpu / len(latencies) * 1e3:6.2f}ms/req")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List endpoint serving benchmark")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--pods", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--heartbeat-rate", type=float, default=0,
+                        help="heartbeats per second sent meanwhile (each one invalidates the node list)")
+    args = parser.parse_args()
+
+    print(f"{args.nodes} nodes, {args.pods} pods, {args.clients} clients, {args.duration:.0f}s, "
+          f"{args.heartbeat_rate:.0f} heartbeats/s")
+    for name, production, env in MODES:
+        run(name, production, env, args)
+
+
+if __name__ == "__main__":
+    main()
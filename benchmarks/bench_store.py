@@ -0,0 +1,97 @@
+"""Concurrent stress test of the cluster store: writers churn nodes and pods while
+readers list everything, once from snapshots and once under the write lock (the
+old GET /nodes behaviour). Fails loudly if any thread is stuck.
+
+Usage: python benchmarks/bench_store.py [--nodes 2000] [--duration 10]
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+
+from _util import add_fake_nodes, load_server, reset_state
+
+
+def snapshot_read(server):
+    snapshot = server.store.snapshot()
+    return len(json.dumps(snapshot.nodes)) + len(json.dumps(list(snapshot.pods.values())))
+
+
+def locked_read(server):
+    with server.store.lock:
+        nodes = json.dumps({k: server.node_to_dict(v) for k, v in server.nodes.items()})
+        pods = json.dumps([server.pod_to_dict(p) for p in server.pods.values()])
+    return len(nodes) + len(pods)
+
+
+def writer(server, node_ids, stop, counts, seed):
+    rng = random.Random(seed)
+    client = server.app.test_client()
+    while not stop.is_set():
+        op = rng.random()
+        if op < 0.6:
+            server.record_heartbeat({"nodeId": rng.choice(node_ids), "cpuCores": 4})
+        elif op < 0.8:
+            client.post("/pods", json={"cpuRequired": 1})
+        elif op < 0.98:
+            with server.store.lock:
+                pod_id = next(iter(server.pods), None)
+            if pod_id:
+                client.delete(f"/pods/{pod_id}")
+        elif op < 0.99:
+            client.post(f"/nodes/{rng.choice(node_ids)}/stop")
+        else:
+            server.handle_expired_nodes([rng.choice(node_ids)])
+        counts["writes"] += 1
+
+
+def reader(server, read, stop, counts):
+    while not stop.is_set():
+        read(server)
+        counts["reads"] += 1
+
+
+def run(server, read, args):
+    reset_state(server)
+    node_ids = add_fake_nodes(server, args.nodes)
+    server.app.test_client().post("/pods/batch", json={"pods": [{"cpuRequired": 1}] * (args.nodes * 2)})
+
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0}
+    threads = [threading.Thread(target=writer, args=(server, node_ids, stop, counts, i), daemon=True)
+               for i in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(server, read, stop, counts), daemon=True)
+                for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=10)
+    stuck = sum(1 for thread in threads if thread.is_alive())
+    return counts["reads"] / args.duration, counts["writes"] / args.duration, stuck
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster store stress test")
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    os.environ["NODE_RUNTIME"] = "external"
+    server = load_server()
+
+    print(f"{args.nodes} nodes, {args.nodes * 2} pods, {args.writers} writers, {args.readers} readers")
+    for name, read in (("locked reads", locked_read), ("snapshot reads", snapshot_read)):
+        reads, writes, stuck = run(server, read, args)
+        print(f"{name:<15} {reads:8.1f} reads/s  {writes:10.1f} writes/s  stuck threads: {stuck}")
+        if stuck:
+            raise SystemExit("Threads did not finish: possible deadlock")
+
+
+if __name__ == "__main__":
+    main()
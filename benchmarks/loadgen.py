@@ -0,0 +1,279 @@
+"""Open-loop load generator for the API server, with machine-readable results.
+
+Registers --nodes nodes, then for --duration seconds sends pods at --pod-rate
+(Poisson arrivals, each deleted again after --pod-lifetime seconds), a heartbeat
+from every live node each --heartbeat-interval seconds, and GET /nodes and GET
+/pods at --list-rate. --failures nodes are killed at even intervals: they stop
+heartbeating, so the server's health monitor fails them and reschedules their
+pods. Latency is measured from when each request was due, so a server that falls
+behind shows it instead of slowing the load down.
+
+By default the Flask app runs in-process on a fake container runtime, which also
+times scheduler decisions and reschedule_pods. With --url the load goes to a
+running server instead (start it with NODE_RUNTIME=external).
+
+Usage: python benchmarks/loadgen.py [--nodes 500] [--pod-rate 200] [--duration 30]
+                                    [--failures 5] [--output results.json]
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _util import FakeRuntime, Histogram, load_server
+
+
+class InProcessClient:
+    """Requests through Flask's test client, one per worker thread"""
+
+    def __init__(self, server):
+        self._app = server.app
+        self._local = threading.local()
+
+    def request(self, method, path, payload=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self._app.test_client()
+        response = client.open(path, method=method, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """Requests to a running server, one keep-alive session per worker thread"""
+
+    def __init__(self, base_url):
+        self._base_url = base_url.rstrip("/")
+        self._local = threading.local()
+
+    def request(self, method, path, payload=None):
+        import requests
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.request(method, self._base_url + path, json=payload, timeout=30)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+
+def timed(histogram, function):
+    """Wrap `function` so every call's duration is recorded in `histogram`"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.record(time.perf_counter() - start)
+    return wrapper
+
+
+class LoadGenerator:
+    def __init__(self, client, args, runtime=None):
+        self.client = client
+        self.args = args
+        self.runtime = runtime
+        self.rng = random.Random(args.seed)
+        self.histograms = {}
+        self.errors = {}
+        self.node_ids = []
+        self.dead = set()
+        self._pending_deletes = []   # (due, "delete", pod_id) queued by the worker threads
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="loadgen")
+
+    def setup(self):
+        """Register the nodes and bring them to Healthy with a first heartbeat (not measured)"""
+        status, body = self.client.request("POST", f"/nodes/batch?count={self.args.nodes}",
+                                           {"cpuCores": self.args.node_cpu})
+        if status != 202:
+            raise RuntimeError(f"Could not register nodes: {status} {body}")
+        self.node_ids = body["nodeIds"]
+        deadline = time.time() + 60
+        pending = list(self.node_ids)
+        while pending and time.time() < deadline:
+            pending = [node_id for node_id in pending
+                       if self.client.request("POST", "/heartbeat", self._heartbeat(node_id))[0] != 200]
+            if pending:
+                time.sleep(0.1)   # Provisioning has not registered them yet
+        if pending:
+            raise RuntimeError(f"{len(pending)} nodes never accepted a heartbeat")
+
+    def run(self):
+        """Dispatch the workload for --duration seconds; returns the elapsed time"""
+        args = self.args
+        start = time.perf_counter()
+        end = start + args.duration
+        queue = []   # (due, seq, kind, arg)
+        seq = 0
+
+        def schedule(due, kind, arg=None):
+            nonlocal seq
+            if due < end:
+                heapq.heappush(queue, (due, seq, kind, arg))
+                seq += 1
+
+        if args.pod_rate:
+            schedule(start + self.rng.expovariate(args.pod_rate), "pod")
+        if args.heartbeat_interval:
+            # Spread each node's heartbeats evenly over the interval
+            step = args.heartbeat_interval / len(self.node_ids)
+            for i, node_id in enumerate(self.node_ids):
+                schedule(start + i * step, "heartbeat", node_id)
+        if args.list_rate:
+            schedule(start, "list", 0)
+        for i in range(args.failures):
+            schedule(start + args.duration * (i + 1) / (args.failures + 1), "failure")
+
+        futures = []
+        while queue:
+            with self._lock:
+                for item in self._pending_deletes:
+                    schedule(*item)
+                self._pending_deletes.clear()
+
+            due, _, kind, arg = heapq.heappop(queue)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            if kind == "pod":
+                futures.append(self._executor.submit(self._launch_pod, due))
+                schedule(due + self.rng.expovariate(args.pod_rate), "pod")
+            elif kind == "heartbeat":
+                if arg not in self.dead:
+                    futures.append(self._executor.submit(self._send, due, "POST /heartbeat",
+                                                         "/heartbeat", self._heartbeat(arg)))
+                    schedule(due + args.heartbeat_interval, "heartbeat", arg)
+            elif kind == "list":
+                path = "/nodes" if arg % 2 == 0 else "/pods"
+                futures.append(self._executor.submit(self._send, due, f"GET {path}", path))
+                schedule(due + 1 / args.list_rate, "list", arg + 1)
+            elif kind == "failure":
+                self._kill_node()
+            elif kind == "delete":
+                futures.append(self._executor.submit(self._send, due, "DELETE /pods", f"/pods/{arg}",
+                                                     method="DELETE"))
+
+        for future in futures:
+            future.result()
+        return time.perf_counter() - start
+
+    def results(self, elapsed, extra):
+        endpoints = {name: dict(histogram.summary(elapsed), errors=self.errors.get(name, 0))
+                     for name, histogram in sorted(self.histograms.items())}
+        return dict({
+            "config": vars(self.args),
+            "elapsed_s": round(elapsed, 3),
+            "requests_per_second": round(sum(h.count for h in self.histograms.values()) / elapsed, 2),
+            "endpoints": endpoints,
+            "nodes_killed": len(self.dead)
+        }, **extra)
+
+    def histogram(self, name):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            return self.histograms[name]
+
+    def _heartbeat(self, node_id):
+        return {"nodeId": node_id, "cpuCores": self.args.node_cpu, "podsVersion": 0}
+
+    def _send(self, due, name, path, payload=None, method=None):
+        method = method or name.split()[0]
+        try:
+            status, body = self.client.request(method, path, payload)
+        except Exception:
+            status, body = None, None
+        self.histogram(name).record(time.perf_counter() - due)
+        if status is None or status >= 400:
+            with self._lock:
+                self.errors[name] = self.errors.get(name, 0) + 1
+        return status, body
+
+    def _launch_pod(self, due):
+        status, body = self._send(due, "POST /pods", "/pods", {"cpuRequired": self.args.pod_cpu})
+        if status == 201 and self.args.pod_lifetime:
+            with self._lock:
+                self._pending_deletes.append((due + self.args.pod_lifetime, "delete", body["podId"]))
+
+    def _kill_node(self):
+        live = [node_id for node_id in self.node_ids if node_id not in self.dead]
+        if not live:
+            return
+        node_id = self.rng.choice(live)
+        self.dead.add(node_id)
+        if self.runtime is not None:
+            self.runtime.kill(node_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API server load generator")
+    parser.add_argument("--url", help="load a running server instead of an in-process one")
+    parser.add_argument("--nodes", type=int, default=500)
+    parser.add_argument("--node-cpu", type=int, default=16)
+    parser.add_argument("--pod-rate", type=float, default=200, help="pod arrivals per second")
+    parser.add_argument("--pod-cpu", type=float, default=1)
+    parser.add_argument("--pod-lifetime", type=float, default=10, help="seconds before a pod is deleted")
+    parser.add_argument("--heartbeat-interval", type=float, default=5, help="seconds between a node's heartbeats")
+    parser.add_argument("--list-rate", type=float, default=2, help="GET /nodes and /pods per second")
+    parser.add_argument("--failures", type=int, default=5, help="nodes killed during the run")
+    parser.add_argument("--heartbeat-timeout", type=float,
+                        help="in-process only: seconds without a heartbeat before a node is probed "
+                             "(default: twice the heartbeat interval)")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    extra = {}
+    if args.url:
+        generator = LoadGenerator(HttpClient(args.url), args)
+    else:
+        os.environ.setdefault("NODE_RUNTIME", "external")
+        if args.heartbeat_timeout is None:
+            args.heartbeat_timeout = 2 * (args.heartbeat_interval or 5)
+        os.environ["HEARTBEAT_TIMEOUT"] = str(args.heartbeat_timeout)
+        os.environ["MONITOR_INTERVAL"] = str(min(1.0, args.heartbeat_timeout / 2))
+        # The generated nodes beat at the fixed --heartbeat-interval, so the server must not pace them
+        os.environ["HEARTBEAT_MAX_RATE"] = os.environ["HEARTBEAT_MAX_IN_FLIGHT"] = "0"
+        server = load_server()
+        server.runtime = FakeRuntime()
+        generator = LoadGenerator(InProcessClient(server), args, server.runtime)
+
+        # Time the decisions behind the endpoints as well
+        select, reschedule = Histogram(), Histogram()
+        server.scheduler.select = timed(select, server.scheduler.select)
+        server.reschedule_pods = timed(reschedule, server.reschedule_pods)
+        threading.Thread(target=server.health_monitor, daemon=True).start()
+
+    generator.setup()
+    elapsed = generator.run()
+
+    if not args.url:
+        with server.store.lock:
+            extra["cluster"] = {
+                "nodes": len(server.nodes),
+                "failed_nodes": sum(1 for node in server.nodes.values() if node.health_status == "Failed"),
+                "pods": len(server.pods)
+            }
+        extra["scheduler_select"] = select.summary()
+        extra["reschedule_pods"] = reschedule.summary()
+
+    output = json.dumps(generator.results(elapsed, extra), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,23 +2,69 @@ import argparse
 import json
 import requests
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 API_BASE_URL = "http://localhost:8080"
 
-def add_node(cpu_cores):
-    try:
-        response = requests.post(
-            f"{API_BASE_URL}/nodes",
-            json={"cpuCores": cpu_cores},
-            timeout=10
-        )
+def wait_for_job(job_id, timeout):
+    """Poll a provisioning job until all its nodes are ready or failed"""
+    deadline = time.time() + timeout
+    while True:
+        response = requests.get(f"{API_BASE_URL}/jobs/{job_id}", timeout=10)
+        if response.status_code != 200:
+            print(f"Failed to get job status: {response.text}")
+            sys.exit(1)
         
-        if response.status_code == 201:
-            print(response.text)
+        job = response.json()
+        if job["status"] != "Provisioning":
+            return job
+        if time.time() >= deadline:
+            print(f"Timed out waiting for job {job_id}: {job['provisioning']} nodes still provisioning")
+            sys.exit(1)
+        time.sleep(1)
+
+def node_resources(cpu_cores, memory_mb=None):
+    """Request body for new nodes; without memory_mb the server picks a default for the CPU"""
+    resources = {"cpuCores": cpu_cores}
+    if memory_mb is not None:
+        resources["memoryMb"] = memory_mb
+    return resources
+
+def add_node(cpu_cores, count=1, wait=True, timeout=120, memory_mb=None):
+    try:
+        if count == 1:
+            response = requests.post(
+                f"{API_BASE_URL}/nodes",
+                json=node_resources(cpu_cores, memory_mb),
+                timeout=10
+            )
         else:
+            response = requests.post(
+                f"{API_BASE_URL}/nodes/batch",
+                params={"count": count},
+                json=node_resources(cpu_cores, memory_mb),
+                timeout=10
+            )
+        
+        if response.status_code != 202:
             print(f"Failed to add node, status: {response.status_code}")
             print(response.text)
             sys.exit(1)
+        
+        result = response.json()
+        print(result["message"])
+        print(f"Job ID: {result['jobId']}")
+        if not wait:
+            return
+        
+        job = wait_for_job(result["jobId"], timeout)
+        print(f"{job['ready']} node(s) ready, {job['failed']} failed")
+        for node_id, error in job["errors"].items():
+            print(f"Node {node_id}: {error}")
+        if job["failed"]:
+            sys.exit(1)
             
     except Exception as e:
         print(f"Error: {e}")
@@ -58,11 +104,11 @@ def delete_node(node_id):
         print(f"Error: {e}")
         sys.exit(1)
 
-def launch_pod(cpu_required):
+def launch_pod(cpu_required, memory_required_mb=0):
     try:
         response = requests.post(
             f"{API_BASE_URL}/pods",
-            json={"cpuRequired": cpu_required},
+            json={"cpuRequired": cpu_required, "memoryRequiredMb": memory_required_mb},
             timeout=10
         )
         
@@ -77,6 +123,34 @@ def launch_pod(cpu_required):
         print(f"Error: {e}")
         sys.exit(1)
 
+def launch_pods(cpu_requests, memory_required_mb=0):
+    try:
+        response = requests.post(
+            f"{API_BASE_URL}/pods/batch",
+            json={"pods": [{"cpuRequired": cpu, "memoryRequiredMb": memory_required_mb} for cpu in cpu_requests]},
+            timeout=60
+        )
+        
+        if response.status_code == 201:
+            result = response.json()
+            print(f"Launched {result['placed']}/{len(cpu_requests)} pods")
+            if result['failed']:
+                print(f"{result['failed']} pods could not be placed")
+                sys.exit(1)
+        else:
+            print(f"Failed to launch pods, status: {response.status_code}")
+            print(response.text)
+            sys.exit(1)
+            
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+def read_cpu_requests(path):
+    """Read one CPU requirement per line, skipping blank lines and # comments"""
+    with open(path) as f:
+        return [int(line) for line in (l.split('#')[0].strip() for l in f) if line]
+
 def list_nodes():
     try:
         response = requests.get(
@@ -88,6 +162,7 @@ def list_nodes():
             nodes = response.json()
             for node_id, node in nodes.items():
                 print(f"Node {node_id}: CPU {node['available_cpu']}/{node['cpu_cores']}, "
+                      f"Memory {node['available_memory_mb']}/{node['memory_mb']} MiB, "
                       f"Status: {node['health_status']}, Pods: {node['pods']}")
         else:
             print(f"Failed to list nodes: {response.text}")
@@ -97,6 +172,258 @@ def list_nodes():
         print(f"Error: {e}")
         sys.exit(1)
 
+def print_event(event):
+    obj = event["object"]
+    if event["kind"] == "node":
+        details = (f"status={obj['health_status']} cpu={obj['available_cpu']}/{obj['cpu_cores']} "
+                   f"memory={obj['available_memory_mb']}/{obj['memory_mb']}")
+    else:
+        details = (f"node={obj['node_id']} status={obj['status']} cpu={obj['cpu_required']} "
+                   f"memory={obj['memory_required_mb']}")
+    print(f"[{event['version']}] {event['type']:<8} {event['kind']} {obj['id']} {event['reason']} {details}")
+
+def watch(since=None, timeout=30):
+    """Print cluster change events as they happen, using long-polling on /watch"""
+    session = requests.Session()
+    try:
+        if since is None:
+            response = session.get(f"{API_BASE_URL}/nodes", timeout=10)
+            since = int(response.headers["X-Resource-Version"])
+        print(f"Watching for changes after version {since}")
+        
+        while True:
+            response = session.get(
+                f"{API_BASE_URL}/watch",
+                params={"since": since, "timeout": timeout},
+                timeout=timeout + 10
+            )
+            
+            if response.status_code == 410:
+                since = response.json()["version"]
+                print(f"Missed events, resuming from version {since}")
+                continue
+            if response.status_code != 200:
+                print(f"Failed to watch: {response.text}")
+                sys.exit(1)
+            
+            result = response.json()
+            for event in result["events"]:
+                print_event(event)
+            since = result["version"]
+            
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+class WorkloadRunner:
+    """Run operations from a JSONL file over one pooled keep-alive session.
+
+    Each line is an object whose "op" is a CLI command name (add-node,
+    launch-pod, stop-node, delete-node, delete-pod, fail-node) with that
+    command's arguments as fields, or "wait", which lets everything sent so far
+    finish, including provisioning. Consecutive launch-pod lines go out as
+    /pods/batch requests and consecutive add-node lines with the same resources as one
+    /nodes/batch request; other operations run with up to `concurrency` in flight
+    and in no particular order between waits. Lines without an "op" are skipped.
+    """
+
+    def __init__(self, concurrency=16, batch_size=500, timeout=120):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.counts = {}     # op -> [succeeded, failed]
+        self.errors = []     # (line number, op, message), the first few
+        self.requests = 0
+        self.skipped = 0
+        self._jobs = []      # (line number, provisioning job ID) not waited for yet
+        self._pods = []      # (line number, cpu required, memory required) not sent yet
+        self._nodes = None   # (line number, (cpu cores, memory), count) not sent yet
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="apply")
+        self._slots = threading.BoundedSemaphore(concurrency * 2)
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def run(self, lines):
+        for line_no, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                op = json.loads(line)
+                name = op.get("op") if isinstance(op, dict) else None
+                if name is None:
+                    self.skipped += 1
+                    continue
+                self.dispatch(line_no, name, op)
+            except (ValueError, KeyError, TypeError) as e:
+                self.record(line_no, "invalid", False, f"{type(e).__name__}: {e}")
+        self.wait()
+        self._executor.shutdown()
+
+    def dispatch(self, line_no, name, op):
+        if name != "launch-pod":
+            self.flush_pods()
+        if name != "add-node":
+            self.flush_nodes()
+        
+        if name == "launch-pod":
+            self._pods.extend([(line_no, op["cpuRequired"], op.get("memoryRequiredMb", 0))] * op.get("count", 1))
+            if len(self._pods) >= self.batch_size:
+                self.flush_pods()
+        elif name == "add-node":
+            resources, count = (op["cpuCores"], op.get("memoryMb")), op.get("count", 1)
+            if self._nodes is not None and self._nodes[1] != resources:
+                self.flush_nodes()
+            if self._nodes is None:
+                self._nodes = (line_no, resources, 0)
+            self._nodes = (self._nodes[0], resources, self._nodes[2] + count)
+        elif name == "stop-node":
+            self.submit(line_no, name, "POST", f"/nodes/{op['nodeId']}/stop", expect=200)
+        elif name == "delete-node":
+            self.submit(line_no, name, "DELETE", f"/nodes/{op['nodeId']}/delete", expect=200)
+        elif name == "delete-pod":
+            self.submit(line_no, name, "DELETE", f"/pods/{op['podId']}", expect=200)
+        elif name == "fail-node":
+            self.submit(line_no, name, "POST", f"/nodes/{op['nodeId']}/fail",
+                        {"type": op.get("type", "kill")}, expect=200)
+        elif name == "wait":
+            self.wait()
+        else:
+            self.record(line_no, name, False, "unknown operation")
+
+    def flush_pods(self):
+        # One launch-pod line's count can exceed batch_size, so send at most that many per request
+        pending, self._pods = self._pods, []
+        for start in range(0, len(pending), self.batch_size):
+            self.send_pods(pending[start:start + self.batch_size])
+
+    def send_pods(self, batch):
+        def done(body):
+            # Pods the scheduler could not place count as failures of their own lines
+            for (line_no, _, _), result in zip(batch, body["results"]):
+                self.record(line_no, "launch-pod", "error" not in result, result.get("error"))
+        
+        self.submit(batch[0][0], "launch-pod", "POST", "/pods/batch",
+                    {"pods": [{"cpuRequired": cpu, "memoryRequiredMb": memory} for _, cpu, memory in batch]},
+                    expect=201, on_success=done,
+                    ops=len(batch))
+
+    def flush_nodes(self):
+        if self._nodes is None:
+            return
+        line_no, (cpu_cores, memory_mb), count = self._nodes
+        self._nodes = None
+        
+        def done(body):
+            with self._lock:
+                self._jobs.append((line_no, body["jobId"]))
+        
+        self.submit(line_no, "add-node", "POST", f"/nodes/batch?count={count}", node_resources(cpu_cores, memory_mb),
+                    expect=202, on_success=done, ops=count)
+
+    def submit(self, line_no, name, method, path, payload=None, expect=200, on_success=None, ops=1):
+        """Send one request on the pool, blocking while too many are already queued.
+
+        `on_success` gets the response body and records the outcome itself; `ops`
+        is how many operations the request carries, for counting failures.
+        """
+        self._slots.acquire()
+        future = self._executor.submit(self.send, line_no, name, method, path, payload, expect, on_success, ops)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._finished)
+
+    def send(self, line_no, name, method, path, payload, expect, on_success, ops):
+        try:
+            response = self.session.request(method, f"{API_BASE_URL}{path}", json=payload, timeout=60)
+            with self._lock:
+                self.requests += 1
+            if response.status_code != expect:
+                for _ in range(ops):
+                    self.record(line_no, name, False, f"status {response.status_code}: {response.text.strip()}")
+                return
+            if on_success is not None:
+                on_success(response.json())
+            else:
+                self.record(line_no, name, True)
+        except Exception as e:
+            for _ in range(ops):
+                self.record(line_no, name, False, str(e))
+
+    def wait(self):
+        """Send what is buffered and wait for every request and provisioning job so far"""
+        self.flush_pods()
+        self.flush_nodes()
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if not futures:
+                break
+            for future in futures:
+                future.result()
+        
+        with self._lock:
+            jobs, self._jobs = self._jobs, []
+        deadline = time.time() + self.timeout
+        for line_no, job_id in jobs:
+            while True:
+                job = self.session.get(f"{API_BASE_URL}/jobs/{job_id}", timeout=10).json()
+                self.requests += 1
+                if job["status"] != "Provisioning" or time.time() >= deadline:
+                    break
+                time.sleep(0.5)
+            for _ in range(job["ready"]):
+                self.record(line_no, "add-node", True)
+            for node_id, error in job["errors"].items():
+                self.record(line_no, "add-node", False, f"node {node_id}: {error}")
+            for _ in range(job.get("provisioning", 0)):
+                self.record(line_no, "add-node", False, "still provisioning after timeout")
+
+    def record(self, line_no, name, ok, message=None):
+        with self._lock:
+            counts = self.counts.setdefault(name, [0, 0])
+            counts[0 if ok else 1] += 1
+            if not ok and len(self.errors) < 10:
+                self.errors.append((line_no, name, message))
+
+    def _finished(self, future):
+        with self._lock:
+            self._futures.discard(future)
+        self._slots.release()
+
+def apply(path, concurrency, batch_size, timeout):
+    runner = WorkloadRunner(concurrency, batch_size, timeout)
+    start = time.perf_counter()
+    try:
+        if path == "-":
+            runner.run(sys.stdin)
+        else:
+            with open(path) as f:
+                runner.run(f)
+    except KeyboardInterrupt:
+        print("Interrupted")
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    
+    succeeded = sum(ok for ok, _ in runner.counts.values())
+    failed = sum(failed for _, failed in runner.counts.values())
+    print(f"Applied {succeeded + failed} operations in {elapsed:.2f}s "
+          f"({(succeeded + failed) / max(elapsed, 1e-9):.1f} ops/s, {runner.requests} requests): "
+          f"{succeeded} succeeded, {failed} failed, {runner.skipped} lines skipped")
+    for name, (ok, failed_count) in sorted(runner.counts.items()):
+        print(f"  {name:<12} {ok:8d} ok {failed_count:8d} failed")
+    for line_no, name, message in runner.errors:
+        print(f"  line {line_no} {name}: {message}")
+    if failed:
+        sys.exit(1)
+
 def main():
     parser = argparse.ArgumentParser(description="Kube-Sim CLI")
     subparsers = parser.add_subparsers(dest="command", help="Command to execute")
@@ -104,6 +431,10 @@ def main():
     # Add node command
     add_node_parser = subparsers.add_parser("add-node", help="Add a new node with specified CPU cores")
     add_node_parser.add_argument("cpuCores", type=int, help="Number of CPU cores")
+    add_node_parser.add_argument("--memory", type=int, help="Memory in MiB (default: the server's per-core default)")
+    add_node_parser.add_argument("--count", type=int, default=1, help="Number of nodes to add")
+    add_node_parser.add_argument("--no-wait", action="store_true", help="Return once provisioning has been queued")
+    add_node_parser.add_argument("--timeout", type=int, default=120, help="Seconds to wait for nodes to become ready")
     
     # Stop node command
     stop_node_parser = subparsers.add_parser("stop-node", help="Stop a node")
@@ -116,10 +447,29 @@ def main():
     # Launch pod command
     launch_pod_parser = subparsers.add_parser("launch-pod", help="Launch a pod with specified CPU requirements")
     launch_pod_parser.add_argument("cpuRequired", type=int, help="CPU required")
+    launch_pod_parser.add_argument("--memory", type=int, default=0, help="Memory required in MiB")
+    
+    # Launch pods command
+    launch_pods_parser = subparsers.add_parser("launch-pods", help="Launch many pods in a single batch request")
+    launch_pods_parser.add_argument("--count", type=int, default=1, help="Number of pods")
+    launch_pods_parser.add_argument("--cpu", type=int, help="CPU required per pod")
+    launch_pods_parser.add_argument("--memory", type=int, default=0, help="Memory required per pod in MiB")
+    launch_pods_parser.add_argument("--file", help="File with one CPU requirement per line")
     
     # List nodes command
     subparsers.add_parser("list-nodes", help="List all nodes with their health status")
     
+    # Watch command
+    watch_parser = subparsers.add_parser("watch", help="Stream node and pod changes")
+    watch_parser.add_argument("--since", type=int, help="Resource version to watch from (default: now)")
+    
+    # Apply command
+    apply_parser = subparsers.add_parser("apply", help="Run the operations in a JSONL workload file")
+    apply_parser.add_argument("-f", "--file", required=True, help="JSONL file, one operation per line ('-' for stdin)")
+    apply_parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    apply_parser.add_argument("--batch-size", type=int, default=500, help="Pods per /pods/batch request")
+    apply_parser.add_argument("--timeout", type=int, default=120, help="Seconds a wait gives provisioning")
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -127,15 +477,26 @@ def main():
         sys.exit(1)
     
     if args.command == "add-node":
-        add_node(args.cpuCores)
+        add_node(args.cpuCores, args.count, not args.no_wait, args.timeout, args.memory)
     elif args.command == "stop-node":
         stop_node(args.nodeID)
     elif args.command == "delete-node":
         delete_node(args.nodeID)
     elif args.command == "launch-pod":
-        launch_pod(args.cpuRequired)
+        launch_pod(args.cpuRequired, args.memory)
+    elif args.command == "launch-pods":
+        if args.file:
+            launch_pods(read_cpu_requests(args.file), args.memory)
+        elif args.cpu is not None:
+            launch_pods([args.cpu] * args.count, args.memory)
+        else:
+            launch_pods_parser.error("either --cpu or --file is required")
     elif args.command == "list-nodes":
         list_nodes()
+    elif args.command == "watch":
+        watch(args.since)
+    elif args.command == "apply":
+        apply(args.file, args.concurrency, args.batch_size, args.timeout)
 
 if __name__ == "__main__":
     main() 
@@ -1,7 +1,10 @@
+import asyncio
 import json
 import os
+import random
 import time
 import requests
+from requests.adapters import HTTPAdapter
 import sys
 import signal
 import logging
@@ -13,89 +16,253 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# After a failed heartbeat, retry after a random wait of up to RETRY_BASE x 2^(failures - 1)
+# seconds (at most RETRY_CAP); give up after MAX_FAILURES consecutive failures
+RETRY_BASE = 1
+RETRY_CAP = 30
+MAX_FAILURES = 8
+
+def heartbeat_delay(interval, jitter, failures):
+    """Seconds until the next heartbeat: the interval spread uniformly over +/- jitter, or after
+    failed attempts an exponential backoff with full jitter, so that nodes which lost the server
+    together do not retry together"""
+    if failures:
+        return random.uniform(0, min(RETRY_CAP, RETRY_BASE * 2 ** (failures - 1)))
+    return random.uniform(interval - jitter, interval + jitter)
+
 class NodeSimulator:
-    def __init__(self):
-        self.node_id = os.environ.get("NODE_ID")
-        self.api_server = os.environ.get("API_SERVER")
-        self.cpu_cores = int(os.environ.get("CPU_CORES", "2"))  # Default to 2 cores
-        self.pods = []
+    def __init__(self, node_id=None, api_server=None, cpu_cores=None, memory_mb=None):
+        self.node_id = node_id or os.environ.get("NODE_ID")
+        self.api_server = api_server or os.environ.get("API_SERVER")
+        self.cpu_cores = cpu_cores or int(os.environ.get("CPU_CORES", "2"))  # Default to 2 cores
+        self.memory_mb = memory_mb if memory_mb is not None else int(os.environ.get("MEMORY_MB", "0"))
+        self.pods = {}  # Pod IDs in assignment order, kept as dict keys for O(1) updates
+        self.pods_version = None
+        self.interval = float(os.environ.get("HEARTBEAT_INTERVAL", "5"))   # until the server advertises one
+        self.jitter = 0.0
+        self.beats = 0
         self.running = True
         
         if not self.node_id or not self.api_server:
             logger.error("NODE_ID and API_SERVER environment variables must be set")
             sys.exit(1)
-            
-        # Register signal handlers
-        signal.signal(signal.SIGINT, self.handle_shutdown)
-        signal.signal(signal.SIGTERM, self.handle_shutdown)
     
     def handle_shutdown(self, signum, frame):
         logger.info("Shutting down node simulator...")
         self.running = False
     
+    def heartbeat_data(self):
+        return {
+            "nodeId": self.node_id,
+            "status": "Healthy",
+            "podsVersion": self.pods_version,
+            "cpuCores": self.cpu_cores,
+            "memoryMb": self.memory_mb,
+            "sentAt": time.time()
+        }
+    
+    def apply_assignments(self, response_data):
+        """Update pods from a heartbeat response: a full list, an added/removed delta, or nothing"""
+        if "pods" in response_data:
+            self.pods = dict.fromkeys(response_data["pods"])
+        else:
+            for pod_id in response_data.get("removed", []):
+                self.pods.pop(pod_id, None)
+            for pod_id in response_data.get("added", []):
+                self.pods[pod_id] = None
+        self.pods_version = response_data.get("podsVersion")
+    
+    def apply_heartbeat_response(self, response_data):
+        """Follow the interval and jitter the server advertises, then update pods"""
+        self.beats += 1
+        self.interval = response_data.get("heartbeatInterval", self.interval)
+        self.jitter = response_data.get("heartbeatJitter", self.jitter)
+        self.apply_assignments(response_data)
+    
+    def next_delay(self, failures):
+        """Seconds until the next heartbeat. After the first one the node waits a random part of
+        the interval, so nodes started together do not beat in lockstep."""
+        if not failures and self.beats == 1:
+            return random.uniform(0, self.interval)
+        return heartbeat_delay(self.interval, self.jitter, failures)
+    
     def run(self):
-        consecutive_failures = 0
-        max_failures = 3
+        failures = 0
         
         while self.running:
             try:
-                # Log the API server URL we're trying to connect to
-                logger.info(f"Attempting to send heartbeat to {self.api_server}")
-                
-                # Prepare heartbeat data
-                heartbeat_data = {
-                    "nodeId": self.node_id,
-                    "status": "Healthy",
-                    "pods": self.pods,
-                    "cpuCores": self.cpu_cores
-                }
+                # Per-heartbeat lines are debug-level and formatted lazily, so they cost nothing when off
+                logger.debug("Attempting to send heartbeat to %s", self.api_server)
+                response = requests.post(
+                    f"{self.api_server}/heartbeat",
+                    json=self.heartbeat_data(),
+                    timeout=5
+                )
                 
-                # Send heartbeat to API server with retry
-                for attempt in range(3):
-                    try:
-                        response = requests.post(
-                            f"{self.api_server}/heartbeat",
-                            json=heartbeat_data,
-                            timeout=5
-                        )
-                        
-                        if response.status_code == 200:
-                            # Reset failure count on success
-                            consecutive_failures = 0
-                            # Update pods from response
-                            response_data = response.json()
-                            self.pods = response_data.get("pods", [])
-                            logger.info(f"Node {self.node_id} heartbeat successful. Pods: {self.pods}")
-                            break
-                        else:
-                            logger.error(f"Failed to send heartbeat (attempt {attempt + 1}): {response.status_code}")
-                            if attempt < 2:  # Don't sleep on the last attempt
-                                time.sleep(1)
-                    except requests.exceptions.RequestException as e:
-                        logger.error(f"Network error (attempt {attempt + 1}): {e}")
-                        if attempt < 2:  # Don't sleep on the last attempt
-                            time.sleep(1)
-                
-                if response.status_code != 200:
-                    consecutive_failures += 1
-                    logger.error(f"All heartbeat attempts failed for node {self.node_id}")
-                    
+                if response.status_code == 200:
+                    failures = 0
+                    self.apply_heartbeat_response(response.json())
+                    logger.debug("Node %s heartbeat successful. Pods: %s", self.node_id, self.pods.keys())
+                else:
+                    failures += 1
+                    logger.error(f"Failed to send heartbeat (attempt {failures}): {response.status_code}")
+            except requests.exceptions.RequestException as e:
+                failures += 1
+                logger.error(f"Network error (attempt {failures}): {e}")
             except Exception as e:
-                consecutive_failures += 1
+                failures += 1
                 logger.error(f"Unexpected error in heartbeat loop: {e}")
             
-            # Check if we've had too many consecutive failures
-            if consecutive_failures >= max_failures:
-                logger.error(f"Too many consecutive failures ({consecutive_failures}). Shutting down node.")
+            if failures >= MAX_FAILURES:
+                logger.error(f"Too many consecutive failures ({failures}). Shutting down node.")
                 self.running = False
                 break
             
-            # Wait before next heartbeat
-            time.sleep(5)
+            time.sleep(self.next_delay(failures))
+    
+    async def run_async(self, post, interval=5):
+        """Heartbeat loop for hosting many nodes on one event loop.
+        
+        `post(path, payload)` delivers a request and returns (status_code, data);
+        a result of None means the request was lost on the network. `interval`
+        applies until the server advertises one.
+        """
+        if not self.beats:
+            self.interval = interval
+        failures = 0
+        
+        while self.running:
+            result = post("/heartbeat", self.heartbeat_data())
+            if result is not None and result[0] == 200:
+                failures = 0
+                self.apply_heartbeat_response(result[1])
+                logger.debug("Node %s heartbeat successful. Pods: %s", self.node_id, self.pods.keys())
+            else:
+                failures += 1
+                logger.warning(f"Heartbeat attempt {failures} failed for node {self.node_id}")
+            
+            if failures >= MAX_FAILURES:
+                logger.error(f"Too many consecutive failures ({failures}). Shutting down node {self.node_id}.")
+                self.running = False
+                break
+            
+            await asyncio.sleep(self.next_delay(failures))
+
+class NodeAgent:
+    """Hosts many node identities in one process and batches their heartbeats.
+    
+    Heartbeats go to POST /heartbeats in chunks of `batch_size` over one pooled
+    keep-alive session; each node's pod assignments come back in the response.
+    Nodes the server rejects (stopped or deleted) are dropped from the agent.
+    Rounds follow the interval and jitter the server advertises, starting from
+    `interval`.
+    """
+    
+    def __init__(self, api_server, node_ids, cpu_cores, interval=5, batch_size=500, memory_mb=0):
+        self.api_server = api_server
+        self.interval = interval
+        self.jitter = 0.0
+        self.batch_size = batch_size
+        self.running = True
+        self.nodes = {node_id: NodeSimulator(node_id, api_server, cpu_cores, memory_mb) for node_id in node_ids}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+    
+    @classmethod
+    def register(cls, api_server, count, cpu_cores, memory_mb=None, **kwargs):
+        """Ask the server for `count` new node identities and host them; memory_mb=None takes the
+        server's default for the CPU"""
+        resources = {"cpuCores": cpu_cores}
+        if memory_mb is not None:
+            resources["memoryMb"] = memory_mb
+        response = requests.post(
+            f"{api_server}/nodes/batch",
+            params={"count": count},
+            json=resources,
+            timeout=30
+        )
+        response.raise_for_status()
+        body = response.json()
+        return cls(api_server, body["nodeIds"], cpu_cores, memory_mb=body.get("memoryMb", memory_mb or 0),
+                   **kwargs)
+    
+    def handle_shutdown(self, signum, frame):
+        logger.info("Shutting down node agent...")
+        self.running = False
+    
+    def beat(self):
+        """Send one round of heartbeats for every hosted node; returns the number accepted"""
+        accepted = 0
+        node_ids = list(self.nodes)
+        
+        for i in range(0, len(node_ids), self.batch_size):
+            chunk = [self.nodes[node_id] for node_id in node_ids[i:i + self.batch_size]]
+            response = self.session.post(
+                f"{self.api_server}/heartbeats",
+                json={"heartbeats": [node.heartbeat_data() for node in chunk]},
+                timeout=10
+            )
+            response.raise_for_status()
+            body = response.json()
+            results = body["nodes"]
+            self.interval = body.get("heartbeatInterval", self.interval)
+            self.jitter = body.get("heartbeatJitter", self.jitter)
+            
+            for node in chunk:
+                result = results.get(node.node_id, {})
+                if result.get("status") == 200:
+                    node.apply_assignments(result)
+                    accepted += 1
+                else:
+                    logger.warning(f"Node {node.node_id} heartbeat rejected: {result.get('error')}")
+                    del self.nodes[node.node_id]
+        return accepted
+    
+    def run(self):
+        failures = 0
+        logger.info(f"Node agent hosting {len(self.nodes)} nodes")
+        
+        while self.running and self.nodes:
+            try:
+                accepted = self.beat()
+                failures = 0
+                logger.debug("Heartbeats accepted for %d/%d nodes", accepted, len(self.nodes))
+            except requests.exceptions.RequestException as e:
+                failures += 1
+                logger.error(f"Batched heartbeat failed (attempt {failures}): {e}")
+            
+            if failures >= MAX_FAILURES:
+                logger.error(f"Too many consecutive failures ({failures}). Shutting down node agent.")
+                break
+            
+            time.sleep(heartbeat_delay(self.interval, self.jitter, failures))
 
 def main():
-    node = NodeSimulator()
+    # Agent mode: NODE_IDS lists identities already registered with the server,
+    # NODE_COUNT asks the server to register that many new ones
+    node_ids = os.environ.get("NODE_IDS")
+    node_count = int(os.environ.get("NODE_COUNT", "0"))
+    if node_ids or node_count:
+        api_server = os.environ.get("API_SERVER")
+        if not api_server:
+            logger.error("API_SERVER environment variable must be set")
+            sys.exit(1)
+        cpu_cores = int(os.environ.get("CPU_CORES", "2"))
+        memory_mb = int(os.environ["MEMORY_MB"]) if "MEMORY_MB" in os.environ else None
+        if node_ids:
+            node = NodeAgent(api_server, node_ids.split(","), cpu_cores, memory_mb=memory_mb or 0)
+        else:
+            node = NodeAgent.register(api_server, node_count, cpu_cores, memory_mb)
+    else:
+        node = NodeSimulator()
+    
+    # Register signal handlers
+    signal.signal(signal.SIGINT, node.handle_shutdown)
+    signal.signal(signal.SIGTERM, node.handle_shutdown)
+    
     node.run()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
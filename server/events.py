@@ -0,0 +1,51 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+
+class EventLog:
+    """Bounded ring buffer of cluster change events, numbered by a global resource version.
+
+    Every mutation of nodes or pods emits one event and bumps the version, so a
+    client holding a snapshot at version v only needs the events after v.
+    """
+
+    def __init__(self, capacity=10000, clock=time.time):
+        self.version = 0
+        self._clock = clock
+        self._events = deque(maxlen=capacity)
+        self._changed = threading.Condition()
+
+    def emit(self, type, kind, obj, reason):
+        """Record an ADDED, MODIFIED or DELETED event for a node or pod; returns its version"""
+        with self._changed:
+            self.version += 1
+            self._events.append({
+                "version": self.version,
+                "type": type,
+                "kind": kind,
+                "reason": reason,
+                "object": obj,
+                "time": self._clock()
+            })
+            self._changed.notify_all()
+            return self.version
+
+    def since(self, version):
+        """Events newer than `version`, or None if the buffer no longer reaches back that far"""
+        with self._changed:
+            return self._since(version)
+
+    def wait(self, version, timeout):
+        """Like since(), but block up to `timeout` seconds for something newer than `version`"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self._since(version)
+
+    def _since(self, version):
+        missing = self.version - version
+        if missing < 0 or missing > len(self._events):
+            return None
+        # Walk back from the newest event so the cost is proportional to what is returned
+        return list(itertools.islice(reversed(self._events), missing))[::-1]
@@ -0,0 +1,208 @@
+import heapq
+import math
+import threading
+import time
+
+import numpy as np
+
+# Weight of each arriving heartbeat in HeartbeatPacer's smoothed count of requests in flight
+LOAD_SMOOTHING = 0.05
+
+
+class HeartbeatTracker:
+    """Min-heap of heartbeat deadlines, so expiry checks only touch overdue nodes.
+
+    A heartbeat just moves the node's deadline forward in a dict; the heap keeps
+    at most one entry per node and stale entries are re-pushed with the current
+    deadline when they surface. Not thread-safe; the server calls it with
+    store.lock held.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._deadlines = {}   # node_id -> current deadline
+        self._heap = []        # (deadline, node_id), possibly older than _deadlines
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, node_id):
+        return node_id in self._deadlines
+
+    def touch(self, node_id, now=None, timeout=None):
+        """Record a heartbeat, starting to track the node if needed"""
+        self.set_deadline(node_id, (time.time() if now is None else now) + (timeout or self.timeout))
+
+    def set_deadline(self, node_id, deadline):
+        current = self._deadlines.get(node_id)
+        if current is None or deadline < current:
+            heapq.heappush(self._heap, (deadline, node_id))
+        self._deadlines[node_id] = deadline
+
+    def discard(self, node_id):
+        # The heap entry is dropped lazily when it surfaces
+        self._deadlines.pop(node_id, None)
+
+    def next_deadline(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now=None):
+        """Stop tracking and return the nodes whose deadline has passed"""
+        now = time.time() if now is None else now
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, node_id = heapq.heappop(self._heap)
+            deadline = self._deadlines.get(node_id)
+            if deadline is None:
+                continue
+            if deadline > now:
+                heapq.heappush(self._heap, (deadline, node_id))
+            else:
+                del self._deadlines[node_id]
+                expired.append(node_id)
+        return expired
+
+
+class HeartbeatPacer:
+    """Chooses the heartbeat interval and jitter the server advertises to nodes.
+
+    The interval is `interval` seconds until the cluster would send more than
+    `max_rate` heartbeats a second, and from there grows with the node count.
+    While more than `max_in_flight` heartbeat requests are being handled at once
+    (smoothed over recent arrivals) it is stretched in proportion, up to
+    `max_interval`. Nodes spread their beats over +/- `jitter` of the interval,
+    and the expiry timeout grows with the interval, so a node told to slow down
+    is not failed for doing so. max_rate or max_in_flight of 0 turns that
+    scaling off.
+    """
+
+    def __init__(self, interval, timeout, jitter=0.2, max_rate=1000, max_in_flight=64, max_interval=60):
+        self.base_interval = interval
+        self.base_timeout = timeout
+        self.jitter_fraction = jitter
+        self.max_rate = max_rate
+        self.max_in_flight = max_in_flight
+        self.max_interval = max(max_interval, interval)
+        self.interval = interval
+        self.jitter = interval * jitter
+        self.timeout = timeout
+        self.load = 0.0        # smoothed heartbeat requests in flight, as seen by arriving ones
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """Count a heartbeat request as in flight until end()"""
+        with self._lock:
+            self._in_flight += 1
+            self.load += (self._in_flight - self.load) * LOAD_SMOOTHING
+
+    def end(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def update(self, node_count):
+        """Recompute the advertised interval, jitter and timeout for `node_count` nodes"""
+        interval = self.base_interval
+        if self.max_rate:
+            interval = max(interval, node_count / self.max_rate)
+        if self.max_in_flight and self.load > self.max_in_flight:
+            interval *= self.load / self.max_in_flight
+        self.interval = min(interval, self.max_interval)
+        self.jitter = self.interval * self.jitter_fraction
+        self.timeout = self.base_timeout * self.interval / self.base_interval
+
+    def advertise(self):
+        """The fields heartbeat responses carry to pace their nodes"""
+        return {"heartbeatInterval": round(self.interval, 3), "heartbeatJitter": round(self.jitter, 3)}
+
+
+class HeartbeatHistory:
+    """The last `size` heartbeat arrival times and latencies of each node, as rings in
+    fixed-size NumPy arrays with one row per node.
+
+    Recording a beat writes two cells, through flat memoryviews of the arrays,
+    and advances the row's position; nothing is allocated until the rows run
+    out, when the arrays double. Rows of discarded nodes are cleared and
+    reused. Not thread-safe; the server calls it with store.lock held.
+    """
+
+    def __init__(self, size=64, rows=1024):
+        self.size = size
+        self._rows = {}        # node_id -> row
+        self._free = []        # rows of discarded nodes
+        self._positions = []   # next cell to write, per row
+        self._allocate(np.full((rows, size), np.nan), np.full((rows, size), np.nan, dtype=np.float32))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def record(self, node_id, at, latency=math.nan):
+        """Record a heartbeat at `at`; `latency` is NaN when the node did not report it"""
+        row = self._rows.get(node_id)
+        if row is None:
+            row = self._add(node_id)
+        position = self._positions[row]
+        cell = row * self.size + position
+        self._time_cells[cell] = at
+        self._latency_cells[cell] = latency
+        self._positions[row] = position + 1 if position + 1 < self.size else 0
+
+    def discard(self, node_id):
+        row = self._rows.pop(node_id, None)
+        if row is not None:
+            self._times[row] = np.nan
+            self._free.append(row)
+
+    def select(self, node_ids):
+        """The IDs found among `node_ids`, and copies of their (times, latencies) rows in that order"""
+        found = [node_id for node_id in node_ids if node_id in self._rows]
+        rows = [self._rows[node_id] for node_id in found]
+        return found, self._times[rows], self._latencies[rows]
+
+    def all(self):
+        """Copies of the (times, latencies) rows of every node; cleared rows hold no beats"""
+        used = len(self._positions)
+        return self._times[:used].copy(), self._latencies[:used].copy()
+
+    def _add(self, node_id):
+        if self._free:
+            row = self._free.pop()
+            self._positions[row] = 0
+        else:
+            row = len(self._positions)
+            self._positions.append(0)
+            if row == len(self._times):
+                self._allocate(np.concatenate([self._times, np.full_like(self._times, np.nan)]),
+                               np.concatenate([self._latencies, np.full_like(self._latencies, np.nan)]))
+        self._rows[node_id] = row
+        return row
+
+    def _allocate(self, times, latencies):
+        self._times, self._latencies = times, latencies
+        self._time_cells = memoryview(times).cast("B").cast("d")
+        self._latency_cells = memoryview(latencies).cast("B").cast("f")
+
+
+def downsample(times, latencies, start, resolution, buckets):
+    """Per-row heartbeat counts and latency sums and counts in `buckets` buckets of `resolution`
+    seconds from `start`, plus each bucket's latency maximum over all rows (NaN where none was
+    reported). Returns (counts, latency_sums, latency_counts, latency_max)."""
+    rows, size = times.shape
+    cells = rows * buckets
+    # NaN (unused) cells fail both comparisons
+    inside = np.flatnonzero((times >= start) & (times < start + resolution * buckets))
+    # Truncating is flooring here, and much faster than // on floats
+    bucket = ((times.ravel()[inside] - start) * (1 / resolution)).astype(np.int64)
+    np.minimum(bucket, buckets - 1, out=bucket)   # rounding at the far edge
+    cell = inside // size * buckets + bucket
+    counts = np.bincount(cell, minlength=cells).reshape(rows, buckets)
+
+    # Unreported latencies weigh nothing, which is cheaper than filtering them out
+    latency = latencies.ravel()[inside].astype(np.float64)
+    reported = ~np.isnan(latency)
+    latency_sums = np.bincount(cell, np.where(reported, latency, 0), minlength=cells).reshape(rows, buckets)
+    latency_counts = np.bincount(cell, reported, minlength=cells).reshape(rows, buckets)
+    latency_max = np.full(buckets, -np.inf)
+    np.maximum.at(latency_max, bucket, np.where(reported, latency, -np.inf))
+    latency_max[np.isinf(latency_max)] = np.nan
+    return counts, latency_sums, latency_counts, latency_max
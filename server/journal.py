@@ -0,0 +1,218 @@
+import logging
+import mmap
+import os
+import pickle
+import re
+import struct
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Journal record frame: payload length and CRC32, then a pickled (version, kind, type, object).
+# Pickle costs a fraction of JSON per record; the journal directory must only be writable
+# by the server, since loading a pickle can run code.
+_FRAME = struct.Struct("<II")
+
+# Snapshot layout: header, a NUL-separated string table, then fixed-size node and pod rows
+# whose strings are indexes into the table
+_SNAPSHOT_MAGIC = b"KSIM"
+_SNAPSHOT_FORMAT = 2
+_HEADER = struct.Struct("<4sHQQII")   # magic, format, resource version, table bytes, nodes, pods
+_NODE = struct.Struct("<IdQIdQ?d")    # id, cpu_cores, pods_version, health_status, last_heartbeat,
+                                      # heartbeat_count, is_running, memory_mb
+_POD = struct.Struct("<IIdIIddd")     # id, node_id, cpu_required, status, health_status,
+                                      # created_at, last_updated, memory_required_mb
+# Format 1 rows, from before memory was tracked; they load with memory None
+_NODE_V1 = struct.Struct("<IdQIdQ?")
+_POD_V1 = struct.Struct("<IIdIIdd")
+_POD_FIELDS = ("id", "node_id", "cpu_required", "status", "health_status",
+               "created_at", "last_updated", "memory_required_mb")
+_NONE = 0xFFFFFFFF
+
+_SEGMENT = re.compile(r"journal\.(\d+)\.log$")
+
+
+def _number(value):
+    return int(value) if value.is_integer() else value
+
+
+class Journal:
+    """Append-only log of node and pod changes, compacted by periodic snapshots.
+
+    Each record holds the full object after an event, so replay only has to
+    apply records newer than the snapshot's resource version. Records reach the
+    OS as they are appended, so a crashed process loses nothing; fsync is
+    batched to at most once per `fsync_interval` seconds, which bounds what a
+    power failure can lose. The log is split into segments so a checkpoint can
+    drop everything its snapshot covers.
+    """
+
+    def __init__(self, directory, fsync_interval=0.05):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.records = 0   # appended since the last checkpoint
+        self._lock = threading.Lock()         # the fd and the dirty flag, taken by append()
+        self._fsync_lock = threading.Lock()   # held across fsync, so rotation cannot close the fd
+        self._dirty = False
+        segments = self._segments()
+        self._segment = segments[-1] + 1 if segments else 0
+        self._fd = self._open(self._segment)
+        threading.Thread(target=self._flush_loop, daemon=True, name="journal-fsync").start()
+
+    def append(self, version, kind, type, obj):
+        payload = pickle.dumps((version, kind, type, obj), pickle.HIGHEST_PROTOCOL)
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            os.write(self._fd, frame)
+            self._dirty = True
+            self.records += 1
+
+    def recover(self):
+        """Return (version, nodes, pods, records): the snapshot's resource version, node
+        dicts and pod columns (see read_snapshot), and an iterator of the logged records
+        that follow it"""
+        path = os.path.join(self.directory, "snapshot.bin")
+        if os.path.exists(path):
+            version, nodes, pods = read_snapshot(path)
+        else:
+            version, nodes, pods = 0, [], _pod_columns([()] * len(_POD_FIELDS), [])
+        segments = [n for n in self._segments() if n < self._segment]
+        return version, nodes, pods, self._replay(segments, version)
+
+    def checkpoint(self, take_snapshot):
+        """Write the store Snapshot returned by `take_snapshot()` to disk and drop the
+        log segments it covers"""
+        # Rotate first: everything in the closed segments is then older than the snapshot.
+        # Appends move to the new segment at once; the old one is synced and closed after.
+        with self._fsync_lock:
+            with self._lock:
+                fd, dirty = self._fd, self._dirty
+                covered = self._segment
+                self._segment += 1
+                self._fd = self._open(self._segment)
+                self._dirty = False
+                self.records = 0
+            if dirty:
+                os.fsync(fd)
+            os.close(fd)
+
+        snapshot = take_snapshot()
+        path = os.path.join(self.directory, "snapshot.bin")
+        write_snapshot(path + ".tmp", snapshot.resource_version,
+                       snapshot.nodes.values(), snapshot.pods.values())
+        os.replace(path + ".tmp", path)
+        for segment in self._segments():
+            if segment <= covered:
+                os.remove(self._path(segment))
+
+    def _replay(self, segments, version):
+        for segment in segments:
+            with open(self._path(segment), "rb") as f:
+                data = f.read()
+            offset = 0
+            while offset + _FRAME.size <= len(data):
+                length, crc = _FRAME.unpack_from(data, offset)
+                payload = data[offset + _FRAME.size:offset + _FRAME.size + length]
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    logger.warning(f"Journal segment {segment} is truncated at byte {offset}, "
+                                   f"ignoring the rest")
+                    break
+                offset += _FRAME.size + length
+                record = pickle.loads(payload)
+                if record[0] > version:
+                    yield record
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            self._fsync()
+
+    def _fsync(self):
+        # fsync can take milliseconds on a real disk; append() runs under store.lock, so it
+        # must not wait for it. Only the fd and the dirty flag are read under _lock.
+        with self._fsync_lock:
+            with self._lock:
+                fd, dirty = self._fd, self._dirty
+                self._dirty = False
+            if dirty:
+                os.fsync(fd)
+
+    def _open(self, segment):
+        return os.open(self._path(segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"journal.{segment}.log")
+
+    def _segments(self):
+        return sorted(int(m.group(1)) for m in map(_SEGMENT.match, os.listdir(self.directory)) if m)
+
+
+def write_snapshot(path, version, nodes, pods):
+    """Write node and pod dicts (as rendered by the server) in the binary snapshot format"""
+    strings = {}
+    intern = lambda value: strings.setdefault(value, len(strings))
+
+    node_rows = b"".join(_NODE.pack(intern(n["id"]), n["cpu_cores"], n["pods_version"],
+                                    intern(n["health_status"]), n["last_heartbeat"],
+                                    n["heartbeat_count"], n["is_running"], n["memory_mb"]) for n in nodes)
+    pod_rows = b"".join(_POD.pack(intern(p["id"]),
+                                  _NONE if p["node_id"] is None else intern(p["node_id"]),
+                                  p["cpu_required"], intern(p["status"]), intern(p["health_status"]),
+                                  p["created_at"], p["last_updated"], p["memory_required_mb"]) for p in pods)
+    table = "\0".join(strings).encode()
+
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_FORMAT, version, len(table),
+                             len(node_rows) // _NODE.size, len(pod_rows) // _POD.size))
+        f.write(table)
+        f.write(node_rows)
+        f.write(pod_rows)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_snapshot(path):
+    """Return (version, node dicts, pod columns) from a snapshot file.
+
+    Pods come as {field: sequence of values}, one entry per pod in each, so a
+    large snapshot loads without building an object per pod.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, fmt, version, table_size, node_count, pod_count = _HEADER.unpack_from(data)
+        if magic != _SNAPSHOT_MAGIC or fmt not in (1, _SNAPSHOT_FORMAT):
+            raise ValueError(f"{path} is not a snapshot this server can read")
+        node_row, pod_row, padding = (_NODE_V1, _POD_V1, (None,)) if fmt == 1 else (_NODE, _POD, ())
+        offset = _HEADER.size
+        strings = data[offset:offset + table_size].decode().split("\0")
+        offset += table_size
+        node_rows = data[offset:offset + node_count * node_row.size]
+        offset += node_count * node_row.size
+        pod_rows = data[offset:offset + pod_count * pod_row.size]
+
+    nodes = [{
+        "id": strings[id],
+        "cpu_cores": _number(cpu_cores),
+        "pods_version": pods_version,
+        "health_status": strings[health_status],
+        "last_heartbeat": last_heartbeat,
+        "heartbeat_count": heartbeat_count,
+        "is_running": is_running,
+        "memory_mb": None if memory_mb is None else _number(memory_mb)
+    } for id, cpu_cores, pods_version, health_status, last_heartbeat, heartbeat_count, is_running, memory_mb
+        in (row + padding for row in node_row.iter_unpack(node_rows))]
+    fields = list(zip(*pod_row.iter_unpack(pod_rows))) or [()] * len(_POD_FIELDS)
+    if fmt == 1:
+        fields.append((0.0,) * pod_count)
+    return version, nodes, _pod_columns(fields, strings)
+
+
+def _pod_columns(fields, strings):
+    """Name the transposed pod rows and resolve their string indexes"""
+    columns = dict(zip(_POD_FIELDS, fields))
+    for name in ("id", "status", "health_status"):
+        columns[name] = list(map(strings.__getitem__, columns[name]))
+    columns["node_id"] = [None if node_id == _NONE else strings[node_id] for node_id in columns["node_id"]]
+    return columns
@@ -0,0 +1,179 @@
+import bisect
+import threading
+import time
+
+# Bucket upper bounds, in seconds
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+FAST_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                0.01, 0.025, 0.05, 0.1, 0.25, 1)
+HEARTBEAT_BUCKETS = (0.5, 1, 2, 3, 4, 4.5, 5, 5.5, 6, 7.5, 10, 15, 20, 30, 60)
+SUBPROCESS_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two in-place additions.
+
+    There is no lock, so the counts are approximate under concurrency:
+    `counts[i] += 1` and `sum += value` are a read and a write, and two threads
+    observing at once can lose one of the updates. A scrape that races an
+    observe() can also see the count and the sum one observation apart. For
+    latency histograms that is an acceptable price for a lock-free hot path.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _Family:
+    """A named metric and its children, one per combination of label values"""
+
+    def __init__(self, name, help, type, labels, make):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.label_names = labels
+        self._make = make
+        self._children = {}
+        self._lock = threading.Lock()
+        if not labels:
+            self._children[()] = make()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            # Only the first use of a label combination takes the lock
+            with self._lock:
+                child = self._children.setdefault(values, self._make())
+        return child
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            labels = dict(zip(self.label_names, values))
+            if self.type == "histogram":
+                cumulative = 0
+                for bound, count in zip(child.bounds + ("+Inf",), child.counts):
+                    cumulative += count
+                    yield "_bucket", dict(labels, le=bound), cumulative
+                yield "_sum", labels, child.sum
+                yield "_count", labels, cumulative
+            else:
+                yield "", labels, child.value
+
+
+class _GaugeFunction:
+    """A gauge computed at scrape time; `function` returns a value, or {label values: value}"""
+
+    type = "gauge"
+
+    def __init__(self, name, help, labels, function):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._function = function
+
+    def samples(self):
+        values = self._function()
+        if not self.label_names:
+            values = {(): values}
+        for key, value in values.items():
+            key = key if isinstance(key, tuple) else (key,)
+            yield "", dict(zip(self.label_names, key)), value
+
+
+class Registry:
+    """The metrics served at /metrics, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help, labels=()):
+        """A Counter, or with `labels` a family whose labels(*values) returns one"""
+        return self._add(_Family(name, help, "counter", labels, Counter))
+
+    def histogram(self, name, help, buckets=REQUEST_BUCKETS, labels=()):
+        """A Histogram, or with `labels` a family whose labels(*values) returns one"""
+        return self._add(_Family(name, help, "histogram", labels, lambda: Histogram(buckets)))
+
+    def gauge(self, name, help, function, labels=()):
+        gauge = _GaugeFunction(name, help, labels, function)
+        self._metrics.append(gauge)
+        return gauge
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric if metric.label_names else metric.labels()
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                if labels:
+                    pairs = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                    lines.append(f"{metric.name}{suffix}{{{pairs}}} {_number(value)}")
+                else:
+                    lines.append(f"{metric.name}{suffix} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class TimedLock:
+    """A reentrant lock that records how long each outermost acquire waited and
+    then held it. Nested acquires by the owner only count depth, which no other
+    thread touches while the lock is held."""
+
+    def __init__(self, lock, wait, hold):
+        self._lock = lock
+        self._wait = wait
+        self._hold = hold
+        self._depth = 0
+        self._acquired_at = 0.0
+
+    def acquire(self):
+        start = time.perf_counter()
+        self._lock.acquire()
+        self._depth += 1
+        if self._depth == 1:
+            self._acquired_at = time.perf_counter()
+            self._wait.observe(self._acquired_at - start)
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._hold.observe(time.perf_counter() - self._acquired_at)
+        self._lock.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return int(value)
+    return value
+
+
+registry = Registry()
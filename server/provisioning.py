@@ -0,0 +1,61 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ProvisionJob:
+    def __init__(self, id, node_ids):
+        self.id = id
+        self.node_ids = node_ids
+        self.created_at = time.time()
+        self.errors = {}   # node_id -> error message for launches that failed
+
+
+class Provisioner:
+    """Bounded worker pool that launches node runtimes in the background.
+
+    `launch(node_id, *spec)` returns an error message or None and runs on a
+    worker thread; `on_failure(node_id, error)` is called for failed launches.
+    Only the most recent `history` jobs are kept for status lookups.
+    """
+
+    def __init__(self, launch, on_failure, workers=8, history=1000):
+        self._launch = launch
+        self._on_failure = on_failure
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="provision")
+        self._jobs = OrderedDict()
+        self._history = history
+        self._lock = threading.Lock()
+
+    def submit(self, specs):
+        """Queue launches for a list of (node_id, *spec), e.g. (node_id, cpu_cores, memory_mb), and return the job"""
+        job = ProvisionJob(str(uuid.uuid4()), [node_id for node_id, *_ in specs])
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._history:
+                self._jobs.popitem(last=False)
+
+        for node_id, *spec in specs:
+            self._executor.submit(self._run, job, node_id, *spec)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def errors(self, job):
+        with self._lock:
+            return dict(job.errors)
+
+    def _run(self, job, node_id, *spec):
+        try:
+            error = self._launch(node_id, *spec)
+        except Exception as e:
+            error = str(e)
+
+        if error:
+            with self._lock:
+                job.errors[node_id] = error
+            self._on_failure(node_id, error)
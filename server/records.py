@@ -0,0 +1,358 @@
+import time
+from array import array
+
+_FREE = -1      # index slot never used; a lookup stops here
+_DELETED = -2   # index slot whose pod was removed; a lookup probes past it
+_RUNNING, _HEALTHY = 0, 1   # codes every PodTable starts with, for new pods
+
+
+def _number(value):
+    return int(value) if value.is_integer() else value
+
+
+class PodTable:
+    """Every pod, stored as one row across typed column arrays and looked up by pod ID.
+
+    Pods have no Python object of their own. CPU, memory and the two timestamps
+    are doubles, the status and health one byte each (codes for a few interned
+    strings), and the node ID a reference to the node's own string. IDs are found
+    through an open-addressing index of row numbers probed with the ID strings'
+    cached hashes, so the ID the API hands out is the only per-pod object. The
+    rows of removed pods are reused.
+
+    Lookups and iteration return Pod views. A view stays valid while its pod is in
+    the table; a removed pod's view can still be read until the next add().
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._ids = []            # row -> pod ID, None for a free row
+        self._node_ids = []       # row -> node ID or None
+        self._cpu = array("d")
+        self._memory = array("d")
+        self._created = array("d")
+        self._updated = array("d")
+        self._status = array("B")
+        self._health = array("B")
+        self._slot = array("i")   # row -> position in its node's NodePods
+        self._free = array("i")   # rows to reuse
+        self._index = array("i", [_FREE]) * 8
+        self._used = 0            # index slots not _FREE, deleted ones included
+        self._len = 0
+        self._strings = ["Running", "Healthy"]   # code -> interned string
+        self._codes = {"Running": _RUNNING, "Healthy": _HEALTHY}
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, pod_id):
+        return self._find(pod_id)[1] >= 0
+
+    def __iter__(self):
+        return (pod_id for pod_id in self._ids if pod_id is not None)
+
+    def __getitem__(self, pod_id):
+        pod = self.get(pod_id)
+        if pod is None:
+            raise KeyError(pod_id)
+        return pod
+
+    def __delitem__(self, pod_id):
+        if self.pop(pod_id) is None:
+            raise KeyError(pod_id)
+
+    def get(self, pod_id, default=None):
+        row = self._find(pod_id)[1]
+        return default if row < 0 else Pod(self, row, pod_id)
+
+    def entry(self, pod_id):
+        """Return (node ID, status) of a pod without making a view, or None if there is no such pod"""
+        row = self._find(pod_id)[1]
+        return None if row < 0 else (self._node_ids[row], self._strings[self._status[row]])
+
+    def values(self):
+        return (Pod(self, row, pod_id) for row, pod_id in enumerate(self._ids) if pod_id is not None)
+
+    def entries(self):
+        """Iterate (pod ID, node ID, status) of every pod, without making views"""
+        strings = self._strings
+        return ((pod_id, node_id, strings[status])
+                for pod_id, node_id, status in zip(self._ids, self._node_ids, self._status) if pod_id is not None)
+
+    def rows_by_node(self):
+        """Return {node ID: rows of the pods bound to it}"""
+        groups = {}
+        for row, (pod_id, node_id) in enumerate(zip(self._ids, self._node_ids)):
+            if pod_id is not None and node_id is not None:
+                groups.setdefault(node_id, []).append(row)
+        return groups
+
+    def demand(self, rows):
+        """Return the summed (CPU, memory) requests of `rows`"""
+        cpu, memory = self._cpu, self._memory
+        return _number(sum(cpu[row] for row in rows)), _number(sum(memory[row] for row in rows))
+
+    def load(self, columns):
+        """Append many pods at once from {field: sequence of values}, as read_snapshot returns
+        them; none of the IDs may be in the table already"""
+        codes = {value: self._code(value) for value in {*columns["status"], *columns["health_status"]}}
+        count = len(columns["id"])
+        self._ids.extend(columns["id"])
+        self._node_ids.extend(columns["node_id"])
+        self._cpu.extend(columns["cpu_required"])
+        self._memory.extend(columns["memory_required_mb"])
+        self._created.extend(columns["created_at"])
+        self._updated.extend(columns["last_updated"])
+        self._status.extend(map(codes.__getitem__, columns["status"]))
+        self._health.extend(map(codes.__getitem__, columns["health_status"]))
+        self._slot.extend(array("i", [0]) * count)
+        self._len += count
+        self._resize()
+
+    def add(self, pod_id, cpu_required, node_id, now=None, memory_required_mb=0):
+        """Insert a pod, Running and Healthy, and return its view"""
+        i, row = self._find(pod_id)
+        if row >= 0:
+            raise KeyError(f"Pod {pod_id} already exists")
+        now = time.time() if now is None else now
+        if self._free:
+            row = self._free.pop()
+            self._ids[row] = pod_id
+            self._node_ids[row] = node_id
+            self._cpu[row] = cpu_required
+            self._memory[row] = memory_required_mb
+            self._created[row] = self._updated[row] = now
+            self._status[row] = _RUNNING
+            self._health[row] = _HEALTHY
+            self._slot[row] = 0
+        else:
+            row = len(self._ids)
+            self._ids.append(pod_id)
+            self._node_ids.append(node_id)
+            self._cpu.append(cpu_required)
+            self._memory.append(memory_required_mb)
+            self._created.append(now)
+            self._updated.append(now)
+            self._status.append(_RUNNING)
+            self._health.append(_HEALTHY)
+            self._slot.append(0)
+        self._index[i] = row
+        self._used += 1
+        self._len += 1
+        if self._used * 3 > len(self._index) * 2:
+            self._resize()
+        return Pod(self, row, pod_id)
+
+    def pop(self, pod_id, default=None):
+        """Remove a pod and return its view, or `default` if there is no such pod"""
+        i, row = self._find(pod_id)
+        if row < 0:
+            return default
+        self._index[i] = _DELETED
+        self._ids[row] = None
+        self._free.append(row)
+        self._len -= 1
+        return Pod(self, row, pod_id)
+
+    def _find(self, pod_id):
+        """Return (index slot, row) of `pod_id`, or the free slot it would take and -1"""
+        index, ids = self._index, self._ids
+        mask = len(index) - 1
+        i = hash(pod_id) & mask
+        while True:
+            row = index[i]
+            if row == _FREE:
+                return i, -1
+            if row >= 0 and ids[row] == pod_id:
+                return i, row
+            i = (i + 1) & mask
+
+    def _resize(self):
+        """Rebuild the index at a third full or less, dropping the deleted slots"""
+        size = 8
+        while size < 3 * self._len:
+            size *= 2
+        index = array("i", [_FREE]) * size
+        mask = size - 1
+        for row, pod_id in enumerate(self._ids):
+            if pod_id is not None:
+                i = hash(pod_id) & mask
+                while index[i] != _FREE:
+                    i = (i + 1) & mask
+                index[i] = row
+        self._index, self._used = index, self._len
+
+    def _code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._strings)
+            self._strings.append(value)
+        return code
+
+
+class Pod:
+    """A view of one PodTable row, read and written like a record.
+
+    Views are made on demand, so two views of the same pod are equal rather than identical.
+    """
+
+    __slots__ = ("_table", "row", "id")
+
+    def __init__(self, table, row, id):
+        self._table = table
+        self.row = row
+        self.id = id
+
+    @property
+    def cpu_required(self):
+        value = self._table._cpu[self.row]
+        return int(value) if value.is_integer() else value
+
+    @cpu_required.setter
+    def cpu_required(self, value):
+        self._table._cpu[self.row] = value
+
+    @property
+    def memory_required_mb(self):
+        value = self._table._memory[self.row]
+        return int(value) if value.is_integer() else value
+
+    @memory_required_mb.setter
+    def memory_required_mb(self, value):
+        self._table._memory[self.row] = value
+
+    @property
+    def node_id(self):
+        return self._table._node_ids[self.row]
+
+    @node_id.setter
+    def node_id(self, value):
+        self._table._node_ids[self.row] = value
+
+    @property
+    def created_at(self):
+        return self._table._created[self.row]
+
+    @created_at.setter
+    def created_at(self, value):
+        self._table._created[self.row] = value
+
+    @property
+    def last_updated(self):
+        return self._table._updated[self.row]
+
+    @last_updated.setter
+    def last_updated(self, value):
+        self._table._updated[self.row] = value
+
+    @property
+    def status(self):
+        return self._table._strings[self._table._status[self.row]]
+
+    @status.setter
+    def status(self, value):
+        self._table._status[self.row] = self._table._code(value)
+
+    @property
+    def health_status(self):
+        return self._table._strings[self._table._health[self.row]]
+
+    @health_status.setter
+    def health_status(self, value):
+        self._table._health[self.row] = self._table._code(value)
+
+    def to_dict(self):
+        """All fields, read straight from the row"""
+        table, row = self._table, self.row
+        cpu, memory = table._cpu[row], table._memory[row]
+        return {
+            "id": self.id,
+            "cpu_required": int(cpu) if cpu.is_integer() else cpu,
+            "memory_required_mb": int(memory) if memory.is_integer() else memory,
+            "node_id": table._node_ids[row],
+            "status": table._strings[table._status[row]],
+            "health_status": table._strings[table._health[row]],
+            "created_at": table._created[row],
+            "last_updated": table._updated[row]
+        }
+
+    def __eq__(self, other):
+        return (isinstance(other, Pod) and self._table is other._table
+                and self.row == other.row and self.id == other.id)
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class NodePods:
+    """The pods bound to one node, as PodTable rows.
+
+    Adding, membership and removal are O(1) like a set, but storage is one array
+    entry per pod: each pod's row remembers its position, and removal moves the
+    last row into the gap. Iteration order is therefore not stable.
+    """
+
+    __slots__ = ("_rows", "_table")
+
+    def __init__(self):
+        self._rows = array("i")
+        self._table = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        table = self._table
+        return (Pod(table, row, table._ids[row]) for row in self._rows)
+
+    def __contains__(self, pod):
+        slot = pod._table._slot[pod.row]
+        return slot < len(self._rows) and self._rows[slot] == pod.row
+
+    def ids(self):
+        ids = self._table._ids if self._rows else ()
+        return [ids[row] for row in self._rows]
+
+    def extend(self, table, rows):
+        """Add many rows of `table` at once, as recovery does"""
+        self._table = table
+        slots = table._slot
+        for slot, row in enumerate(rows, len(self._rows)):
+            slots[row] = slot
+        self._rows.extend(rows)
+
+    def add(self, pod):
+        self._table = pod._table
+        self._table._slot[pod.row] = len(self._rows)
+        self._rows.append(pod.row)
+
+    def discard(self, pod):
+        if pod not in self:
+            return
+        slots = self._table._slot
+        slot = slots[pod.row]
+        last = self._rows.pop()
+        if last != pod.row:
+            self._rows[slot] = last
+            slots[last] = slot
+        slots[pod.row] = len(self._rows)   # Out of range, so membership checks fail
+
+
+class Node:
+    __slots__ = ("id", "cpu_cores", "available_cpu", "memory_mb", "available_memory_mb", "pods",
+                 "pods_version", "health_status", "last_heartbeat", "heartbeat_count", "is_running")
+
+    def __init__(self, id, cpu_cores, now=None, memory_mb=0):
+        self.id = id
+        self.cpu_cores = cpu_cores
+        self.available_cpu = cpu_cores
+        self.memory_mb = memory_mb
+        self.available_memory_mb = memory_mb
+        self.pods = NodePods()
+        self.pods_version = 0
+        self.health_status = "Healthy"
+        self.last_heartbeat = time.time() if now is None else now
+        self.heartbeat_count = 0
+        self.is_running = True
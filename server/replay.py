@@ -0,0 +1,247 @@
+"""Offline replay of a recorded trace under each scheduling strategy.
+
+A trace is the JSONL file the server writes with TRACE_FILE set (or
+simulation.py --trace): timestamped node additions, failures, stops and
+deletions, and pod arrivals and deletions. Each strategy replays it through
+the server's own code (create_pod, remove_pod, fail_node and reschedule_pods,
+stop_node) on a virtual clock, with no HTTP or containers; pods displaced by
+failures and stops are re-placed with the same strategy. It reports CPU
+utilization over time, fragmentation, rejected pods and the latency of every
+placement decision.
+
+Fragmentation is the share of free CPU on healthy nodes that sits on nodes with
+less free than --fragment-cpu (default: the largest request in the trace), so
+that no pod of that size could use it.
+
+Usage: python server/replay.py trace.jsonl [--strategies first-fit,best-fit] [--output results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from array import array
+
+from scheduler import STRATEGIES, Scheduler
+from tracing import read_trace
+
+
+class Replay:
+    def __init__(self, server, strategy, args):
+        self.server = server
+        self.strategy = strategy
+        self.args = args
+        self.now = 0.0
+        self.latencies = array("d")
+        self.utilization = []     # (time, allocated / total CPU of healthy nodes)
+        self.fragmentation = []   # (time, stranded / free CPU of healthy nodes)
+        self.counts = dict.fromkeys(["pods", "rejected", "nodes_added", "nodes_failed", "pods_rescheduled",
+                                     "pods_failed"], 0)
+        self.rejected_cpu = 0
+        self._node_ids = {}       # trace node ID -> server node ID
+        self._pod_ids = {}        # trace pod ID -> server pod ID, for placed pods
+        self._failing = []        # trace node IDs failing at self.now, rescheduled together
+
+        reset(server, strategy)
+        server.clock = lambda: self.now
+        select = server.scheduler.select
+
+        def timed_select(*select_args):
+            start = time.perf_counter()
+            try:
+                return select(*select_args)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+        server.scheduler.select = timed_select
+
+    def run(self, path):
+        interval = self.args.sample_interval
+        next_sample = None
+        start = time.perf_counter()
+        with self.server.app.app_context():   # stop_node answers with jsonify
+            for op in read_trace(path):
+                if op["time"] != self.now:
+                    self._flush_failures()
+                if next_sample is None:
+                    next_sample = op["time"]
+                while op["time"] >= next_sample:
+                    self.now = next_sample
+                    self.sample()
+                    next_sample += interval
+                self.now = op["time"]
+                getattr(self, op["op"].replace("-", "_"))(op)
+            self._flush_failures()
+            self.sample()
+        return self.results(time.perf_counter() - start)
+
+    def results(self, elapsed):
+        latencies = sorted(self.latencies)
+        pct = lambda p: round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e6, 2)
+        utilization = [u for _, u in self.utilization] or [0]
+        fragmentation = [f for _, f in self.fragmentation] or [0]
+        pods = self.counts["pods"]
+        return {
+            "strategy": self.strategy,
+            "wall_seconds": round(elapsed, 2),
+            "counts": self.counts,
+            "rejected_fraction": round(self.counts["rejected"] / pods, 4) if pods else 0,
+            "rejected_cpu": self.rejected_cpu,
+            "cpu_utilization": {"mean": round(sum(utilization) / len(utilization), 4),
+                                "min": round(min(utilization), 4), "max": round(max(utilization), 4),
+                                "series": [[round(t, 3), round(u, 4)] for t, u in self.utilization]},
+            "fragmentation": {"mean": round(sum(fragmentation) / len(fragmentation), 4),
+                              "max": round(max(fragmentation), 4),
+                              "series": [[round(t, 3), round(f, 4)] for t, f in self.fragmentation]},
+            "decision_latency_us": {"count": len(latencies), "p50": pct(0.50), "p99": pct(0.99),
+                                    "max": pct(1.0), "mean": round(sum(latencies) / len(latencies) * 1e6, 2)}
+                                   if latencies else {"count": 0}
+        }
+
+    def sample(self):
+        total = allocated = free = stranded = 0
+        with self.server.store.lock:
+            for node in self.server.nodes.values():
+                if node.health_status == "Healthy":
+                    total += node.cpu_cores
+                    allocated += node.cpu_cores - node.available_cpu
+                    free += node.available_cpu
+                    if node.available_cpu < self.args.fragment_cpu:
+                        stranded += node.available_cpu
+        if total:
+            self.utilization.append((self.now, allocated / total))
+            self.fragmentation.append((self.now, stranded / free if free else 0.0))
+
+    # Trace operations
+
+    def add_node(self, op):
+        server = self.server
+        node_id = server.register_nodes(1, op["cpuCores"], op.get("memoryMb"))[0]
+        self._node_ids[op["nodeId"]] = node_id
+        with server.store.lock:
+            server.apply_heartbeat({"nodeId": node_id, "cpuCores": op["cpuCores"]}, self.now)
+        self.counts["nodes_added"] += 1
+
+    def fail_node(self, op):
+        if op["nodeId"] in self._node_ids:
+            self._failing.append(self._node_ids[op["nodeId"]])
+
+    def stop_node(self, op):
+        node_id = self._node_ids.get(op["nodeId"])
+        if node_id is not None:
+            self.server.stop_node(node_id)
+
+    def delete_node(self, op):
+        node_id = self._node_ids.pop(op["nodeId"], None)
+        if node_id is not None:
+            self.server.remove_node(node_id)
+
+    def launch_pod(self, op):
+        self.counts["pods"] += 1
+        placed = self.server.create_pod(op["cpuRequired"], op.get("memoryRequiredMb", 0))
+        if placed is None:
+            self.counts["rejected"] += 1
+            self.rejected_cpu += op["cpuRequired"]
+        else:
+            self._pod_ids[op["podId"]] = placed[0]
+
+    def delete_pod(self, op):
+        pod_id = self._pod_ids.pop(op["podId"], None)
+        if pod_id is not None:
+            self.server.remove_pod(pod_id)
+
+    def _flush_failures(self):
+        """Fail the nodes that failed at one instant together, as one monitor pass does"""
+        if not self._failing:
+            return
+        server = self.server
+        failed = []
+        with server.store.lock:
+            for node_id in self._failing:
+                node = server.nodes.get(node_id)
+                if node is not None and node.health_status == "Healthy":
+                    server.fail_node(node)
+                    failed.append(node_id)
+        self._failing = []
+        placed, unplaced = server.reschedule_pods(failed)
+        self.counts["nodes_failed"] += len(failed)
+        self.counts["pods_rescheduled"] += placed
+        self.counts["pods_failed"] += unplaced
+
+
+def reset(server, strategy):
+    """Empty the cluster state and give the server a fresh scheduler"""
+    with server.store.lock:
+        node_ids, pod_ids = list(server.nodes), list(server.pods)
+        server.nodes.clear()
+        server.pods.clear()
+        # Marking after removal drops the objects from the store's indexes too
+        for node_id in node_ids:
+            server.heartbeat_tracker.discard(node_id)
+            server.heartbeat_history.discard(node_id)
+            server.store.mark_node(node_id)
+        for pod_id in pod_ids:
+            server.store.mark_pod(pod_id)
+        server.pod_changes.clear()
+        server.scheduler = Scheduler(strategy)
+        # Failover places pods with the strategy under test too
+        server.FAILOVER_STRATEGY = None
+    server.store.snapshot()
+
+
+def load_server():
+    """Import server.py with nothing running behind it and nothing recorded"""
+    os.environ["NODE_RUNTIME"] = "external"
+    os.environ.pop("JOURNAL_DIR", None)
+    os.environ.pop("TRACE_FILE", None)
+    os.environ.pop("FAILOVER_STRATEGY", None)
+    import server
+    return server
+
+
+def largest_request(path):
+    return max((op["cpuRequired"] for op in read_trace(path) if op["op"] == "launch-pod"), default=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a cluster trace under each scheduling strategy")
+    parser.add_argument("trace", help="JSONL trace, as written with TRACE_FILE")
+    parser.add_argument("--strategies", type=lambda value: value.split(","), default=list(STRATEGIES),
+                        help=f"comma-separated strategies to compare (default: {','.join(STRATEGIES)})")
+    parser.add_argument("--sample-interval", type=float, default=60,
+                        help="trace seconds between utilization samples")
+    parser.add_argument("--fragment-cpu", type=float,
+                        help="free CPU below this on a node counts as fragmented (default: largest request)")
+    parser.add_argument("--verbose", action="store_true", help="keep the server's log output")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+    unknown = [strategy for strategy in args.strategies if strategy not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategies: {', '.join(unknown)} (choose from {', '.join(STRATEGIES)})")
+    if args.fragment_cpu is None:
+        args.fragment_cpu = largest_request(args.trace)
+
+    server = load_server()
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.ERROR)
+    results = []
+    print(f"{'strategy':<16} {'pods':>8} {'rejected':>9} {'failed':>7} {'util':>7} {'frag':>7} "
+          f"{'p50 us':>7} {'p99 us':>7}", file=sys.stderr)
+    for strategy in args.strategies:
+        result = Replay(server, strategy, args).run(args.trace)
+        results.append(result)
+        counts, latency = result["counts"], result["decision_latency_us"]
+        print(f"{strategy:<16} {counts['pods']:8d} {counts['rejected']:9d} {counts['pods_failed']:7d} "
+              f"{result['cpu_utilization']['mean']:7.2%} {result['fragmentation']['mean']:7.2%} "
+              f"{latency.get('p50', 0):7.2f} {latency.get('p99', 0):7.2f}", file=sys.stderr)
+
+    output = json.dumps({"trace": args.trace, "config": vars(args), "strategies": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+NODE_SIM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "node_sim")
+
+# Failure injection kinds understood by NodeRuntime.inject_failure
+FAILURES = ("kill", "pause", "resume", "partition", "heal")
+
+docker_seconds = metrics.registry.histogram(
+    "kube_sim_docker_command_seconds", "Duration of docker CLI subprocesses",
+    metrics.SUBPROCESS_BUCKETS, labels=("command",))
+
+# Container state after each docker event action, as (is_running, status) like docker inspect
+# reports it; "destroy" forgets the container and other actions do not change its state
+_EVENT_STATES = {
+    "create": (False, "created"),
+    "start": (True, "running"),
+    "restart": (True, "running"),
+    "unpause": (True, "running"),
+    "pause": (True, "paused"),
+    "die": (False, "exited"),
+}
+
+
+class NodeRuntime:
+    """Starts, stops and probes whatever backs each simulated node.
+
+    Every method except inspect() returns an error message, or None on success.
+    """
+
+    def start(self, node_id, cpu_cores, memory_mb=0):
+        raise NotImplementedError
+
+    def stop(self, node_id):
+        raise NotImplementedError
+
+    def remove(self, node_id):
+        raise NotImplementedError
+
+    def inspect(self, node_ids):
+        """Return {node_id: (is_running, status)} for the nodes the runtime knows about"""
+        raise NotImplementedError
+
+    def inject_failure(self, node_id, kind):
+        raise NotImplementedError
+
+
+class ContainerTracker:
+    """Container states kept current from the runtime's event stream, so probing spawns nothing.
+
+    `events(since)` returns an iterator of docker-style event dicts from time
+    `since` on; it is followed on a background thread and reopened from the time
+    it was lost if it ends. Containers with no known state are looked up with
+    one `inspect(names)` call per request, which returns {name: (is_running,
+    status)} like NodeRuntime.inspect.
+    """
+
+    def __init__(self, events, inspect, max_retry_interval=30):
+        self._events = events
+        self._inspect = inspect
+        self._max_retry_interval = max_retry_interval
+        self._states = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._follow, daemon=True, name="container-events").start()
+
+    def get(self, names):
+        """Return {name: (is_running, status)} for the names the runtime knows about"""
+        with self._lock:
+            states = {name: self._states[name] for name in names if name in self._states}
+        missing = [name for name in names if name not in states]
+        if missing:
+            found = self._inspect(missing)
+            with self._lock:
+                for name, state in found.items():
+                    # An event that arrived during the inspect is newer
+                    states[name] = self._states.setdefault(name, state)
+        return states
+
+    def apply(self, event):
+        """Update the cache from one event"""
+        name = event.get("Actor", {}).get("Attributes", {}).get("name")
+        action = event.get("Action", event.get("status", "")).split(":")[0]
+        if name is None:
+            return
+        with self._lock:
+            if action == "destroy":
+                self._states.pop(name, None)
+            elif action in _EVENT_STATES:
+                self._states[name] = _EVENT_STATES[action]
+
+    def _follow(self):
+        retry_interval = 1
+        while True:
+            # Events from `since` on are replayed, so the states inspected before can be dropped
+            since = time.time()
+            with self._lock:
+                self._states.clear()
+            try:
+                for event in self._events(since):
+                    self.apply(event)
+                    retry_interval = 1
+            except Exception as e:
+                logger.error(f"Container event stream failed: {e}")
+            # Nothing keeps the cache current until the stream is back, so get() inspects meanwhile
+            with self._lock:
+                self._states.clear()
+            time.sleep(retry_interval)
+            retry_interval = min(retry_interval * 2, self._max_retry_interval)
+
+
+def docker_events(image, since):
+    """Yield the events of containers of `image` from `docker events`, starting at time `since`"""
+    process = subprocess.Popen(["docker", "events", "--since", str(int(since)), "--format", "{{json .}}",
+                                "--filter", "type=container", "--filter", f"image={image}"],
+                               stdout=subprocess.PIPE, text=True)
+    try:
+        for line in process.stdout:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning(f"Ignoring malformed docker event: {line.strip()}")
+    finally:
+        process.kill()
+        process.wait()
+    logger.warning(f"docker events exited with status {process.returncode}")
+
+
+class DockerRuntime(NodeRuntime):
+    """One kube-sim-node container per node.
+
+    With `track_events`, container states come from a ContainerTracker following
+    `docker events`, and inspect() only runs `docker inspect` for containers it
+    has not seen yet.
+    """
+
+    def __init__(self, api_server, image="kube-sim-node", track_events=True):
+        self.api_server = api_server
+        self.image = image
+        self.tracker = None
+        if track_events:
+            self.tracker = ContainerTracker(lambda since: docker_events(self.image, since), self._inspect)
+
+    def start(self, node_id, cpu_cores, memory_mb=0):
+        cmd = [
+            "docker", "run", "-d",
+            "--name", node_id,
+            "-e", f"NODE_ID={node_id}",
+            "-e", f"CPU_CORES={cpu_cores}",
+            "-e", f"MEMORY_MB={memory_mb}",
+            "-e", f"API_SERVER={self.api_server}",
+            "--network", "host",
+            self.image
+        ]
+        logger.info(f"Launching node container with command: {' '.join(cmd)}")
+        if self.tracker is not None:
+            self.tracker.start()
+        return self._docker(cmd, "launch node container")
+
+    def stop(self, node_id):
+        return self._docker(["docker", "stop", node_id], "stop node container")
+
+    def remove(self, node_id):
+        return self._docker(["docker", "rm", "-f", node_id], "delete node container")
+
+    def inspect(self, node_ids):
+        if self.tracker is None:
+            return self._inspect(node_ids)
+        self.tracker.start()
+        return self.tracker.get(node_ids)
+
+    def _inspect(self, node_ids):
+        cmd = ["docker", "inspect", "-f", "{{.Name}} {{.State.Running}} {{.State.Status}}", *node_ids]
+        try:
+            result = self._run(cmd)
+        except OSError as e:
+            logger.error(f"Failed to run docker inspect: {e}")
+            return {}
+
+        if result.returncode != 0:
+            logger.error(f"Failed to inspect some containers: {result.stderr.strip()}")
+
+        states = {}
+        for line in result.stdout.splitlines():
+            status = line.split()
+            if len(status) == 3:
+                name, is_running, container_status = status
+                states[name.lstrip('/')] = (is_running == "true", container_status)
+        return states
+
+    def inject_failure(self, node_id, kind):
+        commands = {
+            "kill": ["docker", "kill", node_id],
+            "pause": ["docker", "pause", node_id],
+            "resume": ["docker", "unpause", node_id],
+        }
+        if kind not in commands:
+            return f"Failure '{kind}' is not supported by the docker runtime"
+        return self._docker(commands[kind], f"{kind} node container")
+
+    def _docker(self, cmd, action):
+        try:
+            result = self._run(cmd)
+        except OSError as e:
+            return f"Failed to {action}: {e}"
+        if result.returncode != 0:
+            return f"Failed to {action}: {result.stderr.strip()}"
+        return None
+
+    @staticmethod
+    def _run(cmd):
+        start = time.perf_counter()
+        try:
+            return subprocess.run(cmd, capture_output=True, text=True)
+        finally:
+            docker_seconds.labels(cmd[1]).observe(time.perf_counter() - start)
+
+
+class ExternalRuntime(NodeRuntime):
+    """Nodes are hosted outside the server, e.g. by a node agent (node.py with NODE_COUNT).
+
+    The server only registers them; their liveness is known from heartbeats alone.
+    """
+
+    def start(self, node_id, cpu_cores, memory_mb=0):
+        return None
+
+    def stop(self, node_id):
+        return None
+
+    def remove(self, node_id):
+        return None
+
+    def inspect(self, node_ids):
+        return {}
+
+    def inject_failure(self, node_id, kind):
+        return "Failure injection is not supported for externally hosted nodes"
+
+
+class _LocalNode:
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.task = None
+        self.status = "created"
+        self.partitioned = False
+
+
+class LocalRuntime(NodeRuntime):
+    """Runs NodeSimulator instances as asyncio tasks on one background event loop.
+
+    `post(path, payload)` delivers a node's request to the API server and returns
+    (status_code, data). Pausing cancels the heartbeat task but keeps the
+    simulator's state, so resuming picks up where it left off; a partitioned
+    node keeps running but its requests are dropped.
+    """
+
+    def __init__(self, post, interval=5):
+        if NODE_SIM_DIR not in sys.path:
+            sys.path.insert(0, NODE_SIM_DIR)
+        from node import NodeSimulator
+
+        self._simulator_class = NodeSimulator
+        self._post = post
+        self.interval = interval
+        self._nodes = {}
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True,
+                                        name="local-runtime")
+        self._thread.start()
+
+    def __len__(self):
+        with self._lock:
+            return sum(1 for node in self._nodes.values() if node.status == "running")
+
+    def start(self, node_id, cpu_cores, memory_mb=0):
+        node = _LocalNode(self._simulator_class(node_id, "local", cpu_cores, memory_mb))
+        with self._lock:
+            if node_id in self._nodes:
+                return f"Node {node_id} already exists in the local runtime"
+            self._nodes[node_id] = node
+        self._loop.call_soon_threadsafe(self._resume, node)
+        return None
+
+    def stop(self, node_id):
+        return self._control(node_id, self._halt, "exited")
+
+    def remove(self, node_id):
+        with self._lock:
+            node = self._nodes.pop(node_id, None)
+        if node is None:
+            return f"Node {node_id} not found in the local runtime"
+        self._loop.call_soon_threadsafe(self._halt, node, "removed")
+        return None
+
+    def inspect(self, node_ids):
+        with self._lock:
+            return {node_id: (self._nodes[node_id].status in ("running", "paused"),
+                              self._nodes[node_id].status)
+                    for node_id in node_ids if node_id in self._nodes}
+
+    def inject_failure(self, node_id, kind):
+        if kind == "kill":
+            return self._control(node_id, self._halt, "exited")
+        if kind == "pause":
+            return self._control(node_id, self._halt, "paused")
+        if kind == "resume":
+            return self._control(node_id, self._resume)
+        if kind in ("partition", "heal"):
+            with self._lock:
+                node = self._nodes.get(node_id)
+                if node is None:
+                    return f"Node {node_id} not found in the local runtime"
+                node.partitioned = kind == "partition"
+            return None
+        return f"Unknown failure type: {kind}"
+
+    def _control(self, node_id, action, *args):
+        with self._lock:
+            node = self._nodes.get(node_id)
+        if node is None:
+            return f"Node {node_id} not found in the local runtime"
+        self._loop.call_soon_threadsafe(action, node, *args)
+        return None
+
+    # The methods below run on the event loop thread
+
+    def _resume(self, node):
+        with self._lock:
+            if node.status not in ("created", "paused"):
+                return
+            node.status = "running"
+        node.task = self._loop.create_task(self._run(node))
+
+    def _halt(self, node, status):
+        with self._lock:
+            if node.status == "removed":
+                return
+            node.status = status
+        if node.task is not None:
+            node.task.cancel()
+            node.task = None
+
+    async def _run(self, node):
+        def deliver(path, payload):
+            if node.partitioned:
+                return None
+            try:
+                return self._post(path, payload)
+            except Exception as e:
+                logger.error(f"Local node {node.simulator.node_id} request failed: {e}")
+                return None
+
+        await node.simulator.run_async(deliver, self.interval)
+        # The simulator gave up after too many failed heartbeats
+        with self._lock:
+            if node.status == "running":
+                node.status = "exited"
@@ -0,0 +1,214 @@
+import bisect
+
+import numpy as np
+
+FIRST_FIT = "first-fit"
+BEST_FIT = "best-fit"
+WORST_FIT = "worst-fit"
+LEAST_ALLOCATED = "least-allocated"
+MOST_ALLOCATED = "most-allocated"
+BALANCED = "balanced"
+STRATEGIES = (FIRST_FIT, BEST_FIT, WORST_FIT, LEAST_ALLOCATED, MOST_ALLOCATED, BALANCED)
+# Strategies that score every node the pod fits on, over all resources
+SCORED = (LEAST_ALLOCATED, MOST_ALLOCATED, BALANCED)
+
+# Leaf value for slots with no schedulable node; pods always need positive CPU
+_EMPTY = -1
+
+
+class _MaxTree:
+    """Max segment tree over node slots, used to find the leftmost node that fits"""
+
+    def __init__(self):
+        self.size = 1
+        self.tree = [_EMPTY, _EMPTY]
+
+    def set(self, slot, value):
+        while slot >= self.size:
+            self._grow()
+        i = slot + self.size
+        self.tree[i] = value
+        i //= 2
+        while i:
+            left, right = self.tree[2 * i], self.tree[2 * i + 1]
+            self.tree[i] = left if left >= right else right
+            i //= 2
+
+    def leftmost(self, value):
+        """Return the lowest slot holding at least `value`, or None"""
+        if self.tree[1] < value:
+            return None
+        i = 1
+        while i < self.size:
+            i = 2 * i if self.tree[2 * i] >= value else 2 * i + 1
+        return i - self.size
+
+    def reset(self, values):
+        self.size = 1
+        while self.size < len(values):
+            self.size *= 2
+        self.tree = [_EMPTY] * (2 * self.size)
+        self.tree[self.size:self.size + len(values)] = values
+        for i in range(self.size - 1, 0, -1):
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def _grow(self):
+        self.reset(self.tree[self.size:] + [_EMPTY] * self.size)
+
+
+class _Columns:
+    """Free CPU and memory per node slot, and the inverse of each node's totals, as NumPy rows
+    for filtering and scoring every node at once"""
+
+    def __init__(self, size=1):
+        self.free = np.full((2, size), _EMPTY, dtype=np.float64)
+        self.inverse = np.zeros((2, size), dtype=np.float64)   # 1 / total, 0 for a resource a node lacks
+
+    def set(self, slot, node):
+        while slot >= self.free.shape[1]:
+            self.reindex(np.arange(self.free.shape[1]), 2 * self.free.shape[1])
+        self.free[0, slot] = node.available_cpu
+        self.free[1, slot] = node.available_memory_mb
+        self.inverse[0, slot] = 1 / node.cpu_cores if node.cpu_cores > 0 else 0.0
+        self.inverse[1, slot] = 1 / node.memory_mb if node.memory_mb > 0 else 0.0
+
+    def clear(self, slot):
+        self.free[:, slot] = _EMPTY
+
+    def reindex(self, slots, size):
+        """Keep the given slots, renumbered from 0, in columns of `size` slots"""
+        free, inverse = self.free, self.inverse
+        self.__init__(size)
+        self.free[:, :len(slots)] = free[:, slots]
+        self.inverse[:, :len(slots)] = inverse[:, slots]
+
+
+class Scheduler:
+    """Index of schedulable nodes ordered by free CPU, plus columns of free CPU and memory.
+
+    Only nodes that are Healthy and running are indexed. Callers must call
+    update() whenever a node's health, running state or available resources
+    change, and remove() when a node is deleted. Not thread-safe; the server
+    calls it with store.lock held.
+
+    Pods that only need CPU are placed by first-fit, best-fit and worst-fit from
+    the CPU index in O(log N). Pods that also need memory, and the scored
+    strategies, filter every slot's columns at once with NumPy and pick:
+
+    - first-fit, best-fit, worst-fit: the lowest slot, the least or the most
+      free CPU among the nodes that fit
+    - least-allocated: the largest mean free fraction of CPU and memory after
+      placement, which spreads pods
+    - most-allocated: the smallest mean free fraction, which packs them
+    - balanced: the nodes whose CPU and memory would end up most evenly used
+    """
+
+    def __init__(self, strategy=FIRST_FIT):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown scheduling strategy: {strategy}")
+        self.strategy = strategy
+        self._slots = {}    # node_id -> slot, in registration order (first-fit order)
+        self._order = []    # slot -> node_id, None once released
+        self._free = {}     # node_id -> indexed available CPU
+        self._sorted = []   # (available_cpu, slot, node_id) for schedulable nodes
+        self._tree = _MaxTree()
+        self._columns = _Columns()
+
+    def __len__(self):
+        return len(self._free)
+
+    def free_cpu(self):
+        """Total available CPU over the schedulable nodes"""
+        return sum(self._free.values())
+
+    def update(self, node):
+        """Re-index a node after its health, running state or free resources changed"""
+        slot = self._slots.get(node.id)
+        if slot is None:
+            slot = self._allocate_slot(node.id)
+        else:
+            self._discard(node.id, slot)
+
+        if node.health_status == "Healthy" and node.is_running:
+            bisect.insort(self._sorted, (node.available_cpu, slot, node.id))
+            self._free[node.id] = node.available_cpu
+            self._tree.set(slot, node.available_cpu)
+            self._columns.set(slot, node)
+
+    def remove(self, node_id):
+        slot = self._slots.pop(node_id, None)
+        if slot is None:
+            return
+        self._discard(node_id, slot)
+        self._order[slot] = None
+
+    def select(self, cpu_required, memory_required_mb=0, strategy=None):
+        """Return the node ID `strategy` (default: the configured one) picks, or None if nothing fits"""
+        strategy = strategy or self.strategy
+        if memory_required_mb > 0 or strategy in SCORED:
+            return self._score(cpu_required, memory_required_mb, strategy)
+        if strategy == FIRST_FIT:
+            slot = self._tree.leftmost(cpu_required)
+            return None if slot is None else self._order[slot]
+
+        if not self._sorted or self._sorted[-1][0] < cpu_required:
+            return None
+        if strategy == BEST_FIT:
+            i = bisect.bisect_left(self._sorted, (cpu_required,))
+        else:
+            i = bisect.bisect_left(self._sorted, (self._sorted[-1][0],))
+        return self._sorted[i][2]
+
+    def _score(self, cpu_required, memory_required_mb, strategy):
+        count = len(self._order)
+        free_cpu = self._columns.free[0, :count]
+        free_memory = self._columns.free[1, :count]
+        fits = (free_cpu >= cpu_required) & (free_memory >= memory_required_mb)
+        if not fits.any():
+            return None   # also covers no slots, where argmin and argmax raise
+
+        # argmin and argmax take the first of equal scores, i.e. the lowest slot
+        if strategy == FIRST_FIT:
+            best = fits.argmax()
+        elif strategy == BEST_FIT:
+            best = np.where(fits, free_cpu, np.inf).argmin()
+        elif strategy == WORST_FIT:
+            best = np.where(fits, free_cpu, -np.inf).argmax()
+        else:
+            # Fraction of each resource left after placement
+            cpu_left = (free_cpu - cpu_required) * self._columns.inverse[0, :count]
+            memory_left = (free_memory - memory_required_mb) * self._columns.inverse[1, :count]
+            if strategy == LEAST_ALLOCATED:
+                best = np.where(fits, cpu_left + memory_left, -np.inf).argmax()
+            elif strategy == MOST_ALLOCATED:
+                best = np.where(fits, cpu_left + memory_left, np.inf).argmin()
+            else:
+                best = np.where(fits, np.abs(cpu_left - memory_left), np.inf).argmin()
+        return self._order[best]
+
+    def _discard(self, node_id, slot):
+        free = self._free.pop(node_id, None)
+        if free is None:
+            return
+        i = bisect.bisect_left(self._sorted, (free, slot, node_id))
+        del self._sorted[i]
+        self._tree.set(slot, _EMPTY)
+        self._columns.clear(slot)
+
+    def _allocate_slot(self, node_id):
+        # Compact released slots before the tree would have to grow
+        if len(self._order) >= self._tree.size and len(self._slots) * 2 <= len(self._order):
+            self._compact()
+        slot = len(self._order)
+        self._order.append(node_id)
+        self._slots[node_id] = slot
+        return slot
+
+    def _compact(self):
+        kept = [slot for slot, node_id in enumerate(self._order) if node_id is not None]
+        self._columns.reindex(np.array(kept, dtype=np.intp), self._columns.free.shape[1])
+        self._order = [node_id for node_id in self._order if node_id is not None]
+        self._slots = {node_id: slot for slot, node_id in enumerate(self._order)}
+        self._sorted = sorted((free, self._slots[node_id], node_id)
+                              for node_id, free in self._free.items())
+        self._tree.reset([self._free.get(node_id, _EMPTY) for node_id in self._order])
@@ -1,19 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import functools
+import gc
+import gzip
 import json
 import logging
-import subprocess
+import math
 import threading
 import time
 import uuid
 import socket
+import os
+from collections import deque
+
+import numpy as np
+
+import metrics
+from events import EventLog
+from heartbeats import HeartbeatHistory, HeartbeatPacer, HeartbeatTracker, downsample
+from journal import Journal
+from provisioning import Provisioner
+from records import Node
+from runtime import FAILURES, DockerRuntime, ExternalRuntime, LocalRuntime
+from scheduler import STRATEGIES, Scheduler
+from store import ClusterStore
+from tracing import TraceRecorder
 
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Resource-Version", "X-Next-Cursor"])
 
 def get_host_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -28,288 +46,925 @@ def get_host_ip():
 
 HOST_IP = get_host_ip()
 
-nodes = {}
-pods = {}
-nodes_lock = threading.Lock()
-pods_lock = threading.Lock()
-scheduler = "first-fit"
-
-class Node:
-    def __init__(self, id, cpu_cores):
-        self.id = id
-        self.cpu_cores = cpu_cores
-        self.available_cpu = cpu_cores
-        self.pods = []
-        self.health_status = "Healthy"
-        self.last_heartbeat = time.time()
-        self.heartbeat_count = 0
-        self.is_running = True
-
-class Pod:
-    def __init__(self, id, cpu_required, node_id):
-        self.id = id
-        self.cpu_required = cpu_required
-        self.node_id = node_id
-        self.status = "Running"
-        self.created_at = time.time()
-        self.last_updated = time.time()
-        self.health_status = "Healthy"
+# Source of every timestamp and deadline below; the discrete-event simulator swaps in a virtual clock
+clock = time.time
+
+scheduler = Scheduler(os.environ.get("SCHEDULER", "first-fit"))
+
+# Memory given to nodes registered without memoryMb, per CPU core
+NODE_MEMORY_PER_CORE_MB = int(os.environ.get("NODE_MEMORY_PER_CORE_MB", "4096"))
+
+# Pods of nodes that fail in the same monitor pass are re-placed together, largest first,
+# RESCHEDULE_CHUNK pods per store.lock acquisition; FAILOVER_MODE=greedy goes node by node.
+# Displaced pods, there and on a stopped node, are placed with FAILOVER_STRATEGY, by default
+# the SCHEDULER strategy
+FAILOVER_MODE = os.environ.get("FAILOVER_MODE", "bulk")
+RESCHEDULE_CHUNK = int(os.environ.get("RESCHEDULE_CHUNK", "256"))
+FAILOVER_STRATEGY = os.environ.get("FAILOVER_STRATEGY") or None
+if FAILOVER_STRATEGY is not None and FAILOVER_STRATEGY not in STRATEGIES:
+    raise ValueError(f"Unknown scheduling strategy: {FAILOVER_STRATEGY}")
+
+# Seconds without a heartbeat before a node's container is probed, and how often to check
+HEARTBEAT_TIMEOUT = float(os.environ.get("HEARTBEAT_TIMEOUT", "15"))
+MONITOR_INTERVAL = float(os.environ.get("MONITOR_INTERVAL", "5"))
+heartbeat_tracker = HeartbeatTracker(HEARTBEAT_TIMEOUT)
+
+# Heartbeat responses tell nodes how often to beat: HEARTBEAT_INTERVAL seconds, spread by
+# +/- HEARTBEAT_JITTER of it, slowed down beyond HEARTBEAT_MAX_RATE beats/s across the cluster
+# or HEARTBEAT_MAX_IN_FLIGHT concurrent heartbeat requests. HEARTBEAT_TIMEOUT is for the base
+# interval and grows in proportion with the advertised one.
+heartbeat_pacer = HeartbeatPacer(
+    float(os.environ.get("HEARTBEAT_INTERVAL", "5")), HEARTBEAT_TIMEOUT,
+    jitter=float(os.environ.get("HEARTBEAT_JITTER", "0.2")),
+    max_rate=float(os.environ.get("HEARTBEAT_MAX_RATE", "1000")),
+    max_in_flight=int(os.environ.get("HEARTBEAT_MAX_IN_FLIGHT", "64")),
+    max_interval=float(os.environ.get("HEARTBEAT_MAX_INTERVAL", "60")))
+
+# Arrival times and latencies of each node's last HEARTBEAT_HISTORY heartbeats, served downsampled
+# by GET /nodes/heartbeats in at most HEARTBEAT_SERIES_MAX_BUCKETS buckets
+heartbeat_history = HeartbeatHistory(int(os.environ.get("HEARTBEAT_HISTORY", "64")))
+HEARTBEAT_SERIES_MAX_BUCKETS = 1000
+
+# Recent (version, pod_id, added) changes per node, used to answer heartbeats with deltas
+POD_CHANGE_HISTORY = int(os.environ.get("POD_CHANGE_HISTORY", "256"))
+pod_changes = {}
+
+# Change events for /watch, and how long a watch request waits for new ones
+events = EventLog(int(os.environ.get("WATCH_HISTORY", "10000")), lambda: clock())
+WATCH_TIMEOUT = float(os.environ.get("WATCH_TIMEOUT", "30"))
+
+# Unfiltered list responses are encoded once per snapshot, and gzipped when large and accepted
+RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE", "1") == "1"
+RESPONSE_GZIP_MIN_BYTES = int(os.environ.get("RESPONSE_GZIP_MIN_BYTES", "65536"))
+RESPONSE_GZIP_LEVEL = int(os.environ.get("RESPONSE_GZIP_LEVEL", "1"))
+
+# Crash recovery: with JOURNAL_DIR set, every event is journaled there and state is rebuilt on startup
+JOURNAL_DIR = os.environ.get("JOURNAL_DIR")
+JOURNAL_CHECKPOINT_RECORDS = int(os.environ.get("JOURNAL_CHECKPOINT_RECORDS", "50000"))
+journal = Journal(JOURNAL_DIR, float(os.environ.get("JOURNAL_FSYNC_INTERVAL", "0.05"))) if JOURNAL_DIR else None
+
+# With TRACE_FILE set, node and pod arrivals, departures and failures are appended there as
+# JSONL for offline replay (server/replay.py)
+TRACE_FILE = os.environ.get("TRACE_FILE")
+trace = TraceRecorder(TRACE_FILE) if TRACE_FILE else None
+
+# Served at /metrics. Observing a histogram is a bisect and two additions, with no lock taken.
+request_seconds = metrics.registry.histogram(
+    "kube_sim_http_request_seconds", "Time spent in each route's handler", labels=("method", "route"))
+lock_wait_seconds = metrics.registry.histogram(
+    "kube_sim_store_lock_wait_seconds", "Time spent waiting to acquire store.lock", metrics.FAST_BUCKETS)
+lock_hold_seconds = metrics.registry.histogram(
+    "kube_sim_store_lock_hold_seconds", "Time store.lock was held per acquisition", metrics.FAST_BUCKETS)
+schedule_seconds = metrics.registry.histogram(
+    "kube_sim_scheduler_select_seconds", "Time taken to pick a node for a pod", metrics.FAST_BUCKETS)
+schedule_failures = metrics.registry.counter(
+    "kube_sim_scheduling_failures_total", "Pods for which no node had enough free CPU")
+# One histogram over all nodes: a series per node would grow with the cluster
+heartbeat_interarrival_seconds = metrics.registry.histogram(
+    "kube_sim_heartbeat_interarrival_seconds", "Time between consecutive heartbeats of a node",
+    metrics.HEARTBEAT_BUCKETS)
+metrics.registry.gauge("kube_sim_heartbeat_interval_seconds", "Heartbeat interval advertised to nodes",
+                       lambda: heartbeat_pacer.interval)
+metrics.registry.gauge("kube_sim_heartbeat_requests_in_flight",
+                       "Heartbeat requests being handled at once, smoothed over recent arrivals",
+                       lambda: round(heartbeat_pacer.load, 2))
+
+def node_to_dict(node):
+    return {
+        "id": node.id,
+        "cpu_cores": node.cpu_cores,
+        "available_cpu": node.available_cpu,
+        "memory_mb": node.memory_mb,
+        "available_memory_mb": node.available_memory_mb,
+        "pods": node.pods.ids(),
+        "pods_version": node.pods_version,
+        "health_status": node.health_status,
+        "last_heartbeat": node.last_heartbeat,
+        "heartbeat_count": node.heartbeat_count,
+        "is_running": node.is_running
+    }
+
+def pod_to_dict(pod):
+    # id, cpu_required, memory_required_mb, node_id, status, health_status, created_at, last_updated
+    return pod.to_dict()
+
+# All node and pod state; mutate it only under store.lock, readers use store.snapshot()
+store = ClusterStore(node_to_dict, pod_to_dict, lambda: events.version,
+                     metrics.TimedLock(threading.RLock(), lock_wait_seconds, lock_hold_seconds))
+nodes = store.nodes
+pods = store.pods
+
+def cpu_by_health(field):
+    """Sum a CPU figure over the nodes in each health status, from the latest snapshot"""
+    totals = {}
+    for node in store.snapshot().nodes.values():
+        status = node["health_status"]
+        totals[status] = totals.get(status, 0) + field(node)
+    return totals
+
+def object_counts(kind):
+    with store.lock:
+        node_counts, pod_counts = store.counts()
+    return node_counts if kind == "nodes" else pod_counts
+
+metrics.registry.gauge("kube_sim_cpu_cores", "CPU cores of the nodes in each health status",
+                       lambda: cpu_by_health(lambda node: node["cpu_cores"]), labels=("health_status",))
+metrics.registry.gauge("kube_sim_cpu_allocated_cores", "CPU cores allocated to pods, by node health status",
+                       lambda: cpu_by_health(lambda node: node["cpu_cores"] - node["available_cpu"]),
+                       labels=("health_status",))
+metrics.registry.gauge("kube_sim_nodes", "Nodes by health status",
+                       lambda: object_counts("nodes"), labels=("health_status",))
+metrics.registry.gauge("kube_sim_pods", "Pods by status", lambda: object_counts("pods"), labels=("status",))
+
+def emit_node(type, node, reason):
+    store.mark_node(node.id)
+    obj = node_to_dict(node)
+    version = events.emit(type, "node", obj, reason)
+    if journal is not None:
+        journal.append(version, "node", type, obj)
+
+def emit_pod(type, pod, reason):
+    store.mark_pod(pod.id)
+    obj = pod_to_dict(pod)
+    version = events.emit(type, "pod", obj, reason)
+    if journal is not None:
+        journal.append(version, "pod", type, obj)
+
+def trace_event(op, **fields):
+    """Append an operation to the trace, if one is being recorded. Caller must hold store.lock."""
+    if trace is not None:
+        trace.record(clock(), op, **fields)
+
+def place_pod(pod, strategy=None):
+    """Bind a pod to the node picked by the scheduler. Caller must hold store.lock."""
+    start = time.perf_counter()
+    node_id = scheduler.select(pod.cpu_required, pod.memory_required_mb, strategy)
+    schedule_seconds.observe(time.perf_counter() - start)
+    if node_id is None:
+        schedule_failures.inc()
+        return None
+    node = nodes[node_id]
+    pod.node_id = node_id
+    pod.last_updated = clock()
+    node.available_cpu -= pod.cpu_required
+    node.available_memory_mb -= pod.memory_required_mb
+    node.pods.add(pod)
+    record_pod_change(node, pod.id, True)
+    scheduler.update(node)
+    store.mark_node(node_id)
+    store.mark_pod(pod.id)
+    return node_id
+
+def release_pod(pod):
+    """Detach a pod from its node and return its CPU. Caller must hold store.lock."""
+    node = nodes.get(pod.node_id)
+    if node is not None and pod in node.pods:
+        node.available_cpu += pod.cpu_required
+        node.available_memory_mb += pod.memory_required_mb
+        node.pods.discard(pod)
+        record_pod_change(node, pod.id, False)
+        scheduler.update(node)
+        store.mark_node(node.id)
+    pod.node_id = None
+    store.mark_pod(pod.id)
+
+def move_pod(pod, strategy=None):
+    """Move a pod off its node to one the scheduler picks, or mark it Failed if none has room;
+    returns the new node ID or None. Caller must hold store.lock."""
+    release_pod(pod)
+    node_id = place_pod(pod, strategy)
+    if node_id is not None:
+        emit_pod("MODIFIED", pod, "PodMoved")
+    else:
+        pod.status = "Failed"
+        pod.health_status = "Unhealthy"
+        emit_pod("MODIFIED", pod, "PodFailed")
+    return node_id
+
+def record_pod_change(node, pod_id, added):
+    node.pods_version += 1
+    if node.id not in pod_changes:
+        pod_changes[node.id] = deque(maxlen=POD_CHANGE_HISTORY)
+    pod_changes[node.id].append((node.pods_version, pod_id, added))
+
+def pod_delta(node, since):
+    """Return (added, removed) pod IDs since version `since`, or None if the history is too short"""
+    changes = pod_changes.get(node.id, ())
+    missing = node.pods_version - since
+    if missing < 0 or missing > len(changes):
+        return None
+    
+    added, removed = {}, {}
+    for i in range(len(changes) - missing, len(changes)):
+        _, pod_id, is_add = changes[i]
+        # An add and a remove of the same pod within the window cancel out
+        if is_add:
+            if pod_id in removed:
+                del removed[pod_id]
+            else:
+                added[pod_id] = None
+        elif pod_id in added:
+            del added[pod_id]
+        else:
+            removed[pod_id] = None
+    return list(added), list(removed)
+
+def parse_list_args(filters):
+    """Read the list filters, ?limit=&after= pagination and ?fields= projection from the query string"""
+    query = {name: request.args.get(param) for param, name in filters.items()}
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        raise ValueError("limit must be a positive integer")
+    after = request.args.get('after', 0, type=int)
+    fields = request.args.get('fields')
+    fields = [field for field in fields.split(',') if field] if fields else None
+    return query, limit, after, fields
+
+def list_body(kind, items):
+    """Shape (id, dict) pairs as the list endpoints return them: nodes by ID, pods as a list"""
+    return dict(items) if kind == "nodes" else [item for _, item in items]
+
+def encoded_response(snapshot, kind):
+    """The full node or pod list as JSON bytes, encoded once per snapshot and gzipped when large"""
+    cache = snapshot.encoded[kind] if RESPONSE_CACHE else {}
+    body = cache.get("json")
+    if body is None:
+        body = cache["json"] = json.dumps(list_body(kind, getattr(snapshot, kind).items()),
+                                          separators=(",", ":")).encode()
+    
+    headers = {"X-Resource-Version": snapshot.resource_version, "Vary": "Accept-Encoding"}
+    if (RESPONSE_GZIP_MIN_BYTES and len(body) >= RESPONSE_GZIP_MIN_BYTES and
+            'gzip' in request.headers.get('Accept-Encoding', '')):
+        compressed = cache.get("gzip")
+        if compressed is None:
+            compressed = cache["gzip"] = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL)
+        body = compressed
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, mimetype='application/json', headers=headers)
+
+def list_objects(kind, filters, query_index, view):
+    """Answer a list request from the snapshot, or from the store's indexes when filtered or paged"""
+    query, limit, after, fields = parse_list_args(filters)
+    next_cursor = None
+    if limit is None and not after and all(value is None for value in query.values()):
+        snapshot = store.snapshot()
+        if fields is None:
+            return encoded_response(snapshot, kind)
+        items, version = getattr(snapshot, kind).items(), snapshot.resource_version
+    else:
+        # The indexes make this proportional to the page, so the lock is held briefly
+        with store.lock:
+            matched, next_cursor = query_index(after=after, limit=limit, **query)
+            items, version = [(obj.id, view(obj)) for obj in matched], events.version
+    if fields:
+        items = [(key, {field: item[field] for field in fields if field in item}) for key, item in items]
+    
+    response = jsonify(list_body(kind, items))
+    response.headers["X-Resource-Version"] = version
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 @app.route('/nodes', methods=['GET'])
 def get_nodes():
-    with nodes_lock:
-        return jsonify({k: v.__dict__ for k, v in nodes.items()})
+    """Nodes by ID; supports ?status=<health>, ?limit=&after=<cursor> and ?fields=a,b"""
+    try:
+        return list_objects("nodes", {'status': 'health_status'}, store.query_nodes, node_to_dict)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+def create_runtime(kind):
+    """Build the node runtime: docker containers, in-process simulators, or an external node agent"""
+    if kind == "docker":
+        # Container states come from `docker events` unless DOCKER_EVENTS=0
+        return DockerRuntime(f"http://{HOST_IP}:8080", track_events=os.environ.get("DOCKER_EVENTS", "1") == "1")
+    if kind == "local":
+        client = app.test_client()
+        
+        def post(path, payload):
+            # Heartbeats skip the HTTP layer so one process can host thousands of nodes
+            if path == "/heartbeat":
+                body, status = record_heartbeat(payload)
+                return status, body
+            response = client.post(path, json=payload)
+            return response.status_code, response.get_json()
+        
+        return LocalRuntime(post, interval=float(os.environ.get("LOCAL_HEARTBEAT_INTERVAL", "5")))
+    if kind == "external":
+        return ExternalRuntime()
+    raise ValueError(f"Unknown node runtime: {kind}")
+
+runtime = create_runtime(os.environ.get("NODE_RUNTIME", "docker"))
+
+def launch_node(node_id, cpu_cores, memory_mb=0):
+    """Start a node through the runtime on a provisioning worker; returns an error message or None"""
+    error = runtime.start(node_id, cpu_cores, memory_mb)
+    if error:
+        return error
+    
+    # The node becomes Healthy on its first heartbeat; start its deadline from now
+    with store.lock:
+        if node_id in nodes:
+            heartbeat_tracker.touch(node_id, clock(), heartbeat_pacer.timeout)
+    return None
+
+def discard_failed_node(node_id, error):
+    with store.lock:
+        node = nodes.pop(node_id, None)
+        scheduler.remove(node_id)
+        heartbeat_tracker.discard(node_id)
+        heartbeat_history.discard(node_id)
+        if node is not None:
+            emit_node("DELETED", node, "ProvisioningFailed")
+    logger.error(f"Provisioning node {node_id} failed: {error}")
+
+provisioner = Provisioner(launch_node, discard_failed_node,
+                          workers=int(os.environ.get("PROVISION_WORKERS", "8")))
+
+def register_nodes(count, cpu_cores, memory_mb=None):
+    """Add nodes in the Provisioning state; returns their IDs"""
+    node_ids = [str(uuid.uuid4()) for _ in range(count)]
+    if memory_mb is None:
+        memory_mb = cpu_cores * NODE_MEMORY_PER_CORE_MB
+    
+    with store.lock:
+        for node_id in node_ids:
+            node = Node(node_id, cpu_cores, clock(), memory_mb)
+            node.health_status = "Provisioning"
+            nodes[node_id] = node
+            scheduler.update(node)
+            emit_node("ADDED", node, "NodeAdded")
+    return node_ids
+
+def provision_nodes(count, cpu_cores, memory_mb=None):
+    """Register nodes as Provisioning and queue their containers; returns the job"""
+    if memory_mb is None:
+        memory_mb = cpu_cores * NODE_MEMORY_PER_CORE_MB
+    node_ids = register_nodes(count, cpu_cores, memory_mb)
+    return provisioner.submit([(node_id, cpu_cores, memory_mb) for node_id in node_ids])
+
+def node_resources(data):
+    """(cpu cores, memory MiB, error) from a node request body; memory defaults to NODE_MEMORY_PER_CORE_MB a core"""
+    cpu_cores = data.get('cpuCores', 0)
+    if cpu_cores <= 0:
+        return None, None, "CPU cores must be positive"
+    memory_mb = data.get('memoryMb', cpu_cores * NODE_MEMORY_PER_CORE_MB)
+    if memory_mb < 0:
+        return None, None, "Memory must not be negative"
+    return cpu_cores, memory_mb, None
 
 @app.route('/nodes', methods=['POST'])
 def add_node():
     try:
-        data = request.get_json()
-        cpu_cores = data.get('cpuCores', 0)
+        cpu_cores, memory_mb, error = node_resources(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
         
-        if cpu_cores <= 0:
-            return jsonify({"error": "CPU cores must be positive"}), 400
+        job = provision_nodes(1, cpu_cores, memory_mb)
+        node_id = job.node_ids[0]
         
-        node_id = str(uuid.uuid4())
+        logger.info(f"Node {node_id} provisioning with {cpu_cores} CPU cores and {memory_mb} MiB")
+        return jsonify({
+            "message": f"Node {node_id} provisioning with {cpu_cores} CPU cores and {memory_mb} MiB",
+            "nodeId": node_id,
+            "cpuCores": cpu_cores,
+            "memoryMb": memory_mb,
+            "jobId": job.id,
+            "status": "Provisioning"
+        }), 202
         
-        with nodes_lock:
-            nodes[node_id] = Node(node_id, cpu_cores)
+    except Exception as e:
+        logger.error(f"Error adding node: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/nodes/batch', methods=['POST'])
+def add_nodes_batch():
+    try:
+        cpu_cores, memory_mb, error = node_resources(request.get_json())
+        count = request.args.get('count', 1, type=int)
         
-        cmd = [
-            "docker", "run", "-d",
-            "--name", node_id,
-            "-e", f"NODE_ID={node_id}",
-            "-e", f"CPU_CORES={cpu_cores}",
-            "-e", f"API_SERVER=http://{HOST_IP}:8080",
-            "--network", "host",
-            "kube-sim-node"
-        ]
+        if error:
+            return jsonify({"error": error}), 400
+        if count <= 0:
+            return jsonify({"error": "Count must be positive"}), 400
         
-        logger.info(f"Launching node container with command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        job = provision_nodes(count, cpu_cores, memory_mb)
         
-        if result.returncode != 0:
-            with nodes_lock:
-                del nodes[node_id]
-            logger.error(f"Failed to launch node container: {result.stderr}")
-            return jsonify({"error": "Failed to launch node"}), 500
+        logger.info(f"Provisioning {count} nodes with {cpu_cores} CPU cores and {memory_mb} MiB (job {job.id})")
+        return jsonify({
+            "message": f"Provisioning {count} nodes with {cpu_cores} CPU cores and {memory_mb} MiB",
+            "nodeIds": job.node_ids,
+            "cpuCores": cpu_cores,
+            "memoryMb": memory_mb,
+            "jobId": job.id,
+            "status": "Provisioning"
+        }), 202
         
-        time.sleep(2)
-        cmd = ["docker", "inspect", "-f", "{{.State.Running}}", node_id]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+    except Exception as e:
+        logger.error(f"Error adding nodes: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = provisioner.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    errors = provisioner.errors(job)
+    snapshot = store.snapshot()
+    states = {}
+    for node_id in job.node_ids:
+        if node_id in errors:
+            states[node_id] = "Failed"
+        elif node_id in snapshot.nodes:
+            states[node_id] = snapshot.nodes[node_id]["health_status"]
+        else:
+            states[node_id] = "Deleted"
+    
+    provisioning = sum(1 for state in states.values() if state == "Provisioning")
+    return jsonify({
+        "id": job.id,
+        "status": "Provisioning" if provisioning else "Completed",
+        "provisioning": provisioning,
+        "ready": sum(1 for state in states.values() if state == "Healthy"),
+        "failed": len(errors),
+        "errors": errors,
+        "nodes": states
+    }), 200
+
+@app.route('/nodes/heartbeats', methods=['GET'])
+def get_heartbeat_series():
+    """Heartbeats and latency over the last ?window= seconds (default 300) in ?resolution= second
+    buckets (default 5), summed over the nodes in ?ids=a,b or every node; listed nodes also get
+    their own series"""
+    try:
+        window = request.args.get('window', 300, type=float)
+        resolution = request.args.get('resolution', 5, type=float)
+        if window <= 0 or resolution <= 0:
+            return jsonify({"error": "window and resolution must be positive"}), 400
+        buckets = math.ceil(window / resolution)
+        if buckets > HEARTBEAT_SERIES_MAX_BUCKETS:
+            return jsonify({"error": f"window / resolution must be at most {HEARTBEAT_SERIES_MAX_BUCKETS}"}), 400
+        ids = request.args.get('ids')
+        node_ids = [node_id for node_id in ids.split(',') if node_id] if ids else None
         
-        if result.returncode != 0 or result.stdout.strip() != "true":
-            with nodes_lock:
-                del nodes[node_id]
-            logger.error(f"Container failed to start properly: {result.stderr}")
-            return jsonify({"error": "Container failed to start"}), 500
+        # Buckets end on a multiple of the resolution, so consecutive polls line up
+        end = math.ceil(clock() / resolution) * resolution
+        start = end - buckets * resolution
+        with store.lock:
+            if node_ids is None:
+                found, (times, latencies) = None, heartbeat_history.all()
+                node_count = len(heartbeat_history)
+            else:
+                found, times, latencies = heartbeat_history.select(node_ids)
+                node_count = len(found)
+        counts, latency_sums, latency_counts, latency_max = downsample(times, latencies, start, resolution, buckets)
         
-        logger.info(f"Node {node_id} added with {cpu_cores} CPU cores")
-        return jsonify({"message": f"Node {node_id} added with {cpu_cores} CPU cores"}), 201
+        body = {
+            "start": start,
+            "resolution": resolution,
+            "buckets": buckets,
+            "nodeCount": node_count,
+            "aggregate": {
+                "beats": counts.sum(axis=0).tolist(),
+                "nodes": (counts > 0).sum(axis=0).tolist(),
+                "latencyMs": milliseconds(latency_sums.sum(axis=0), latency_counts.sum(axis=0)),
+                "maxLatencyMs": milliseconds(latency_max)
+            }
+        }
+        if found is not None:
+            body["nodes"] = {node_id: {"beats": counts[i].tolist(),
+                                       "latencyMs": milliseconds(latency_sums[i], latency_counts[i])}
+                             for i, node_id in enumerate(found)}
+        return jsonify(body), 200
         
     except Exception as e:
-        logger.error(f"Error adding node: {e}")
+        logger.error(f"Error getting heartbeat series: {e}")
         return jsonify({"error": str(e)}), 500
 
+def milliseconds(seconds, counts=None):
+    """A series in seconds, or seconds summed over `counts` values, as milliseconds; null where empty"""
+    if counts is not None:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            seconds = seconds / counts
+    # NaN is not JSON; NaN != NaN picks it out
+    return [value if value == value else None for value in np.round(seconds * 1000, 3).tolist()]
+
 @app.route('/nodes/<node_id>/stop', methods=['POST'])
 def stop_node(node_id):
     try:
-        with nodes_lock:
+        with store.lock:
             if node_id not in nodes:
                 return jsonify({"error": "Node not found"}), 404
             
             node = nodes[node_id]
             node.is_running = False
             node.health_status = "Stopped"
+            scheduler.update(node)
+            heartbeat_tracker.discard(node_id)
+            emit_node("MODIFIED", node, "NodeStopped")
+            trace_event("stop-node", nodeId=node_id)
             
-            # Get pods that need to be rescheduled
-            pods_to_reschedule = node.pods.copy()
-            node.pods = []  # Clear pods from stopped node
-            
-            cmd = ["docker", "stop", node_id]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                return jsonify({"error": "Failed to stop node container"}), 500
-            
-            # Try to reschedule pods to other healthy nodes
-            with pods_lock:
-                for pod_id in pods_to_reschedule:
-                    pod = pods[pod_id]
-                    rescheduled = False
-                    
-                    # Try to find a healthy node with enough CPU
-                    for other_node_id, other_node in nodes.items():
-                        if (other_node_id != node_id and 
-                            other_node.health_status == "Healthy" and 
-                            other_node.is_running and 
-                            other_node.available_cpu >= pod.cpu_required):
-                            # Move pod to new node
-                            pod.node_id = other_node_id
-                            pod.last_updated = time.time()
-                            other_node.available_cpu -= pod.cpu_required
-                            other_node.pods.append(pod_id)
-                            rescheduled = True
-                            logger.info(f"Pod {pod_id} rescheduled from node {node_id} to node {other_node_id}")
-                            break
-                    
-                    # If pod couldn't be rescheduled, mark it as failed
-                    if not rescheduled:
-                        pod.status = "Failed"
-                        pod.health_status = "Unhealthy"
-                        logger.warning(f"Pod {pod_id} could not be rescheduled, marking as failed")
-            
-            logger.info(f"Node {node_id} stopped")
-            return jsonify({"message": f"Node {node_id} stopped"}), 200
+            # Reschedule pods to other healthy nodes, largest first so they are not squeezed out
+            for pod in sorted(node.pods, key=lambda pod: pod.cpu_required, reverse=True):
+                new_node_id = move_pod(pod, FAILOVER_STRATEGY)
+                if new_node_id is not None:
+                    logger.info(f"Pod {pod.id} rescheduled from node {node_id} to node {new_node_id}")
+                else:
+                    logger.warning(f"Pod {pod.id} could not be rescheduled, marking as failed")
+        
+        # Stop the runtime outside the lock so heartbeats and scheduling carry on meanwhile
+        error = runtime.stop(node_id)
+        
+        if error:
+            logger.error(error)
+            return jsonify({"error": "Failed to stop node container"}), 500
+        
+        logger.info(f"Node {node_id} stopped")
+        return jsonify({"message": f"Node {node_id} stopped"}), 200
             
     except Exception as e:
         logger.error(f"Error stopping node: {e}")
         return jsonify({"error": str(e)}), 500
 
+def remove_node(node_id):
+    """Drop a node from the cluster state; returns False if there is no such node"""
+    with store.lock:
+        node = nodes.pop(node_id, None)
+        if node is None:
+            return False
+        scheduler.remove(node_id)
+        heartbeat_tracker.discard(node_id)
+        heartbeat_history.discard(node_id)
+        pod_changes.pop(node_id, None)
+        emit_node("DELETED", node, "NodeDeleted")
+        trace_event("delete-node", nodeId=node_id)
+    return True
+
 @app.route('/nodes/<node_id>/delete', methods=['DELETE'])
 def delete_node(node_id):
     try:
-        with nodes_lock:
-            if node_id not in nodes:
-                return jsonify({"error": "Node not found"}), 404
-            
-            del nodes[node_id]
-            
-            cmd = ["docker", "rm", "-f", node_id]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                return jsonify({"error": "Failed to delete node container"}), 500
-            
-            logger.info(f"Node {node_id} deleted")
-            return jsonify({"message": f"Node {node_id} deleted"}), 200
+        if not remove_node(node_id):
+            return jsonify({"error": "Node not found"}), 404
+        
+        error = runtime.remove(node_id)
+        
+        if error:
+            logger.error(error)
+            return jsonify({"error": "Failed to delete node container"}), 500
+        
+        logger.info(f"Node {node_id} deleted")
+        return jsonify({"message": f"Node {node_id} deleted"}), 200
             
     except Exception as e:
         logger.error(f"Error deleting node: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/nodes/<node_id>/container', methods=['GET'])
+def get_node_container(node_id):
+    """The state of the node's container as the runtime knows it"""
+    with store.lock:
+        if node_id not in nodes:
+            return jsonify({"error": "Node not found"}), 404
+    
+    state = runtime.inspect([node_id]).get(node_id)
+    if state is None:
+        return jsonify({"nodeId": node_id, "running": None, "status": "unknown"}), 200
+    return jsonify({"nodeId": node_id, "running": state[0], "status": state[1]}), 200
+
+@app.route('/nodes/<node_id>/fail', methods=['POST'])
+def inject_failure(node_id):
+    try:
+        data = request.get_json()
+        kind = data.get('type')
+        
+        if kind not in FAILURES:
+            return jsonify({"error": f"Failure type must be one of: {', '.join(FAILURES)}"}), 400
+        
+        with store.lock:
+            if node_id not in nodes:
+                return jsonify({"error": "Node not found"}), 404
+        
+        error = runtime.inject_failure(node_id, kind)
+        if error:
+            logger.error(error)
+            return jsonify({"error": error}), 500
+        
+        logger.info(f"Injected {kind} failure into node {node_id}")
+        return jsonify({"message": f"Injected {kind} failure into node {node_id}"}), 200
+        
+    except Exception as e:
+        logger.error(f"Error injecting failure: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def create_pod(cpu_required, memory_required_mb=0):
+    """Create a pod on the node the scheduler picks; returns (pod ID, node ID), or None if no node has room"""
+    with store.lock:
+        pod = pods.add(str(uuid.uuid4()), cpu_required, None, clock(), memory_required_mb)
+        trace_event("launch-pod", podId=pod.id, cpuRequired=cpu_required, memoryRequiredMb=memory_required_mb)
+        node_id = place_pod(pod)
+        if node_id is None:
+            del pods[pod.id]
+            return None
+        emit_pod("ADDED", pod, "PodPlaced")
+    return pod.id, node_id
+
 @app.route('/pods', methods=['POST'])
 def launch_pod():
     try:
         data = request.get_json()
         cpu_required = data.get('cpuRequired', 0)
+        memory_required_mb = data.get('memoryRequiredMb', 0)
         
         if cpu_required <= 0:
             return jsonify({"error": "CPU required must be positive"}), 400
+        if memory_required_mb < 0:
+            return jsonify({"error": "Memory required must not be negative"}), 400
         
-        # Find a suitable node
-        with nodes_lock:
-            for node_id, node in nodes.items():
-                if (node.health_status == "Healthy" and 
-                    node.is_running and 
-                    node.available_cpu >= cpu_required):
-                    pod_id = str(uuid.uuid4())
-                    pods[pod_id] = Pod(pod_id, cpu_required, node_id)
-                    node.available_cpu -= cpu_required
-                    node.pods.append(pod_id)
-                    return jsonify({"message": f"Pod {pod_id} launched on node {node_id}"}), 201
+        placed = create_pod(cpu_required, memory_required_mb)
+        if placed is not None:
+            pod_id, node_id = placed
+            return jsonify({"message": f"Pod {pod_id} launched on node {node_id}",
+                            "podId": pod_id, "nodeId": node_id}), 201
         
-        return jsonify({"error": "No healthy nodes with sufficient CPU available"}), 400
+        return jsonify({"error": "No healthy nodes with sufficient CPU and memory available"}), 400
         
     except Exception as e:
         logger.error(f"Error launching pod: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/pods/batch', methods=['POST'])
+def launch_pods_batch():
+    """Place many pods in one pass, largest request first, with the configured strategy"""
+    try:
+        data = request.get_json()
+        cpu_requests = [p.get('cpuRequired', 0) for p in data.get('pods', [])]
+        memory_requests = [p.get('memoryRequiredMb', 0) for p in data.get('pods', [])]
+
+        if not cpu_requests:
+            return jsonify({"error": "No pods given"}), 400
+        if any(cpu_required <= 0 for cpu_required in cpu_requests):
+            return jsonify({"error": "CPU required must be positive"}), 400
+        if any(memory_required_mb < 0 for memory_required_mb in memory_requests):
+            return jsonify({"error": "Memory required must not be negative"}), 400
+
+        # Decreasing order packs better; results are reported in request order
+        order = sorted(range(len(cpu_requests)), key=lambda i: cpu_requests[i], reverse=True)
+        results = [None] * len(cpu_requests)
+        placed = 0
+
+        with store.lock:
+            for i in order:
+                pod_id = str(uuid.uuid4())
+                pod = pods.add(pod_id, cpu_requests[i], None, clock(), memory_requests[i])
+                trace_event("launch-pod", podId=pod_id, cpuRequired=cpu_requests[i],
+                            memoryRequiredMb=memory_requests[i])
+                node_id = place_pod(pod)
+                if node_id is not None:
+                    emit_pod("ADDED", pod, "PodPlaced")
+                    placed += 1
+                    results[i] = {"podId": pod_id, "nodeId": node_id, "cpuRequired": cpu_requests[i],
+                                  "memoryRequiredMb": memory_requests[i]}
+                else:
+                    del pods[pod_id]
+                    results[i] = {"error": "No healthy nodes with sufficient CPU and memory available",
+                                  "cpuRequired": cpu_requests[i], "memoryRequiredMb": memory_requests[i]}
+
+        logger.info(f"Batch placed {placed}/{len(cpu_requests)} pods")
+        return jsonify({"placed": placed, "failed": len(cpu_requests) - placed, "results": results}), 201
+
+    except Exception as e:
+        logger.error(f"Error launching pod batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/heartbeat', methods=['POST'])
 def handle_heartbeat():
+    heartbeat_pacer.begin()
+    try:
+        body, status = record_heartbeat(request.get_json())
+        return jsonify(body), status
+        
+    except Exception as e:
+        logger.error(f"Error handling heartbeat: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        heartbeat_pacer.end()
+
+@app.route('/heartbeats', methods=['POST'])
+def handle_heartbeats():
+    """Apply heartbeats for many nodes hosted by one agent in a single lock acquisition"""
+    heartbeat_pacer.begin()
     try:
         data = request.get_json()
-        node_id = data.get('nodeId')
-        cpu_cores = data.get('cpuCores', 0)
-        
-        with nodes_lock:
-            if node_id in nodes:
-                node = nodes[node_id]
-                if node.is_running:
-                    node.last_heartbeat = time.time()
-                    node.heartbeat_count += 1
-                    node.cpu_cores = cpu_cores
-                    return jsonify({"message": "Heartbeat received", "pods": node.pods}), 200
-                else:
-                    return jsonify({"error": "Node is stopped"}), 403
+        heartbeats = data.get('heartbeats', [])
+        now = clock()
+        
+        with store.lock:
+            heartbeat_pacer.update(len(heartbeat_tracker))
+            results = {}
+            for heartbeat in heartbeats:
+                body, status = apply_heartbeat(heartbeat, now)
+                body["status"] = status
+                results[heartbeat.get('nodeId')] = body
         
-        return jsonify({"error": "Node not found"}), 404
+        return jsonify({"nodes": results, **heartbeat_pacer.advertise()}), 200
         
     except Exception as e:
-        logger.error(f"Error handling heartbeat: {e}")
+        logger.error(f"Error handling heartbeats: {e}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        heartbeat_pacer.end()
+
+def record_heartbeat(data):
+    """Apply one heartbeat payload; returns (response body, status code)"""
+    with store.lock:
+        heartbeat_pacer.update(len(heartbeat_tracker))
+        body, status = apply_heartbeat(data, clock())
+    if status == 200:
+        body.update(heartbeat_pacer.advertise())
+    return body, status
+
+def apply_heartbeat(data, now):
+    """Heartbeat bookkeeping shared by /heartbeat and /heartbeats. Caller must hold store.lock.
+    The node's deadline follows the interval heartbeat_pacer currently advertises. The CPU and
+    memory a heartbeat reports are ignored; the capacity registered for the node is authoritative."""
+    node_id = data.get('nodeId')
+    
+    if node_id not in nodes:
+        return {"error": "Node not found"}, 404
+    
+    node = nodes[node_id]
+    if not node.is_running:
+        return {"error": "Node is stopped"}, 403
+    
+    if node.heartbeat_count:
+        heartbeat_interarrival_seconds.observe(now - node.last_heartbeat)
+    node.last_heartbeat = now
+    node.heartbeat_count += 1
+    store.mark_node(node_id)
+    heartbeat_tracker.touch(node_id, now, heartbeat_pacer.timeout)
+    # Latency is measured from the time the node reports sending at, when it does
+    sent_at = data.get('sentAt')
+    heartbeat_history.record(node_id, now, max(0.0, now - sent_at) if isinstance(sent_at, (int, float)) else math.nan)
+    if node.health_status == "Provisioning":
+        # First heartbeat: the node is ready for pods
+        node.health_status = "Healthy"
+        scheduler.update(node)
+        emit_node("MODIFIED", node, "NodeReady")
+        trace_event("add-node", nodeId=node_id, cpuCores=node.cpu_cores, memoryMb=node.memory_mb)
+        logger.info(f"Node {node_id} is ready")
+    
+    # Nodes that report the version they hold get nothing, or a delta, instead of the full list
+    body = {"message": "Heartbeat received", "podsVersion": node.pods_version}
+    since = data.get('podsVersion')
+    delta = None if since is None else pod_delta(node, since)
+    if delta is None:
+        body["pods"] = node.pods.ids()
+    elif since != node.pods_version:
+        body["added"], body["removed"] = delta
+    return body, 200
+
+def handle_expired_nodes(node_ids):
+    """Probe nodes that missed their heartbeat deadline and fail those whose container is gone"""
+    # Probe outside store.lock so heartbeats and scheduling are not blocked on the runtime
+    states = runtime.inspect(node_ids)
+    current_time = clock()
+    failed = []
+    
+    with store.lock:
+        for node_id in node_ids:
+            node = nodes.get(node_id)
+            if node is None or not node.is_running:
+                continue
+            
+            if node_id in heartbeat_tracker:
+                continue  # A heartbeat arrived while we were probing
+            time_since_heartbeat = current_time - node.last_heartbeat
+            
+            if node_id in states:
+                is_running, container_status = states[node_id]
+                logger.warning(f"Node {node_id} status: Running={is_running}, Status={container_status}, Time since heartbeat: {time_since_heartbeat:.2f}s")
+                
+                if is_running:
+                    logger.warning(f"Container for node {node_id} is running but not sending heartbeats")
+                    heartbeat_tracker.set_deadline(node_id, current_time + MONITOR_INTERVAL)
+                    continue
+                logger.warning(f"Container for node {node_id} is not running (status: {container_status})")
+            else:
+                logger.error(f"Failed to inspect container {node_id}")
+            
+            fail_node(node)
+            failed.append(node_id)
+    
+    if failed:
+        reschedule_pods(failed)
+
+def fail_node(node):
+    """Take a node out of scheduling as Failed; its pods stay until rescheduled. Caller must hold store.lock."""
+    node.health_status = "Failed"
+    scheduler.update(node)
+    emit_node("MODIFIED", node, "NodeFailed")
+    trace_event("fail-node", nodeId=node.id)
+
+def check_heartbeats():
+    """One health monitor pass; only nodes whose heartbeat deadline has passed are looked at"""
+    with store.lock:
+        expired = heartbeat_tracker.pop_expired(clock())
+    
+    if expired:
+        handle_expired_nodes(expired)
 
 def health_monitor():
     while True:
-        time.sleep(5)
-        current_time = time.time()
-        
-        with nodes_lock:
-            for node_id, node in nodes.items():
-                if node.is_running:
-                    time_since_heartbeat = current_time - node.last_heartbeat
-                    if time_since_heartbeat > 15:
-                        cmd = ["docker", "inspect", "-f", "{{.State.Running}} {{.State.Status}}", node_id]
-                        result = subprocess.run(cmd, capture_output=True, text=True)
-                        
-                        if result.returncode == 0:
-                            status = result.stdout.strip().split()
-                            if len(status) == 2:
-                                is_running, container_status = status
-                                logger.warning(f"Node {node_id} status: Running={is_running}, Status={container_status}, Time since heartbeat: {time_since_heartbeat:.2f}s")
-                                
-                                if is_running == "true":
-                                    logger.warning(f"Container for node {node_id} is running but not sending heartbeats")
-                                else:
-                                    logger.warning(f"Container for node {node_id} is not running (status: {container_status})")
-                                    node.health_status = "Failed"
-                                    reschedule_pods(node_id)
-                        else:
-                            logger.error(f"Failed to inspect container {node_id}: {result.stderr}")
-                            node.health_status = "Failed"
-                            reschedule_pods(node_id)
-
-def reschedule_pods(failed_node_id):
-    """Reschedule pods from a failed node to healthy nodes"""
-    with pods_lock:
-        pods_to_reschedule = [pod_id for pod_id, pod in pods.items() if pod.node_id == failed_node_id]
-        
-        for pod_id in pods_to_reschedule:
-            pod = pods[pod_id]
-            with nodes_lock:
-                for node_id, node in nodes.items():
-                    if (node.health_status == "Healthy" and 
-                        node.is_running and 
-                        node.available_cpu >= pod.cpu_required):
-                        pod.node_id = node_id
-                        pod.last_updated = time.time()
-                        node.available_cpu -= pod.cpu_required
-                        node.pods.append(pod_id)
-                        logger.info(f"Pod {pod_id} rescheduled from node {failed_node_id} to node {node_id}")
-                        break
+        time.sleep(MONITOR_INTERVAL)
+        check_heartbeats()
+
+def reschedule_pods(failed_node_ids):
+    """Re-place the pods of nodes that failed together; returns (placed, failed) pod counts.
+    
+    All displaced pods are gathered and placed in one pass, largest CPU request
+    first, with FAILOVER_STRATEGY (by default the scheduler's own; best-fit
+    makes this best-fit-decreasing), so small pods do not fragment the capacity
+    large ones need. When they need more CPU than is free, the smallest pods
+    that fit in total are placed that way and the rest, smallest first, take
+    whatever is left, so as many pods as possible keep running.
+    """
+    if FAILOVER_MODE == "greedy":
+        counts = [reschedule_node_pods(node_id) for node_id in failed_node_ids]
+        return sum(placed for placed, _ in counts), sum(failed for _, failed in counts)
+    
+    with store.lock:
+        displaced = [pod for node_id in failed_node_ids if node_id in nodes for pod in nodes[node_id].pods]
+        free_cpu = scheduler.free_cpu()
+    displaced.sort(key=lambda pod: pod.cpu_required)
+    admitted = 0
+    for pod in displaced:
+        if pod.cpu_required > free_cpu:
+            break
+        free_cpu -= pod.cpu_required
+        admitted += 1
+    displaced[:admitted] = reversed(displaced[:admitted])
+    
+    failed_nodes = set(failed_node_ids)
+    placed = failed = 0
+    # Taking the lock per chunk lets heartbeats and API requests in between
+    for start in range(0, len(displaced), RESCHEDULE_CHUNK):
+        with store.lock:
+            for pod in displaced[start:start + RESCHEDULE_CHUNK]:
+                if pods.get(pod.id) != pod or pod.node_id not in failed_nodes:
+                    continue  # Deleted or moved since we looked
+                if move_pod(pod, FAILOVER_STRATEGY) is not None:
+                    placed += 1
                 else:
-                    pod.status = "Failed"
-                    pod.health_status = "Unhealthy"
-                    logger.warning(f"Could not reschedule pod {pod_id}, no healthy nodes with sufficient CPU available")
+                    failed += 1
+    
+    if failed:
+        logger.warning(f"Rescheduled {placed} of {placed + failed} pods from {len(failed_node_ids)} failed nodes, "
+                       f"{failed} could not be placed")
+    else:
+        logger.info(f"Rescheduled {placed} pods from {len(failed_node_ids)} failed nodes")
+    return placed, failed
+
+def reschedule_node_pods(failed_node_id):
+    """Reschedule pods from one failed node, one at a time in the node's order (FAILOVER_MODE=greedy)"""
+    with store.lock:
+        node = nodes.get(failed_node_id)
+        pods_to_reschedule = node.pods.ids() if node is not None else []
+    
+    placed = failed = 0
+    for pod_id in pods_to_reschedule:
+        with store.lock:
+            pod = pods.get(pod_id)
+            if pod is None or pod.node_id != failed_node_id:
+                continue  # Deleted or moved since we looked
+            node_id = move_pod(pod, FAILOVER_STRATEGY)
+        if node_id is not None:
+            placed += 1
+            logger.info(f"Pod {pod_id} rescheduled from node {failed_node_id} to node {node_id}")
+        else:
+            failed += 1
+            logger.warning(f"Could not reschedule pod {pod_id}, no healthy nodes with sufficient CPU and memory available")
+    return placed, failed
+
+def remove_pod(pod_id):
+    """Delete a pod and free its CPU; returns False if there is no such pod"""
+    with store.lock:
+        pod = pods.pop(pod_id, None)
+        if pod is None:
+            return False
+        release_pod(pod)
+        emit_pod("DELETED", pod, "PodDeleted")
+        trace_event("delete-pod", podId=pod_id)
+    return True
 
 @app.route('/pods/<pod_id>', methods=['DELETE'])
 def delete_pod(pod_id):
     try:
-        with pods_lock:
-            if pod_id not in pods:
-                return jsonify({"error": "Pod not found"}), 404
-            
-            pod = pods[pod_id]
-            
-            with nodes_lock:
-                if pod.node_id in nodes:
-                    node = nodes[pod.node_id]
-                    node.available_cpu += pod.cpu_required
-                    node.pods.remove(pod_id)
-            
-            del pods[pod_id]
-            
-            logger.info(f"Pod {pod_id} deleted")
-            return jsonify({"message": f"Pod {pod_id} deleted"}), 200
+        if not remove_pod(pod_id):
+            return jsonify({"error": "Pod not found"}), 404
+        
+        logger.info(f"Pod {pod_id} deleted")
+        return jsonify({"message": f"Pod {pod_id} deleted"}), 200
             
     except Exception as e:
         logger.error(f"Error deleting pod: {e}")
@@ -317,26 +972,211 @@ def delete_pod(pod_id):
 
 @app.route('/pods', methods=['GET'])
 def list_pods():
+    """Pods; supports ?node=, ?status=, ?limit=&after=<cursor> and ?fields=a,b"""
     try:
-        with pods_lock:
-            pods_list = []
-            for pod_id, pod in pods.items():
-                pods_list.append({
-                    "id": pod_id,
-                    "cpu_required": pod.cpu_required,
-                    "node_id": pod.node_id,
-                    "status": pod.status,
-                    "health_status": pod.health_status,
-                    "created_at": pod.created_at,
-                    "last_updated": pod.last_updated
-                })
-            return jsonify(pods_list), 200
+        return list_objects("pods", {'node': 'node_id', 'status': 'status'}, store.query_pods, pod_to_dict)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error listing pods: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text format: request, lock, scheduler, heartbeat and docker timings, and cluster gauges"""
+    return Response(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/watch', methods=['GET'])
+def watch():
+    """Change events after ?since=<version>, streamed as SSE or returned by long-polling"""
+    # An EventSource reconnects to the URL it started with and sends the last event it got as
+    # Last-Event-ID, which is newer than ?since
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    if since is None:
+        since = events.version
+    
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        return Response(stream_events(since), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache"})
+    
+    timeout = min(request.args.get('timeout', WATCH_TIMEOUT, type=float), WATCH_TIMEOUT)
+    batch = events.wait(since, timeout)
+    if batch is None:
+        return jsonify({"error": "Version is no longer available, list again and watch from there",
+                        "version": events.version}), 410
+    return jsonify({"version": batch[-1]["version"] if batch else since, "events": batch}), 200
+
+def stream_events(since):
+    while True:
+        batch = events.wait(since, WATCH_TIMEOUT)
+        if batch is None:
+            # The client fell too far behind; it has to list again
+            yield f"data: {json.dumps({'type': 'RESET', 'version': events.version})}\n\n"
+            return
+        if not batch:
+            yield ": keepalive\n\n"
+        for event in batch:
+            yield f"id: {event['version']}\ndata: {json.dumps(event)}\n\n"
+            since = event['version']
+
+def restore_node(obj):
+    # Nodes journaled before memory was tracked get the default for their CPU
+    memory_mb = obj.get("memory_mb")
+    if memory_mb is None:
+        memory_mb = obj["cpu_cores"] * NODE_MEMORY_PER_CORE_MB
+    node = Node(obj["id"], obj["cpu_cores"], memory_mb=memory_mb)
+    node.pods_version = obj["pods_version"]
+    node.health_status = obj["health_status"]
+    node.heartbeat_count = obj["heartbeat_count"]
+    node.is_running = obj["is_running"]
+    nodes[node.id] = node
+
+def count_pod_move(pod_id, node_id, logged):
+    """Bump both nodes' pods_version when a logged record moves a pod, just as release_pod
+    and place_pod did; `logged` holds the pods' records replayed so far"""
+    if pod_id in logged:
+        previous_node_id = logged[pod_id]["node_id"] if logged[pod_id] is not None else None
+    else:
+        entry = pods.entry(pod_id)
+        previous_node_id = entry[0] if entry is not None else None
+    if previous_node_id != node_id:
+        for changed in (previous_node_id, node_id):
+            if changed in nodes:
+                nodes[changed].pods_version += 1
+
+def restore_pod(obj):
+    """Overwrite an existing pod with its last logged record"""
+    pod = pods[obj["id"]]
+    pod.cpu_required = obj["cpu_required"]
+    pod.memory_required_mb = obj.get("memory_required_mb") or 0
+    pod.node_id = obj["node_id"]
+    pod.status = obj["status"]
+    pod.health_status = obj["health_status"]
+    pod.created_at = obj["created_at"]
+    pod.last_updated = obj["last_updated"]
+
+def recover_state():
+    """Rebuild nodes and pods from the journal's latest snapshot plus the log records after it"""
+    start = time.time()
+    # Every object built here lives on, so collection passes during the load are wasted work
+    gc.disable()
+    try:
+        _recover_state()
+    finally:
+        gc.enable()
+    logger.info(f"Recovered {len(nodes)} nodes and {len(pods)} pods at version {events.version} "
+                f"in {time.time() - start:.3f}s")
+
+def _recover_state():
+    version, snapshot_nodes, snapshot_pods, records = journal.recover()
+    with store.lock:
+        for obj in snapshot_nodes:
+            restore_node(obj)
+        # Snapshot rows go straight into the pod columns. Of the logged pod records only each
+        # pod's last one is applied, and the pods created since the snapshot are loaded together.
+        pods.load(snapshot_pods)
+        logged = {}   # pod_id -> last logged pod dict, None once deleted
+        for version, kind, type, obj in records:
+            if kind == "node":
+                if type == "DELETED":
+                    nodes.pop(obj["id"], None)
+                else:
+                    restore_node(obj)
+            else:
+                deleted = type == "DELETED"
+                count_pod_move(obj["id"], None if deleted else obj["node_id"], logged)
+                logged[obj["id"]] = None if deleted else obj
+        created = []
+        for pod_id, obj in logged.items():
+            if obj is None:
+                pods.pop(pod_id, None)
+            elif pod_id in pods:
+                restore_pod(obj)
+            else:
+                created.append(obj)
+        pods.load({
+            "id": [obj["id"] for obj in created],
+            "node_id": [obj["node_id"] for obj in created],
+            "cpu_required": [obj["cpu_required"] for obj in created],
+            "memory_required_mb": [obj.get("memory_required_mb") or 0 for obj in created],
+            "status": [obj["status"] for obj in created],
+            "health_status": [obj["health_status"] for obj in created],
+            "created_at": [obj["created_at"] for obj in created],
+            "last_updated": [obj["last_updated"] for obj in created]
+        })
+        
+        # Pod membership and free resources are derived; live nodes get a fresh heartbeat deadline
+        for node_id, rows in pods.rows_by_node().items():
+            node = nodes.get(node_id)
+            if node is not None:
+                node.pods.extend(pods, rows)
+                cpu, memory = pods.demand(rows)
+                node.available_cpu -= cpu
+                node.available_memory_mb -= memory
+        now = clock()
+        for node in nodes.values():
+            node.last_heartbeat = now
+            if node.is_running and node.health_status in ("Healthy", "Provisioning"):
+                heartbeat_tracker.touch(node.id, now, heartbeat_pacer.timeout)
+            scheduler.update(node)
+        store.rebuild()
+        events.version = version
+
+def journal_checkpointer():
+    """Snapshot the cluster into the journal directory once enough records have been logged"""
+    while True:
+        time.sleep(MONITOR_INTERVAL)
+        if journal.records >= JOURNAL_CHECKPOINT_RECORDS:
+            try:
+                journal.checkpoint(store.snapshot)
+            except Exception as e:
+                logger.error(f"Error writing journal checkpoint: {e}")
+
+def timed_view(view, histogram):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+def time_routes():
+    """Time every route handler into its own request_seconds histogram, picked once here
+    rather than looked up per request"""
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint != "static":
+            methods = ",".join(sorted(rule.methods - {"HEAD", "OPTIONS"}))
+            app.view_functions[rule.endpoint] = timed_view(app.view_functions[rule.endpoint],
+                                                           request_seconds.labels(methods, rule.rule))
+
+time_routes()
+
+if journal is not None:
+    recover_state()
+
+def create_server(host='0.0.0.0', port=8080):
+    """Production server: waitress, with a thread pool and HTTP keep-alive"""
+    from waitress import create_server as create_waitress_server
+    
+    # Every open /watch stream holds a thread, so the pool has to outnumber the watchers
+    threads = int(os.environ.get("SERVER_THREADS", "32"))
+    return create_waitress_server(app, host=host, port=port, threads=threads, ident="kube-sim")
+
 if __name__ == "__main__":
     monitor_thread = threading.Thread(target=health_monitor, daemon=True)
     monitor_thread.start()
     
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    if journal is not None:
+        threading.Thread(target=journal_checkpointer, daemon=True).start()
+    
+    if os.environ.get("DEBUG") == "1":
+        # Development server with the debugger; no reloader, it would run the background threads twice
+        app.run(host='0.0.0.0', port=8080, debug=True, use_reloader=False)
+    else:
+        httpd = create_server()
+        logger.info(f"Serving on port {httpd.effective_port}")
+        httpd.run()
\ No newline at end of file
@@ -0,0 +1,305 @@
+"""Discrete-event simulation of the cluster on a virtual clock.
+
+Drives the server's own code (pod placement, heartbeat handling, heartbeat
+expiry, failure detection and rescheduling) from an event queue instead of
+threads and sleeps, so a day of a 5,000-node cluster runs in minutes. Nodes
+are registered and launched as the API does, heartbeat at a fixed interval
+from a random phase, crash after an exponentially distributed lifetime and are
+replaced after --repair-time; pods arrive as a Poisson process and are deleted
+after an exponentially distributed lifetime.
+
+Between crashes a node's heartbeats only push its deadline forward, so by
+default they are delivered in sweeps every --heartbeat-coalesce seconds, each
+carrying the deadline the skipped beats would have set. A crashing node's last
+real heartbeat is delivered when it crashes, so failures are detected exactly
+when they would be with every beat; --heartbeat-coalesce 0 delivers every beat.
+
+Usage: python server/simulation.py [--nodes 5000] [--hours 24] [--output results.json] [--trace trace.jsonl]
+"""
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+
+from heartbeats import HeartbeatPacer
+from runtime import NodeRuntime
+
+
+class SimulatedRuntime(NodeRuntime):
+    """Nodes that exist only in the simulation: start() schedules the first heartbeat,
+    and inspect() reports crashed nodes as exited"""
+
+    def __init__(self, simulation):
+        self._simulation = simulation
+        self.crashed = set()
+
+    def start(self, node_id, cpu_cores, memory_mb=0):
+        # Nodes come up at different times, which spreads their heartbeat phases
+        delay = self._simulation.args.provision_delay + self._simulation.rng.uniform(
+            0, self._simulation.args.heartbeat_interval)
+        self._simulation.schedule(delay, self._simulation.node_ready, node_id, cpu_cores)
+        return None
+
+    def stop(self, node_id):
+        return None
+
+    def remove(self, node_id):
+        self.crashed.discard(node_id)
+        return None
+
+    def inspect(self, node_ids):
+        return {node_id: (False, "exited") if node_id in self.crashed else (True, "running")
+                for node_id in node_ids}
+
+    def inject_failure(self, node_id, kind):
+        return "Failure injection is not supported in the simulation"
+
+
+class Simulation:
+    def __init__(self, server, args):
+        self.server = server
+        self.args = args
+        self.now = 0.0
+        self.rng = random.Random(args.seed)
+        self.runtime = SimulatedRuntime(self)
+        self.events = 0
+        self._queue = []             # (time, seq, action, args)
+        self._seq = itertools.count()
+        self._phases = {}            # live node_id -> time of its first heartbeat
+        self._next_sweep = 0.0
+        self._crashes = {}           # crashed node_id -> (crash time, pod IDs it held), until detected
+        self._utilization = []
+        self._latencies = []
+        self.counts = dict.fromkeys(["pods_arrived", "pods_placed", "pods_rejected", "pods_displaced",
+                                     "pods_rescheduled", "pods_failed", "nodes_crashed", "nodes_replaced"], 0)
+
+        server.clock = lambda: self.now
+        server.runtime = self.runtime
+        server.HEARTBEAT_TIMEOUT = server.heartbeat_tracker.timeout = args.heartbeat_timeout
+        # Simulated nodes beat at the fixed --heartbeat-interval, so the server must not pace them
+        server.heartbeat_pacer = HeartbeatPacer(args.heartbeat_interval, args.heartbeat_timeout,
+                                                max_rate=0, max_in_flight=0)
+        server.MONITOR_INTERVAL = args.monitor_interval
+
+    def schedule(self, delay, action, *args):
+        heapq.heappush(self._queue, (self.now + delay, next(self._seq), action, args))
+
+    def run(self):
+        """Process events until the simulated duration has passed; returns the results"""
+        args = self.args
+        end = args.hours * 3600
+        warm = args.provision_delay + args.heartbeat_interval   # every initial node is up by then
+
+        self.add_nodes(args.nodes)
+        self.schedule(warm, self.fill_pods)
+        self.schedule(args.monitor_interval, self.monitor)
+        self.schedule(warm, self.sample)
+        if args.heartbeat_coalesce:
+            self._next_sweep = args.heartbeat_coalesce
+            self.schedule(args.heartbeat_coalesce, self.heartbeat_sweep)
+
+        start = time.perf_counter()
+        while self._queue and self._queue[0][0] <= end:
+            self.now, _, action, event_args = heapq.heappop(self._queue)
+            action(*event_args)
+            self.events += 1
+        return self.results(time.perf_counter() - start)
+
+    def results(self, elapsed):
+        latencies = sorted(self._latencies)
+        pct = lambda p: round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) if latencies else None
+        utilization = self._utilization or [0]
+        return {
+            "config": vars(self.args),
+            "simulated_hours": self.args.hours,
+            "wall_seconds": round(elapsed, 2),
+            "speedup": round(self.args.hours * 3600 / elapsed),
+            "events": self.events,
+            "nodes": len(self.server.nodes),
+            "pods": len(self.server.pods),
+            "counts": self.counts,
+            "cpu_utilization": {"mean": round(sum(utilization) / len(utilization), 4),
+                                "min": round(min(utilization), 4), "max": round(max(utilization), 4)},
+            "rescheduling_latency_s": {"p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99),
+                                       "max": latencies[-1] if latencies else None}
+        }
+
+    # Event handlers
+
+    def add_nodes(self, count):
+        for node_id in self.server.register_nodes(count, self.args.node_cpu):
+            self.server.launch_node(node_id, self.args.node_cpu)
+
+    def node_ready(self, node_id, cpu_cores):
+        if node_id not in self.server.nodes:
+            return
+        self.server.record_heartbeat({"nodeId": node_id, "cpuCores": cpu_cores})
+        self._phases[node_id] = self.now
+        self.schedule(self.rng.expovariate(1 / (self.args.node_mtbf * 3600)), self.crash_node, node_id)
+        if self.args.heartbeat_coalesce:
+            with self.server.store.lock:
+                self._cover(node_id, self.now)
+        else:
+            self.schedule(self.args.heartbeat_interval, self.heartbeat, node_id)
+
+    def heartbeat(self, node_id):
+        if node_id in self._phases:
+            self.server.record_heartbeat(self._heartbeat(node_id))
+            self.schedule(self.args.heartbeat_interval, self.heartbeat, node_id)
+
+    def heartbeat_sweep(self):
+        self._next_sweep = self.now + self.args.heartbeat_coalesce
+        with self.server.store.lock:
+            for node_id, phase in self._phases.items():
+                self.server.apply_heartbeat(self._heartbeat(node_id), self._last_beat(phase, self.now))
+                self._cover(node_id, phase)
+        self.schedule(self.args.heartbeat_coalesce, self.heartbeat_sweep)
+
+    def crash_node(self, node_id):
+        phase = self._phases.pop(node_id, None)
+        if phase is None:
+            return
+        server = self.server
+        with server.store.lock:
+            if self.args.heartbeat_coalesce:
+                server.apply_heartbeat(self._heartbeat(node_id), self._last_beat(phase, self.now))
+            self._crashes[node_id] = (self.now, server.nodes[node_id].pods.ids())
+        self.runtime.crashed.add(node_id)
+        self.counts["nodes_crashed"] += 1
+
+    def monitor(self):
+        self.server.check_heartbeats()
+        for node_id in [node_id for node_id in self._crashes
+                        if self.server.nodes[node_id].health_status == "Failed"]:
+            crashed_at, pod_ids = self._crashes.pop(node_id)
+            for pod_id in pod_ids:
+                pod = self.server.pods.get(pod_id)
+                if pod is None:
+                    continue   # Deleted before the failure was noticed
+                self.counts["pods_displaced"] += 1
+                if pod.status == "Failed":
+                    self.counts["pods_failed"] += 1
+                else:
+                    self.counts["pods_rescheduled"] += 1
+                    self._latencies.append(self.now - crashed_at)
+            self.schedule(self.args.repair_time, self.replace_node, node_id)
+        self.schedule(self.args.monitor_interval, self.monitor)
+
+    def replace_node(self, node_id):
+        self.server.remove_node(node_id)
+        self.runtime.remove(node_id)
+        self.add_nodes(1)
+        self.counts["nodes_replaced"] += 1
+
+    def fill_pods(self):
+        """Start at steady state: the pods a Poisson arrival process would have running by now,
+        each with a fresh exponential lifetime, then the arrivals themselves"""
+        for _ in range(round(self.args.pod_rate * self.args.pod_lifetime)):
+            self.launch_pod()
+        self.schedule(self.rng.expovariate(self.args.pod_rate), self.pod_arrival)
+
+    def pod_arrival(self):
+        self.launch_pod()
+        self.schedule(self.rng.expovariate(self.args.pod_rate), self.pod_arrival)
+
+    def launch_pod(self):
+        self.counts["pods_arrived"] += 1
+        placed = self.server.create_pod(self.rng.choice(self.args.pod_cpu))
+        if placed is None:
+            self.counts["pods_rejected"] += 1
+            return
+        self.counts["pods_placed"] += 1
+        self.schedule(self.rng.expovariate(1 / self.args.pod_lifetime), self.server.remove_pod, placed[0])
+
+    def sample(self):
+        total = allocated = 0
+        with self.server.store.lock:
+            for node in self.server.nodes.values():
+                if node.health_status == "Healthy":
+                    total += node.cpu_cores
+                    allocated += node.cpu_cores - node.available_cpu
+        if total:
+            self._utilization.append(allocated / total)
+        # Publishing a snapshot, as the list endpoints would, keeps the store's change sets bounded
+        self.server.store.snapshot()
+        self.schedule(self.args.sample_interval, self.sample)
+
+    def _cover(self, node_id, phase):
+        """Set the deadline the node's beats up to the next sweep would leave; a crash brings it back"""
+        self.server.heartbeat_tracker.set_deadline(
+            node_id, self._last_beat(phase, self._next_sweep) + self.server.HEARTBEAT_TIMEOUT)
+
+    def _heartbeat(self, node_id):
+        # Reporting the current pods version keeps the response empty, as for a node in sync
+        node = self.server.nodes[node_id]
+        return {"nodeId": node_id, "cpuCores": node.cpu_cores, "podsVersion": node.pods_version}
+
+    def _last_beat(self, phase, at):
+        """Time of the last heartbeat at or before `at` of a node whose first heartbeat was at `phase`"""
+        interval = self.args.heartbeat_interval
+        return phase + math.floor((at - phase) / interval) * interval
+
+
+def load_server(args):
+    """Import server.py with nothing running behind it"""
+    os.environ["NODE_RUNTIME"] = "external"
+    os.environ["SCHEDULER"] = args.scheduler
+    os.environ.pop("JOURNAL_DIR", None)
+    if args.trace:
+        os.environ["TRACE_FILE"] = args.trace
+    else:
+        os.environ.pop("TRACE_FILE", None)
+    import server
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.ERROR)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Discrete-event cluster simulation")
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--node-cpu", type=int, default=16)
+    parser.add_argument("--hours", type=float, default=24, help="simulated duration")
+    parser.add_argument("--pod-rate", type=float, default=9, help="pod arrivals per simulated second")
+    parser.add_argument("--pod-lifetime", type=float, default=3600, help="mean pod lifetime in seconds")
+    parser.add_argument("--pod-cpu", type=lambda value: [float(cpu) for cpu in value.split(",")],
+                        default=[0.5, 1, 2, 4], help="comma-separated CPU requests to draw from")
+    parser.add_argument("--node-mtbf", type=float, default=500, help="mean hours between failures of a node")
+    parser.add_argument("--repair-time", type=float, default=600,
+                        help="seconds before a failed node is replaced by a new one")
+    parser.add_argument("--provision-delay", type=float, default=2, help="seconds from launch to first heartbeat")
+    parser.add_argument("--heartbeat-interval", type=float, default=5)
+    parser.add_argument("--heartbeat-timeout", type=float, default=15)
+    parser.add_argument("--monitor-interval", type=float, default=5)
+    parser.add_argument("--heartbeat-coalesce", type=float, default=300,
+                        help="seconds between heartbeat sweeps; 0 delivers every heartbeat")
+    parser.add_argument("--sample-interval", type=float, default=60, help="seconds between utilization samples")
+    parser.add_argument("--scheduler", default="first-fit")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="keep the server's log output")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--trace", help="also record the run as a trace for replay.py")
+    args = parser.parse_args()
+    if args.heartbeat_timeout <= args.heartbeat_interval:
+        parser.error("--heartbeat-timeout must be longer than --heartbeat-interval")
+
+    server = load_server(args)
+    results = Simulation(server, args).run()
+    if server.trace is not None:
+        server.trace.close()
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import bisect
+import itertools
+import threading
+
+from records import PodTable
+
+
+class Snapshot:
+    """Immutable view of the cluster; readers use it without taking any lock"""
+
+    def __init__(self, seq, resource_version, nodes, pods):
+        self.seq = seq                            # bumped on every publish
+        self.resource_version = resource_version  # event version the view reflects
+        self.nodes = nodes                        # node_id -> dict
+        self.pods = pods                          # pod_id -> dict
+        self.encoded = {"nodes": {}, "pods": {}}  # response bodies rendered from this view, by kind
+
+
+class _Index:
+    """Sorted sequence numbers per key, for filtered listing with cursor pagination"""
+
+    def __init__(self):
+        self._lists = {}
+
+    def add(self, key, seq):
+        entries = self._lists.setdefault(key, [])
+        if not entries or entries[-1] < seq:
+            entries.append(seq)  # New objects have the highest seq, so this is the common case
+        else:
+            bisect.insort(entries, seq)
+
+    def discard(self, key, seq):
+        entries = self._lists.get(key)
+        if entries is None:
+            return
+        i = bisect.bisect_left(entries, seq)
+        if i < len(entries) and entries[i] == seq:
+            del entries[i]
+        if not entries:
+            del self._lists[key]
+
+    def counts(self):
+        return {key: len(entries) for key, entries in self._lists.items()}
+
+    def after(self, key, seq):
+        """Iterate the sequence numbers under `key` that are greater than `seq`"""
+        entries = self._lists.get(key, [])
+        return itertools.islice(entries, bisect.bisect_right(entries, seq), None)
+
+
+class ClusterStore:
+    """Nodes and pods behind one write lock, with copy-on-write snapshots for readers.
+
+    Every mutation happens under `lock` and marks the node or pod it changed.
+    Marking also keeps the secondary indexes (pods by node and by status, nodes
+    by health) current, so filtered queries cost proportional to their result.
+    snapshot() publishes a new Snapshot when something is marked: the previous
+    view is copied outside the lock and only the marked entries are re-rendered
+    under it, so list endpoints hold the write lock for time proportional to
+    what changed, not to the cluster size. A kind with no changes keeps its
+    previous view, and the responses encoded from it. There is a single lock, so writers
+    cannot deadlock on acquisition order; it is reentrant so helpers can nest.
+    """
+
+    def __init__(self, node_view, pod_view, resource_version, lock=None):
+        self.nodes = {}
+        self.pods = PodTable()
+        self.lock = threading.RLock() if lock is None else lock
+        self._node_view = node_view
+        self._pod_view = pod_view
+        self._resource_version = resource_version
+        self._dirty_nodes = set()
+        self._dirty_pods = set()
+        self._snapshot = Snapshot(0, 0, {}, {})
+        self._publish_lock = threading.Lock()
+
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        # Each object gets an increasing sequence number; it orders listings and is the cursor
+        self._seq = itertools.count(1)
+        self._published_seq = 0   # highest seq in the published views; 0 starts them afresh
+        self._node_entries = {}   # node_id -> (seq, health_status)
+        self._pod_entries = {}    # pod_id -> (seq, node_id, status)
+        self._node_ids = {}       # seq -> node_id
+        self._pod_ids = {}        # seq -> pod_id
+        self._nodes_by_health = _Index()
+        self._pods_by_node = _Index()
+        self._pods_by_status = _Index()
+        self._all = _Index()      # keys "node" and "pod" hold every object of that kind
+
+    def mark_node(self, node_id):
+        """Record that a node changed. Caller must hold the lock."""
+        self._dirty_nodes.add(node_id)
+
+        node = self.nodes.get(node_id)
+        entry = self._node_entries.get(node_id)
+        if entry is not None and (node is None or entry[1] != node.health_status):
+            self._nodes_by_health.discard(entry[1], entry[0])
+            if node is None:
+                self._all.discard("node", entry[0])
+                del self._node_ids[entry[0]]
+                del self._node_entries[node_id]
+                return
+        if node is None or (entry is not None and entry[1] == node.health_status):
+            return
+
+        seq = next(self._seq) if entry is None else entry[0]
+        if entry is None:
+            self._all.add("node", seq)
+            self._node_ids[seq] = node_id
+        self._nodes_by_health.add(node.health_status, seq)
+        self._node_entries[node_id] = (seq, node.health_status)
+
+    def mark_pod(self, pod_id):
+        """Record that a pod changed. Caller must hold the lock."""
+        self._dirty_pods.add(pod_id)
+
+        current = self.pods.entry(pod_id)   # (node_id, status), None once deleted
+        entry = self._pod_entries.get(pod_id)
+        if current is not None and entry is not None and entry[1:] == current:
+            return
+
+        if entry is not None:
+            seq, node_id, status = entry
+            self._pods_by_node.discard(node_id, seq)
+            self._pods_by_status.discard(status, seq)
+            if current is None:
+                self._all.discard("pod", seq)
+                del self._pod_ids[seq]
+                del self._pod_entries[pod_id]
+                return
+        elif current is None:
+            return
+        else:
+            seq = next(self._seq)
+            self._all.add("pod", seq)
+            self._pod_ids[seq] = pod_id
+
+        node_id, status = current
+        if node_id is not None:
+            self._pods_by_node.add(node_id, seq)
+        self._pods_by_status.add(status, seq)
+        self._pod_entries[pod_id] = (seq, node_id, status)
+
+    def rebuild(self):
+        """Re-index every node and pod from scratch after a bulk load. Caller must hold the lock."""
+        self._reset_indexes()
+        self._dirty_nodes.update(self.nodes)
+        self._dirty_pods.update(self.pods)
+        # Sequence numbers are handed out in increasing order, so each index list is appended to
+        # directly instead of through _Index.add
+        by_health = self._nodes_by_health._lists
+        for seq, node in enumerate(self.nodes.values(), 1):
+            self._node_ids[seq] = node.id
+            self._node_entries[node.id] = (seq, node.health_status)
+            by_health.setdefault(node.health_status, []).append(seq)
+        self._all._lists["node"] = list(self._node_ids)
+        by_node, by_status = self._pods_by_node._lists, self._pods_by_status._lists
+        pod_ids, pod_entries = self._pod_ids, self._pod_entries
+        for seq, (pod_id, node_id, status) in enumerate(self.pods.entries(), len(self.nodes) + 1):
+            pod_ids[seq] = pod_id
+            pod_entries[pod_id] = (seq, node_id, status)
+            if node_id is not None:
+                by_node.setdefault(node_id, []).append(seq)
+            by_status.setdefault(status, []).append(seq)
+        self._all._lists["pod"] = list(pod_ids)
+        self._seq = itertools.count(len(self.nodes) + len(self.pods) + 1)
+
+    def counts(self):
+        """Return ({health_status: node count}, {status: pod count}). Caller must hold the lock."""
+        return self._nodes_by_health.counts(), self._pods_by_status.counts()
+
+    def query_nodes(self, health_status=None, after=0, limit=None):
+        """Nodes in creation order after cursor `after`; returns (nodes, next cursor or None).
+
+        Caller must hold the lock.
+        """
+        if health_status is None:
+            seqs = self._all.after("node", after)
+        else:
+            seqs = self._nodes_by_health.after(health_status, after)
+        return self._page(seqs, self._node_ids, self.nodes, None, limit)
+
+    def query_pods(self, node_id=None, status=None, after=0, limit=None):
+        """Pods in creation order after cursor `after`; returns (pods, next cursor or None).
+
+        The most selective index drives the scan. Caller must hold the lock.
+        """
+        if node_id is not None:
+            seqs = self._pods_by_node.after(node_id, after)
+            keep = None if status is None else (lambda pod: pod.status == status)
+        elif status is not None:
+            seqs, keep = self._pods_by_status.after(status, after), None
+        else:
+            seqs, keep = self._all.after("pod", after), None
+        return self._page(seqs, self._pod_ids, self.pods, keep, limit)
+
+    @staticmethod
+    def _page(seqs, ids, objects, keep, limit):
+        results = []
+        for seq in seqs:
+            if limit is not None and len(results) == limit:
+                return results, last
+            obj = objects[ids[seq]]
+            if keep is None or keep(obj):
+                results.append(obj)
+                last = seq
+        return results, None
+
+    def snapshot(self):
+        """Return the latest Snapshot, publishing a new one if anything changed"""
+        if not self._dirty_nodes and not self._dirty_pods:
+            return self._snapshot
+
+        # One reader publishes at a time; the others reuse its result
+        with self._publish_lock:
+            if not self._dirty_nodes and not self._dirty_pods:
+                return self._snapshot
+
+            with self.lock:
+                previous, published = self._snapshot, self._published_seq
+                dirty_nodes, self._dirty_nodes = self._dirty_nodes, set()
+                dirty_pods, self._dirty_pods = self._dirty_pods, set()
+                # Views carry their seq, so new objects can be placed in creation order
+                node_entries, pod_entries = self._node_entries, self._pod_entries
+                node_views = {node_id: (node_entries[node_id][0], self._node_view(self.nodes[node_id]))
+                              if node_id in self.nodes else None
+                              for node_id in dirty_nodes}
+                pod_views = {pod_id: None if pod is None else (pod_entries[pod_id][0], self._pod_view(pod))
+                             for pod_id, pod in zip(dirty_pods, map(self.pods.get, dirty_pods))}
+                self._published_seq = max(itertools.chain([published], (
+                    view[0] for views in (node_views, pod_views) for view in views.values() if view is not None)))
+                resource_version = self._resource_version()
+
+            snapshot = Snapshot(previous.seq + 1, resource_version,
+                                self._apply(previous.nodes if published else {}, node_views, published),
+                                self._apply(previous.pods if published else {}, pod_views, published))
+            # A kind that did not change keeps its view, and with it the encoded responses
+            if not node_views:
+                snapshot.encoded["nodes"] = previous.encoded["nodes"]
+            if not pod_views:
+                snapshot.encoded["pods"] = previous.encoded["pods"]
+            self._snapshot = snapshot
+            return snapshot
+
+    @staticmethod
+    def _apply(view, changes, published):
+        """Copy `view` with the changes ({key: (seq, value) or None}) applied, or return it as is
+        when there are none.
+
+        The view stays in seq order, as the unfiltered listings are: an update keeps its
+        key's place, and objects created since `published` go at the end by seq.
+        """
+        if not changes:
+            return view
+        view = dict(view)
+        created = []
+        for key, change in changes.items():
+            if change is None:
+                view.pop(key, None)
+            elif change[0] > published:
+                view.pop(key, None)   # Deleted and created again under the same ID
+                created.append((change[0], key, change[1]))
+            else:
+                view[key] = change[1]
+        created.sort(key=lambda item: item[0])
+        for _, key, value in created:
+            view[key] = value
+        return view
@@ -0,0 +1,57 @@
+import json
+import threading
+import time
+
+# Operations in a trace, named like the `cli.py apply` operations they correspond to. A node
+# is added when it becomes ready for pods; a launch-pod line is written whether or not the pod
+# found a node, so replaying under another strategy sees the same arrivals.
+TRACE_OPS = ("add-node", "fail-node", "stop-node", "delete-node", "launch-pod", "delete-pod")
+
+
+class TraceRecorder:
+    """Appends cluster events to a JSONL file, one {"time": ..., "op": ..., ...} object per line.
+
+    Lines are buffered and flushed every `flush_interval` seconds, so recording
+    costs a json.dumps and a buffered write under the caller's lock.
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+        self._flush_interval = flush_interval
+        threading.Thread(target=self._flush_loop, daemon=True, name="trace-flush").start()
+
+    def record(self, time, op, **fields):
+        line = json.dumps(dict(time=round(time, 6), op=op, **fields), separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _flush_loop(self):
+        while not self._file.closed:
+            time.sleep(self._flush_interval)
+            try:
+                self.flush()
+            except ValueError:
+                return   # Closed meanwhile
+
+
+def read_trace(path):
+    """Yield the operations of a trace file in order, skipping blank lines and # comments"""
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            op = json.loads(line)
+            if op.get("op") not in TRACE_OPS:
+                raise ValueError(f"{path}:{line_no}: unknown trace operation {op.get('op')!r}")
+            yield op
@@ -0,0 +1,103 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from records import Node, PodTable
+
+
+def test_add_get_and_update_through_views():
+    pods = PodTable()
+    pod = pods.add("a", 2, None, 10.0, 512)
+    assert (pod.cpu_required, pod.memory_required_mb, pod.node_id) == (2, 512, None)
+    assert (pod.status, pod.health_status, pod.created_at, pod.last_updated) == ("Running", "Healthy", 10.0, 10.0)
+    assert isinstance(pod.cpu_required, int)
+    pod.cpu_required = 0.5
+    pod.status = "Failed"
+    assert pods["a"].cpu_required == 0.5
+    assert pods["a"].status == "Failed"
+    assert pods.get("a") == pod
+    assert pods.get("b") is None
+    with pytest.raises(KeyError):
+        pods.add("a", 1, None)
+
+
+def test_removed_row_is_reused_without_aliasing_old_views():
+    pods = PodTable()
+    old = pods.add("a", 1, None)
+    assert pods.pop("a") == old
+    assert "a" not in pods and len(pods) == 0
+    new = pods.add("b", 3, None)
+    assert new.row == old.row
+    assert new != old
+    assert pods.get(old.id) is None
+    with pytest.raises(KeyError):
+        del pods["a"]
+
+
+def test_random_churn_matches_a_dict():
+    rng = random.Random(7)
+    pods, expected = PodTable(), {}
+    for step in range(20000):
+        if expected and rng.random() < 0.45:
+            pod_id = rng.choice(list(expected)) if step % 100 == 0 else next(iter(expected))
+            assert pods.pop(pod_id).cpu_required == expected.pop(pod_id)
+        else:
+            pod_id = f"pod-{step}"
+            expected[pod_id] = rng.randint(1, 8)
+            pods.add(pod_id, expected[pod_id], None)
+        assert len(pods) == len(expected)
+    assert sorted(pods) == sorted(expected)
+    assert {pod.id: pod.cpu_required for pod in pods.values()} == expected
+    assert pods.get("pod-missing") is None
+
+
+def test_node_pods_membership_and_removal():
+    pods = PodTable()
+    node, other = Node("n", 8, 0), Node("m", 8, 0)
+    members = [pods.add(f"pod-{i}", 1, "n") for i in range(5)]
+    for pod in members:
+        node.pods.add(pod)
+    stray = pods.add("stray", 1, "m")
+    other.pods.add(stray)
+
+    node.pods.discard(members[1])
+    node.pods.discard(members[1])
+    assert members[1] not in node.pods
+    assert stray not in node.pods
+    assert all(pods[pod.id] in node.pods for pod in members if pod != members[1])
+    assert sorted(node.pods.ids()) == ["pod-0", "pod-2", "pod-3", "pod-4"]
+    assert sorted(pod.id for pod in node.pods) == sorted(node.pods.ids())
+    assert Node("empty", 1, 0).pods.ids() == []
+
+
+def test_load_appends_columns_and_rebuilds_the_index():
+    pods = PodTable()
+    pods.add("a", 1, "n")
+    pods.load({
+        "id": ["b", "c"],
+        "node_id": ["n", None],
+        "cpu_required": [2.0, 0.5],
+        "memory_required_mb": [0.0, 64.0],
+        "status": ["Running", "Failed"],
+        "health_status": ["Healthy", "Unhealthy"],
+        "created_at": [1.0, 2.0],
+        "last_updated": [3.0, 4.0]
+    })
+    assert len(pods) == 3 and sorted(pods) == ["a", "b", "c"]
+    assert pods["c"].to_dict() == {"id": "c", "cpu_required": 0.5, "memory_required_mb": 64, "node_id": None,
+                                   "status": "Failed", "health_status": "Unhealthy",
+                                   "created_at": 2.0, "last_updated": 4.0}
+    assert pods.entry("b") == ("n", "Running")
+    assert pods.entry("missing") is None
+    assert pods.rows_by_node() == {"n": [pods["a"].row, pods["b"].row]}
+    assert pods.demand(pods.rows_by_node()["n"]) == (3, 0)
+
+    node = Node("n", 8, 0)
+    node.pods.extend(pods, pods.rows_by_node()["n"])
+    assert sorted(node.pods.ids()) == ["a", "b"]
+    node.pods.discard(pods["a"])
+    assert node.pods.ids() == ["b"] and pods["b"] in node.pods
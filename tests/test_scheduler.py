@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from records import Node
+from scheduler import STRATEGIES, Scheduler
+
+
+def healthy_node(node_id, cpu_cores, memory_mb):
+    node = Node(node_id, cpu_cores, 0, memory_mb)
+    node.health_status = "Healthy"
+    return node
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+@pytest.mark.parametrize("memory_required_mb", [0, 10])
+def test_empty_cluster_places_nothing(strategy, memory_required_mb):
+    assert Scheduler(strategy).select(1, memory_required_mb) is None
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_cluster_emptied_by_removal_places_nothing(strategy):
+    scheduler = Scheduler(strategy)
+    scheduler.update(healthy_node("a", 4, 1024))
+    scheduler.remove("a")
+    assert scheduler.select(1) is None
+    assert scheduler.select(1, 10) is None
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_no_fitting_node_places_nothing(strategy):
+    scheduler = Scheduler(strategy)
+    scheduler.update(healthy_node("a", 4, 1024))
+    assert scheduler.select(8) is None
+    assert scheduler.select(1, 2048) is None
+    assert scheduler.select(1, 512) == "a"
@@ -0,0 +1,186 @@
+import os
+import random
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+import server
+from events import EventLog
+
+
+@pytest.fixture(autouse=True)
+def empty_cluster(monkeypatch):
+    """Start every test without nodes, pods, history or journal"""
+    monkeypatch.setattr(server, "events", EventLog())
+    monkeypatch.setattr(server, "journal", None)
+    server.pod_changes.clear()
+    yield
+    clear_cluster()
+
+
+def clear_cluster():
+    with server.store.lock:
+        node_ids, pod_ids = list(server.nodes), list(server.pods)
+        server.nodes.clear()
+        server.pods.clear()
+        for node_id in node_ids:
+            server.scheduler.remove(node_id)
+            server.store.mark_node(node_id)
+        for pod_id in pod_ids:
+            server.store.mark_pod(pod_id)
+
+
+def add_nodes(count, cpu_cores=8):
+    node_ids = []
+    with server.store.lock:
+        for _ in range(count):
+            node = server.Node(str(uuid.uuid4()), cpu_cores, memory_mb=cpu_cores * 1024)
+            server.nodes[node.id] = node
+            server.scheduler.update(node)
+            server.emit_node("ADDED", node, "NodeAdded")
+            node_ids.append(node.id)
+    return node_ids
+
+
+def test_pod_delta_cancels_an_add_and_remove_of_the_same_pod():
+    node = server.nodes[add_nodes(1)[0]]
+    kept = server.create_pod(1)[0]
+    since = node.pods_version
+
+    transient = server.create_pod(1)[0]
+    added = server.create_pod(1)[0]
+    server.remove_pod(transient)
+    server.remove_pod(kept)
+    assert server.pod_delta(node, since) == ([added], [kept])
+
+    # A pod removed and then placed again within the window is no change at all
+    since = node.pods_version
+    with server.store.lock:
+        pod = server.pods[added]
+        server.release_pod(pod)
+        server.place_pod(pod)
+    assert server.pod_delta(node, since) == ([], [])
+    assert server.pod_delta(node, node.pods_version) == ([], [])
+
+
+def test_pod_delta_needs_the_whole_window_in_history(monkeypatch):
+    monkeypatch.setattr(server, "POD_CHANGE_HISTORY", 4)
+    node = server.nodes[add_nodes(1)[0]]
+    for _ in range(5):
+        server.create_pod(1)
+    assert server.pod_delta(node, 0) is None
+    assert server.pod_delta(node, 1) is not None
+    assert server.pod_delta(node, node.pods_version + 1) is None
+
+
+def test_watch_answers_410_once_since_has_left_the_buffer(monkeypatch):
+    monkeypatch.setattr(server, "events", EventLog(4))
+    add_nodes(6)
+    client = server.app.test_client()
+
+    response = client.get("/watch?since=1&timeout=0")
+    assert response.status_code == 410
+    assert response.get_json()["version"] == 6
+
+    response = client.get("/watch?since=2&timeout=0")
+    assert response.status_code == 200
+    assert [event["version"] for event in response.get_json()["events"]] == [3, 4, 5, 6]
+
+
+def test_watch_stream_resets_a_stale_last_event_id(monkeypatch):
+    monkeypatch.setattr(server, "events", EventLog(4))
+    add_nodes(6)
+    client = server.app.test_client()
+
+    def first_message(**headers):
+        response = client.get("/watch?since=5", headers={"Accept": "text/event-stream", **headers}, buffered=False)
+        try:
+            return next(iter(response.response))
+        finally:
+            response.close()
+
+    # Last-Event-ID is what a reconnecting EventSource sends, and it wins over ?since
+    assert first_message(**{"Last-Event-ID": "1"}).startswith(b'data: {"type": "RESET", "version": 6}')
+    assert first_message(**{"Last-Event-ID": "3"}).startswith(b"id: 4\n")
+    assert first_message().startswith(b"id: 6\n")
+
+
+def test_pod_pages_stay_stable_across_a_move_and_a_delete():
+    first, second = add_nodes(2, cpu_cores=4)
+    created = [server.create_pod(1)[0] for _ in range(7)]
+    client = server.app.test_client()
+
+    def page(query, after):
+        response = client.get(f"/pods?{query}&after={after}")
+        assert response.status_code == 200
+        return [pod["id"] for pod in response.get_json()], response.headers.get("X-Next-Cursor")
+
+    listed, cursor = page("limit=3", 0)
+    assert listed == created[:3]
+
+    # Moving pods, seen or not, keeps their place in the order; a deleted pod just drops out
+    with server.store.lock:
+        server.move_pod(server.pods[created[1]], "worst-fit")
+        server.move_pod(server.pods[created[4]], "worst-fit")
+    assert server.pods[created[4]].node_id == second
+    server.remove_pod(created[5])
+
+    while cursor is not None:
+        ids, cursor = page("limit=3", cursor)
+        listed += ids
+    expected = [pod_id for pod_id in created if pod_id != created[5]]
+    assert listed == expected
+    assert [pod["id"] for pod in client.get("/pods").get_json()] == expected
+
+    # A filtered listing pages through the index of its node in the same order
+    listed, cursor = page(f"node={first}&limit=2", 0)
+    while cursor is not None:
+        ids, cursor = page(f"node={first}&limit=2", cursor)
+        listed += ids
+    assert listed == [pod_id for pod_id in expected if server.pods[pod_id].node_id == first]
+
+
+def cluster_state():
+    with server.store.lock:
+        nodes = {node.id: (node.available_cpu, node.available_memory_mb, sorted(node.pods.ids()), node.health_status)
+                 for node in server.nodes.values()}
+        pods = {pod.id: pod.to_dict() for pod in server.pods.values()}
+    return nodes, pods, server.events.version
+
+
+@pytest.mark.parametrize("checkpoint_at", [None, 150, 299])
+def test_journal_recovers_the_cluster_from_log_and_snapshot(tmp_path, monkeypatch, checkpoint_at):
+    monkeypatch.setattr(server, "journal", server.Journal(str(tmp_path)))
+    rng = random.Random(1)
+    add_nodes(10, cpu_cores=4)
+    live = []
+    for step in range(300):
+        if step == checkpoint_at:
+            server.journal.checkpoint(server.store.snapshot)
+        choice = rng.random()
+        if choice < 0.6 or not live:
+            placed = server.create_pod(rng.choice([0.5, 1, 2]), rng.choice([0, 128]))
+            if placed is not None:
+                live.append(placed[0])
+        elif choice < 0.85:
+            server.remove_pod(live.pop(rng.randrange(len(live))))
+        else:
+            with server.store.lock:
+                server.move_pod(server.pods[rng.choice(live)], "worst-fit")
+    before = cluster_state()
+    assert before[1]
+    # Recovery reads the snapshot, if any, then the log records written after it
+    assert (tmp_path / "snapshot.bin").exists() == (checkpoint_at is not None)
+
+    clear_cluster()
+    monkeypatch.setattr(server, "events", EventLog())
+    monkeypatch.setattr(server, "journal", server.Journal(str(tmp_path)))
+    server.recover_state()
+    assert cluster_state() == before
+    assert server.store.snapshot().resource_version == before[2]
+    response = server.app.test_client().get("/pods")
+    assert response.headers["X-Resource-Version"] == str(before[2])
+    assert sorted(pod["id"] for pod in response.get_json()) == sorted(before[1])
@@ -1,39 +1,52 @@
 const API_BASE_URL = "http://localhost:8080";
 
-// Store charts for each node
-const nodeCharts = {};
+// One heartbeat chart for the nodes on screen, drawn from series the server downsamples
+const HEARTBEAT_WINDOW = 300;       // seconds shown
+const HEARTBEAT_RESOLUTION = 5;     // seconds per point
+const HEARTBEAT_POLL_MS = 5000;
+const MAX_HEARTBEAT_IDS = 200;      // keeps the query string short
+const visibleNodes = new Set();
+let selectedNode = null;            // drill-down: show this node's own series
+let heartbeatChart = null;
 
-function createHeartbeatChart(nodeId) {
-    const canvas = document.createElement('canvas');
-    canvas.className = 'heartbeat-chart';
-    
-    // Create a simple heartbeat pattern with sharp peaks
-    const generateECGData = () => {
-        const data = [];
-        const points = 100;
-        
-        for (let i = 0; i < points; i++) {
-            data.push(0.5); // Flat baseline
+// Node cards report when they scroll into or out of view
+const nodeObserver = new IntersectionObserver(entries => {
+    entries.forEach(entry => {
+        const nodeId = entry.target.dataset.nodeId;
+        if (entry.isIntersecting) {
+            visibleNodes.add(nodeId);
+        } else {
+            visibleNodes.delete(nodeId);
         }
-        return data;
+    });
+});
+
+function createHeartbeatChart() {
+    const perSecond = {
+        label: 'Heartbeats/s',
+        data: [],
+        borderColor: '#28a745',
+        backgroundColor: 'rgba(40, 167, 69, 0.1)',
+        tension: 0,
+        pointRadius: 0,
+        borderWidth: 2,
+        fill: true,
+        yAxisID: 'beats'
     };
-    
-    const data = {
-        labels: Array(100).fill(''),
-        datasets: [{
-            data: generateECGData(),
-            borderColor: '#28a745',
-            backgroundColor: 'rgba(40, 167, 69, 0.1)',
-            tension: 0,
-            pointRadius: 0,
-            borderWidth: 2,
-            fill: true
-        }]
+    const latency = {
+        label: 'Mean latency (ms)',
+        data: [],
+        borderColor: '#1a73e8',
+        tension: 0,
+        pointRadius: 0,
+        borderWidth: 1,
+        spanGaps: true,
+        yAxisID: 'latency'
     };
 
-    const config = {
+    return new Chart(document.getElementById('heartbeatChart'), {
         type: 'line',
-        data: data,
+        data: { labels: [], datasets: [perSecond, latency] },
         options: {
             responsive: true,
             maintainAspectRatio: false,
@@ -41,73 +54,87 @@ function createHeartbeatChart(nodeId) {
                 duration: 0
             },
             scales: {
-                y: {
-                    display: false,
+                beats: {
+                    position: 'left',
                     beginAtZero: true,
-                    min: 0.4,
-                    max: 1.1
+                    title: { display: true, text: 'Heartbeats/s' }
                 },
-                x: {
-                    display: false
+                latency: {
+                    position: 'right',
+                    beginAtZero: true,
+                    grid: { drawOnChartArea: false },
+                    title: { display: true, text: 'ms' }
                 }
             },
             plugins: {
-                legend: {
-                    display: false
-                },
                 tooltip: {
-                    enabled: false
+                    mode: 'index',
+                    intersect: false
                 }
             }
         }
-    };
+    });
+}
 
-    const chart = new Chart(canvas, config);
-    nodeCharts[nodeId] = { 
-        chart, 
-        data,
-        position: 0 // Add position tracker for continuous movement
-    };
-    return canvas;
+function selectNode(nodeId) {
+    selectedNode = nodeId;
+    if (nodeId) {
+        document.querySelector('.heartbeat-panel').scrollIntoView({ behavior: 'smooth' });
+    }
+    updateHeartbeats();
 }
 
-function updateHeartbeatGraph(nodeId, isActive) {
-    if (!nodeCharts[nodeId]) return;
+// Aggregate over the visible nodes, or one node's series when drilled down
+async function updateHeartbeats() {
+    if (selectedNode && !nodes[selectedNode]) {
+        selectedNode = null;
+    }
+    const ids = selectedNode ? [selectedNode] : [...visibleNodes].slice(0, MAX_HEARTBEAT_IDS);
+    document.getElementById('heartbeatTitle').textContent = selectedNode
+        ? `Heartbeats of node ${selectedNode}`
+        : `Heartbeats of ${ids.length} visible node${ids.length === 1 ? '' : 's'}`;
+    document.getElementById('heartbeatBack').hidden = !selectedNode;
+    if (!ids.length) {
+        return;
+    }
 
-    const { chart, data, position } = nodeCharts[nodeId];
-    
-    if (isActive) {
-        const newData = Array(100).fill(0.5);
-        
-        // Create the heartbeat pattern
-        const createHeartbeat = (startPosition) => {
-            // Only draw the heartbeat if it would be visible
-            if (startPosition >= 0 && startPosition < 100) {
-                newData[startPosition] = 0.5;     // Start at baseline
-                newData[startPosition + 1] = 1.0;  // Sharp up
-                newData[startPosition + 2] = 0.6;  // First down
-                newData[startPosition + 3] = 0.5;  // Back to baseline
-            }
-        };
+    try {
+        const params = new URLSearchParams({
+            window: HEARTBEAT_WINDOW,
+            resolution: HEARTBEAT_RESOLUTION,
+            ids: ids.join(',')
+        });
+        const response = await fetch(`${API_BASE_URL}/nodes/heartbeats?${params}`);
+        const series = await response.json();
+        const shown = selectedNode ? series.nodes[selectedNode] : series.aggregate;
+        if (!shown) {
+            return;
+        }
 
-        // Add heartbeats based on the current position
-        createHeartbeat(position);
-        createHeartbeat(position + 25);
-        createHeartbeat(position + 50);
-        createHeartbeat(position + 75);
+        heartbeatChart = heartbeatChart || createHeartbeatChart();
+        heartbeatChart.data.labels = shown.beats.map((_, i) =>
+            `-${(series.buckets - 1 - i) * series.resolution}s`);
+        heartbeatChart.data.datasets[0].data = shown.beats.map(beats => beats / series.resolution);
+        heartbeatChart.data.datasets[1].data = shown.latencyMs;
+        heartbeatChart.update('none');
+    } catch (error) {
+        console.error('Error fetching heartbeats:', error);
+    }
+}
 
-        // Update position for next frame
-        nodeCharts[nodeId].position = (position + 1) % 25;
-        
-        data.datasets[0].data = newData;
-    } else {
-        // Show flat line when inactive
-        data.datasets[0].data = Array(100).fill(0.5);
+function pollHeartbeats() {
+    if (!document.hidden) {
+        updateHeartbeats();
     }
-    
-    chart.update('none');
+    setTimeout(pollHeartbeats, HEARTBEAT_POLL_MS);
 }
 
+// Cluster state, kept current by the /watch event stream
+let nodes = {};
+let pods = {};
+let eventSource = null;
+let renderPending = false;
+
 // Update statistics
 function updateStats(nodes) {
     const totalNodes = Object.keys(nodes).length;
@@ -117,39 +144,114 @@ function updateStats(nodes) {
     document.getElementById('totalPods').textContent = totalPods;
 }
 
+function render() {
+    renderPending = false;
+    displayNodes(nodes);
+    updateStats(nodes);
+}
+
+// Coalesce bursts of events into one redraw
+function scheduleRender() {
+    if (!renderPending) {
+        renderPending = true;
+        setTimeout(render, 250);
+    }
+}
+
+// List everything once, then follow changes from that version on
 async function fetchNodes() {
     try {
-        const response = await fetch(`${API_BASE_URL}/nodes`);
-        const nodes = await response.json();
-        displayNodes(nodes);
-        updateStats(nodes);
+        const [nodesResponse, podsResponse] = await Promise.all([
+            fetch(`${API_BASE_URL}/nodes`),
+            fetch(`${API_BASE_URL}/pods`)
+        ]);
+        nodes = await nodesResponse.json();
+        pods = Object.fromEntries((await podsResponse.json()).map(pod => [pod.id, pod]));
+        const version = Math.min(
+            parseInt(nodesResponse.headers.get('X-Resource-Version')),
+            parseInt(podsResponse.headers.get('X-Resource-Version'))
+        );
+        render();
+        watchChanges(version);
     } catch (error) {
         console.error('Error fetching nodes:', error);
+        setTimeout(fetchNodes, 5000);
+    }
+}
+
+function watchChanges(version) {
+    if (eventSource) {
+        eventSource.close();
+    }
+    eventSource = new EventSource(`${API_BASE_URL}/watch?since=${version}`);
+    eventSource.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        if (event.type === 'RESET') {
+            // Too far behind to catch up from events: list everything again and watch from there
+            eventSource.close();
+            eventSource = null;
+            fetchNodes();
+            return;
+        }
+        applyEvent(event);
+        scheduleRender();
+    };
+}
+
+function applyEvent(event) {
+    const obj = event.object;
+    
+    if (event.kind === 'node') {
+        if (event.type === 'DELETED') {
+            delete nodes[obj.id];
+        } else {
+            nodes[obj.id] = obj;
+        }
+        return;
+    }
+    
+    // Pod events carry the pod only; move it between the nodes' lists ourselves
+    const previous = pods[obj.id];
+    if (previous && previous.node_id && nodes[previous.node_id]) {
+        const node = nodes[previous.node_id];
+        if (node.pods.includes(obj.id)) {
+            node.pods = node.pods.filter(podId => podId !== obj.id);
+            node.available_cpu += previous.cpu_required;
+            node.available_memory_mb += previous.memory_required_mb;
+        }
+    }
+    
+    if (event.type === 'DELETED') {
+        delete pods[obj.id];
+        return;
+    }
+    pods[obj.id] = obj;
+    if (obj.node_id && nodes[obj.node_id] && !nodes[obj.node_id].pods.includes(obj.id)) {
+        nodes[obj.node_id].pods.push(obj.id);
+        nodes[obj.node_id].available_cpu -= obj.cpu_required;
+        nodes[obj.node_id].available_memory_mb -= obj.memory_required_mb;
     }
 }
 
 function displayNodes(nodes) {
     const nodesContainer = document.getElementById('nodes');
+    nodeObserver.disconnect();
     nodesContainer.innerHTML = '';
+    visibleNodes.forEach(id => {
+        if (!nodes[id]) {
+            visibleNodes.delete(id);
+        }
+    });
 
     Object.entries(nodes).forEach(([id, node]) => {
         const nodeElement = document.createElement('div');
         nodeElement.className = `node ${node.health_status.toLowerCase()}`;
+        nodeElement.dataset.nodeId = id;
         
-        // Calculate time since last heartbeat
-        const lastHeartbeat = new Date(node.last_heartbeat * 1000);
-        const timeSinceHeartbeat = Math.floor((Date.now() - lastHeartbeat) / 1000);
-        const isActive = timeSinceHeartbeat < 20;
+        // The server marks nodes Failed when heartbeats stop, so health tells us activity
+        const isActive = node.is_running && node.health_status === 'Healthy';
         const heartbeatClass = isActive ? 'heartbeat-active' : 'heartbeat-inactive';
         
-        // Create heartbeat monitor
-        const heartbeatMonitor = document.createElement('div');
-        heartbeatMonitor.className = 'heartbeat-monitor';
-        heartbeatMonitor.appendChild(createHeartbeatChart(id));
-        
-        // Update heartbeat graph
-        updateHeartbeatGraph(id, isActive);
-        
         // Create pods list with status
         const podsList = node.pods.map(podId => {
             const pod = pods[podId];
@@ -173,6 +275,10 @@ function displayNodes(nodes) {
                     <strong>CPU</strong>
                     <span>${node.available_cpu}/${node.cpu_cores}</span>
                 </div>
+                <div class="info-item">
+                    <strong>Memory</strong>
+                    <span>${node.available_memory_mb}/${node.memory_mb} MiB</span>
+                </div>
                 <div class="info-item">
                     <strong>Status</strong>
                     <span>${node.health_status}</span>
@@ -193,21 +299,27 @@ function displayNodes(nodes) {
             <div class="node-controls">
                 <button onclick="stopNode('${id}')" class="stop-btn" ${!node.is_running ? 'disabled' : ''}>Stop</button>
                 <button onclick="deleteNode('${id}')" class="delete-btn">Delete</button>
+                <button onclick="selectNode('${id}')" class="heartbeat-btn">Heartbeats</button>
             </div>
         `;
         
-        // Add heartbeat monitor
-        nodeElement.appendChild(heartbeatMonitor);
         nodesContainer.appendChild(nodeElement);
+        nodeObserver.observe(nodeElement);
     });
 }
 
 async function addNode() {
     const cpuCores = document.getElementById('cpuCores').value;
+    const memoryMb = document.getElementById('memoryMb').value;
     if (!cpuCores) {
         alert('Please enter CPU cores');
         return;
     }
+    // Without a memory figure the server gives the node its default per core
+    const resources = { cpuCores: parseInt(cpuCores) };
+    if (memoryMb) {
+        resources.memoryMb = parseInt(memoryMb);
+    }
 
     try {
         const response = await fetch(`${API_BASE_URL}/nodes`, {
@@ -215,14 +327,14 @@ async function addNode() {
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ cpuCores: parseInt(cpuCores) }),
+            body: JSON.stringify(resources),
         });
 
         if (response.ok) {
             const result = await response.json();
             document.getElementById('cpuCores').value = '';
-            alert(`Node added successfully: ${result.message}`);
-            fetchNodes();
+            document.getElementById('memoryMb').value = '';
+            alert(`Node is provisioning: ${result.message}`);
         } else {
             const error = await response.json();
             alert(`Failed to add node: ${error.error || 'Unknown error'}`);
@@ -241,7 +353,6 @@ async function stopNode(nodeId) {
 
         if (response.ok) {
             alert(`Node ${nodeId} stopped successfully`);
-            fetchNodes();
         } else {
             const error = await response.json();
             alert(`Failed to stop node: ${error.error || 'Unknown error'}`);
@@ -264,7 +375,6 @@ async function deleteNode(nodeId) {
 
         if (response.ok) {
             alert(`Node ${nodeId} deleted successfully`);
-            fetchNodes();
         } else {
             const error = await response.json();
             alert(`Failed to delete node: ${error.error || 'Unknown error'}`);
@@ -277,6 +387,7 @@ async function deleteNode(nodeId) {
 
 async function launchPod() {
     const cpuRequired = document.getElementById('cpuRequired').value;
+    const memoryRequiredMb = document.getElementById('memoryRequiredMb').value;
     if (!cpuRequired) {
         alert('Please enter CPU required');
         return;
@@ -288,12 +399,15 @@ async function launchPod() {
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ cpuRequired: parseInt(cpuRequired) }),
+            body: JSON.stringify({
+                cpuRequired: parseInt(cpuRequired),
+                memoryRequiredMb: parseInt(memoryRequiredMb || '0')
+            }),
         });
 
         if (response.ok) {
             document.getElementById('cpuRequired').value = '';
-            fetchNodes();
+            document.getElementById('memoryRequiredMb').value = '';
         } else {
             const error = await response.json();
             alert(`Failed to launch pod: ${error.error}`);
@@ -316,7 +430,6 @@ async function deletePod(podId) {
 
         if (response.ok) {
             alert(`Pod ${podId} deleted successfully`);
-            fetchNodes();
         } else {
             const error = await response.json();
             alert(`Failed to delete pod: ${error.error || 'Unknown error'}`);
@@ -327,6 +440,6 @@ async function deletePod(podId) {
     }
 }
 
-// Start periodic updates
-setInterval(fetchNodes, 5000);
-fetchNodes(); // Initial fetch
+// Initial listing, then incremental updates from the watch stream
+fetchNodes();
+pollHeartbeats();